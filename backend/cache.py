@@ -0,0 +1,66 @@
+import hashlib
+import uuid
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+
+# Caché con claves versionadas por ámbito.
+# - Cada ámbito (p.ej. 'agenda:od:5') tiene un token de versión guardado en la caché compartida.
+# - Las claves de datos incluyen los tokens de sus ámbitos; invalidar = rotar el token, de modo que
+#   las entradas anteriores quedan inalcanzables en todos los workers sin tener que borrarlas.
+# - Los tokens no expiran y viven en el alias 'versiones', separado de los datos para que el descarte de
+#   entradas de la caché general no los alcance; si aun así se pierden se genera uno nuevo (equivale a invalidar).
+
+PREFIJO_VERSION = 'ver:'
+ALIAS_VERSIONES = 'versiones'
+
+
+def _tokens():
+    return caches[ALIAS_VERSIONES]
+
+
+def versiones(*ambitos):
+    """Tokens de versión actuales de los ámbitos, leídos con un solo get_many."""
+    claves = [PREFIJO_VERSION + a for a in ambitos]
+    tokens = _tokens()
+    encontrados = tokens.get_many(claves)
+    faltantes = [k for k in claves if k not in encontrados]
+    if faltantes:
+        for k in faltantes:
+            # add() no pisa el token si otro worker lo creó entre medio
+            tokens.add(k, uuid.uuid4().hex, None)
+        encontrados.update(tokens.get_many(faltantes))
+    return [encontrados.get(k, '') for k in claves]
+
+
+def invalidar(*ambitos):
+    """Rota el token de los ámbitos. Dentro de una transacción, espera al commit para que
+    ningún lector vuelva a cachear el estado anterior."""
+    def _rotar():
+        _tokens().set_many({PREFIJO_VERSION + a: uuid.uuid4().hex for a in ambitos}, None)
+    transaction.on_commit(_rotar)
+
+
+def clave_versionada(nombre, ambitos, *partes):
+    return ':'.join([nombre, *versiones(*ambitos), *(str(p) for p in partes)])
+
+
+def etag(clave):
+    """ETag HTTP derivado de una clave versionada: cambia exactamente cuando se invalida algún ámbito."""
+    return '"%s"' % hashlib.md5(clave.encode()).hexdigest()
+
+
+def obtener_o_calcular(nombre, ambitos, partes, calcular, timeout=DEFAULT_TIMEOUT):
+    """Devuelve el valor cacheado para (nombre, partes) en la versión actual de `ambitos`,
+    o lo calcula con `calcular()` y lo guarda."""
+    return obtener_por_clave(clave_versionada(nombre, ambitos, *partes), calcular, timeout)
+
+
+def obtener_por_clave(clave, calcular, timeout=DEFAULT_TIMEOUT):
+    """Como obtener_o_calcular, con una clave ya armada por clave_versionada (p.ej. para derivar el ETag)."""
+    valor = cache.get(clave)
+    if valor is None:
+        valor = calcular()
+        cache.set(clave, valor, timeout)
+    return valor
@@ -0,0 +1,84 @@
+import csv
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+
+# Exportación de listados completos en CSV o NDJSON (acción `exportar` de los ViewSets).
+# - La respuesta es un StreamingHttpResponse: las filas se escriben a medida que se leen, sin armar
+#   la respuesta completa en memoria como hace un listado DRF sin paginar.
+# - Las filas salen de values_list(...).iterator(chunk_size): en PostgreSQL es un cursor del lado del
+#   servidor (se traen EXPORTACION_CHUNK filas por vez); en SQLite el driver también las lee por bloques.
+# - Memoria constante por worker, sin importar cuántas filas se exporten.
+# - Con PgBouncer en modo transacción hay que usar DISABLE_SERVER_SIDE_CURSORS (Django lee entonces
+#   el resultado completo del driver y la memoria vuelve a crecer con la consulta).
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+LINEAS_POR_BLOQUE = 500
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def formato_pedido(request):
+    formato = (request.query_params.get('formato') or 'csv').lower()
+    if formato not in FORMATOS:
+        raise ValidationError({'formato': f'Use uno de: {", ".join(FORMATOS)}'})
+    return formato
+
+
+def _lineas_csv(columnas, filas):
+    escritor = csv.writer(_Eco())
+    yield '\ufeff'  # BOM: Excel abre el archivo como UTF-8
+    yield escritor.writerow(columnas)
+    for fila in filas:
+        # Campos JSON (p.ej. Bitacora.datos) como JSON, no como repr de Python
+        yield escritor.writerow([
+            json.dumps(v, ensure_ascii=False, cls=DjangoJSONEncoder) if isinstance(v, (dict, list)) else v
+            for v in fila
+        ])
+
+
+def _lineas_ndjson(columnas, filas):
+    codificador = DjangoJSONEncoder(ensure_ascii=False)
+    for fila in filas:
+        yield codificador.encode(dict(zip(columnas, fila))) + '\n'
+
+
+def _bloques(lineas, tamano=LINEAS_POR_BLOQUE):
+    # Una escritura al socket por bloque de líneas, no una por fila
+    bloque = []
+    for linea in lineas:
+        bloque.append(linea)
+        if len(bloque) >= tamano:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
+
+
+def exportar(request, queryset, columnas, nombre, encabezados=None):
+    """StreamingHttpResponse con `queryset` proyectado a `columnas` (lookups de values_list) en el formato
+    de ?formato= (csv por defecto). `encabezados` renombra las columnas en el archivo (p.ej. paciente en vez
+    de id_paciente__nombre). El orden lo fija el queryset."""
+    formato = formato_pedido(request)
+    chunk = getattr(settings, 'EXPORTACION_CHUNK', 2000)
+    filas = queryset.values_list(*columnas).iterator(chunk_size=chunk)
+    encabezados = list(encabezados or columnas)
+    lineas = _lineas_csv(encabezados, filas) if formato == 'csv' else _lineas_ndjson(encabezados, filas)
+    respuesta = StreamingHttpResponse(_bloques(lineas), content_type=FORMATOS[formato])
+    archivo = f'{nombre}-{datetime.now():%Y%m%d-%H%M}.{formato}'
+    respuesta['Content-Disposition'] = f'attachment; filename="{archivo}"'
+    # Datos personales: que ningún proxy intermedio guarde la exportación
+    respuesta['Cache-Control'] = 'private, no-store'
+    return respuesta
@@ -0,0 +1,70 @@
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+# Paginación por cursor (keyset) para todos los listados DRF.
+# - La página siguiente se pide con WHERE <columna> < <último valor> sobre una columna indexada,
+#   en vez de OFFSET: el costo de cada página no crece con el tamaño de la tabla.
+# - Cada ViewSet declara su orden con `orden_cursor` (columna indexada primero, pk como desempate).
+#   DRF ubica la página solo con la primera columna y resuelve sus empates con OFFSET: debe ser única o
+#   casi única (fecha con hora, pk); si no, conviene ordenar por la pk.
+#   Si el ViewSet usa OrderingFilter, manda el orden pedido por el cliente (comportamiento de DRF).
+# - Respuesta: {"next": url|null, "previous": url|null, "results": [...]}
+
+
+class PaginacionPorCursor(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = 'pk'  # Por defecto, orden de alta (igual que antes de paginar)
+
+    def get_ordering(self, request, queryset, view):
+        orden = getattr(view, 'orden_cursor', None)
+        usa_ordering_filter = any(hasattr(f, 'get_ordering') for f in getattr(view, 'filter_backends', []))
+        if orden and not usa_ordering_filter:
+            return (orden,) if isinstance(orden, str) else tuple(orden)
+        return super().get_ordering(request, queryset, view)
+
+
+class PaginacionPorRelevancia(PaginacionPorCursor):
+    """Keyset sobre (rango DESC, pk DESC) para resultados de búsqueda ordenados por relevancia.
+    El queryset debe venir anotado con `rango` como double precision (FloatField; en PostgreSQL ts_rank y
+    similarity devuelven real y hay que hacer Cast): el cursor guarda repr() del float leído y lo compara con
+    la columna, que debe ser del mismo tipo para no repetir ni saltar empates. A diferencia del cursor de DRF
+    (que pagina por la primera columna y resuelve empates con OFFSET), el cursor guarda el par completo: con
+    miles de acciones de igual relevancia cada página sigue siendo un WHERE (rango, pk) < (r, id) sin OFFSET.
+    Solo avanza (sin `previous`).
+    """
+    campo_rango = 'rango'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        cursor = self.decode_cursor(request)
+        if cursor is not None and cursor.position:
+            try:
+                rango, pk = cursor.position.rsplit('|', 1)
+                rango, pk = float(rango), int(pk)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(
+                Q(**{f'{self.campo_rango}__lt': rango}) | Q(**{self.campo_rango: rango, 'pk__lt': pk})
+            )
+        filas = list(queryset.order_by(f'-{self.campo_rango}', '-pk')[:self.page_size + 1])
+        self.posicion_siguiente = None
+        if len(filas) > self.page_size:
+            filas = filas[:self.page_size]
+            ultimo = filas[-1]
+            self.posicion_siguiente = f'{getattr(ultimo, self.campo_rango)!r}|{ultimo.pk}'
+        return filas
+
+    def get_next_link(self):
+        if self.posicion_siguiente is None:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.posicion_siguiente))
+
+    def get_previous_link(self):
+        return None
@@ -42,6 +42,10 @@ SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'django-insecure-=9ve-47ldlm1j*u6blx
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv('DJANGO_DEBUG', 'True').lower() in ('1', 'true', 'yes', 'on')
 
+# Bypass total de permisos por rol (seguridad_y_personal.permissions.RolesPermission).
+# Se lee una sola vez al arrancar; útil en ambientes donde no se desea filtrar por rol.
+DISABLE_ROLE_PERMS = os.getenv('DISABLE_ROLE_PERMS', '').lower() in ('1', 'true', 'yes', 'on')
+
 ALLOWED_HOSTS = [h.strip() for h in os.getenv('DJANGO_ALLOWED_HOSTS', '127.0.0.1,localhost').split(',') if h.strip()]
 
 
@@ -69,6 +73,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'seguridad_y_personal.middleware.ContextoActorMiddleware',  # request.actor / request.roles (perezosos)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -111,6 +116,104 @@ DATABASES = {
 if DATABASES['default']['ENGINE'].endswith('postgresql'):
     DATABASES['default'].setdefault('OPTIONS', {})
     DATABASES['default']['OPTIONS'].setdefault('sslmode', os.getenv('DB_SSLMODE', 'require'))
+    # Lookups y funciones de trigramas (pg_trgm) de la búsqueda de pacientes (pacientes/busqueda.py)
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+
+# Caché
+# - Por defecto, caché en archivos bajo CACHE_DIR (del proyecto, no el temporal del sistema que comparten
+#   todos los procesos del host): la comparten los workers de gunicorn de esta instalación, necesario para
+#   que la invalidación por versiones (backend/cache.py) sea coherente entre procesos.
+# - Cada alias puede apuntarse a otro backend (p.ej. memcached/redis) con <PREFIJO>_BACKEND y <PREFIJO>_LOCATION.
+# - MAX_ENTRIES: al superarlo, FileBasedCache descarta al azar 1/CULL_FREQUENCY de las entradas (y lista el
+#   directorio en cada escritura, así que no conviene subirlo sin límite).
+# - 'versiones' guarda solo los tokens de ámbito de backend/cache.py (pocos y pequeños, sin expiración), aparte
+#   de los datos: el descarte de entradas de 'default' no los alcanza. Su límite es holgado para no descartarlos;
+#   si se apunta a redis/memcached conviene una instancia sin desalojo o con memoria de sobra.
+# - 'sesiones' es un alias aparte (DJANGO_SESSION_CACHE_*) para que el descarte de entradas de la caché
+#   general no cierre sesiones. Para varias instancias se apunta a una caché compartida, p.ej.
+#   django.core.cache.backends.redis.RedisCache con redis://...; en tests sirve LocMemCache.
+CACHE_DIR = os.getenv('DJANGO_CACHE_DIR', str(BASE_DIR / 'cache'))
+
+
+def _cache(prefijo, ubicacion, timeout, max_entradas):
+    return {
+        'BACKEND': os.getenv(f'{prefijo}_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(f'{prefijo}_LOCATION', os.path.join(CACHE_DIR, ubicacion)),
+        'TIMEOUT': int(os.getenv(f'{prefijo}_TIMEOUT', str(timeout))),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv(f'{prefijo}_MAX_ENTRIES', str(max_entradas))),
+            'CULL_FREQUENCY': int(os.getenv(f'{prefijo}_CULL_FREQUENCY', '3')),
+        },
+    }
+
+
+SESSION_COOKIE_AGE = int(os.getenv('DJANGO_SESSION_COOKIE_AGE', str(60 * 60 * 24 * 14)))
+CACHES = {
+    'default': _cache('DJANGO_CACHE', 'datos', 300, 5000),
+    'versiones': _cache('DJANGO_CACHE_VERSIONES', 'versiones', 300, 200000),
+    'sesiones': _cache('DJANGO_SESSION_CACHE', 'sesiones', SESSION_COOKIE_AGE, 20000),
+}
+
+# Sesiones
+# - SESION_MODO='cached_db' (por defecto): se leen de la caché 'sesiones' y solo van a la base al
+#   guardarse (login/logout) o si la caché las perdió. Cada request autenticado deja de hacer un SELECT.
+# - 'cache': solo en la caché, sin tráfico a la base; una sesión desalojada obliga a iniciar sesión de
+#   nuevo, así que requiere una caché compartida y persistente (archivos en un solo host, o redis).
+# - 'db': el motor anterior (una consulta por request).
+# - Con 'db'/'cached_db' conviene correr `manage.py clearsessions` a diario.
+# - `manage.py benchmark_sesiones` compara las consultas por request de cada modo.
+MOTORES_SESION = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+}
+SESION_MODO = os.getenv('SESION_MODO', 'cached_db')
+SESSION_ENGINE = MOTORES_SESION.get(SESION_MODO, SESION_MODO)
+SESSION_CACHE_ALIAS = 'sesiones'
+
+
+# Bitácora (seguridad_y_personal/auditoria.py)
+# - AUDITORIA_MODO: 'buffer' (eventos en memoria, escritos en lotes) o 'sincrono' (INSERT inmediato, p.ej. auditorías estrictas).
+# - Se vacía al juntar AUDITORIA_LOTE eventos o cada AUDITORIA_INTERVALO segundos, y al terminar el worker.
+AUDITORIA_MODO = os.getenv('AUDITORIA_MODO', 'buffer')
+AUDITORIA_LOTE = int(os.getenv('AUDITORIA_LOTE', '50'))
+AUDITORIA_INTERVALO = float(os.getenv('AUDITORIA_INTERVALO', '2'))
+# Intentos de escribir un lote fallido antes de pasar a escribirlo fila por fila
+AUDITORIA_REINTENTOS = int(os.getenv('AUDITORIA_REINTENTOS', '2'))
+
+# Retención de la bitácora (seguridad_y_personal/particiones.py, comando archivar_bitacora)
+# - En la base se conservan los últimos BITACORA_RETENCION_MESES meses (más el mes en curso).
+# - Los meses anteriores se exportan a BITACORA_ARCHIVO_DIR como bitacora-AAAA-MM.jsonl.gz.
+BITACORA_RETENCION_MESES = int(os.getenv('BITACORA_RETENCION_MESES', '12'))
+BITACORA_ARCHIVO_DIR = os.getenv('BITACORA_ARCHIVO_DIR', str(BASE_DIR / 'archivo_bitacora'))
+
+# Outbox de sincronización Usuario -> auth.User / Odontologo (seguridad_y_personal/sincronizacion.py)
+# - SINCRONIZACION_MODO: 'outbox' (los aplica el worker `manage.py procesar_outbox --continuo`)
+#   o 'inmediato' (se aplican al confirmar la transacción, en el mismo proceso; útil sin worker).
+# - Un evento que falla se reintenta con espera creciente hasta SINCRONIZACION_MAX_INTENTOS y queda 'fallido'.
+SINCRONIZACION_MODO = os.getenv('SINCRONIZACION_MODO', 'inmediato' if DEBUG else 'outbox')
+SINCRONIZACION_LOTE = int(os.getenv('SINCRONIZACION_LOTE', '100'))
+SINCRONIZACION_MAX_INTENTOS = int(os.getenv('SINCRONIZACION_MAX_INTENTOS', '8'))
+
+# Teléfonos normalizados (pacientes/normalizacion.py): se guardan sin el código de país local ni prefijos,
+# para que "+591 700-12345", "00591 70012345" y "70012345" coincidan en la búsqueda por número.
+TELEFONO_CODIGO_PAIS = os.getenv('TELEFONO_CODIGO_PAIS', '591')
+
+# Importación masiva de pacientes (pacientes/importacion.py): reportes CSV de filas rechazadas
+IMPORTACION_REPORTES_DIR = os.getenv('IMPORTACION_REPORTES_DIR', str(BASE_DIR / 'reportes_importacion'))
+
+# Exportaciones CSV/NDJSON en streaming (backend/exportacion.py): filas leídas por vez del cursor
+EXPORTACION_CHUNK = int(os.getenv('EXPORTACION_CHUNK', '2000'))
+
+
+# Django REST Framework
+# - Todos los listados se paginan por cursor (keyset) sobre columnas indexadas: ver backend/pagination.py.
+# - El cliente puede pedir ?page_size=N (máximo 200).
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'backend.pagination.PaginacionPorCursor',
+    'PAGE_SIZE': 50,
+}
 
 
 # Password validation
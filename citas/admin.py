@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cita, Odontologo, Disponibilidad
+from .models import Cita, Odontologo, Disponibilidad, HorarioSemanal, ExcepcionHorario
 from .forms import OdontologoForm
 
 class OdontologoAdmin(admin.ModelAdmin):
@@ -13,3 +13,5 @@ class CitaAdmin(admin.ModelAdmin):
 admin.site.register(Cita, CitaAdmin)
 admin.site.register(Odontologo, OdontologoAdmin)
 admin.site.register(Disponibilidad)
+admin.site.register(HorarioSemanal)
+admin.site.register(ExcepcionHorario)
@@ -0,0 +1,385 @@
+from datetime import datetime, time, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from backend.cache import invalidar, obtener_o_calcular
+from pacientes.historial import invalidar_historial
+
+from .conflictos import (
+    DURACION_CITA, DURACION_MAXIMA, OcupacionEnMemoria, bloquear_filas, traducir_integrity_error,
+)
+from .models import Cita, Disponibilidad, Odontologo, HorarioSemanal, ExcepcionHorario
+
+# Cálculo de horarios libres por barrido de intervalos.
+# - Las reglas HorarioSemanal abren ventanas que se expanden en memoria solo para el rango pedido;
+#   ExcepcionHorario agrega ('extra') o bloquea ('bloqueo') horas en una fecha concreta.
+# - Cada Disponibilidad 'disponible' abre la ventana [fecha, fecha + BLOQUE_DISPONIBILIDAD).
+# - Cada Disponibilidad 'ocupado' y cada cita activa ([fecha, fecha_fin)) bloquean su intervalo.
+# - Una consulta por tabla (odontólogos, reglas, excepciones, disponibilidades, citas), ordenada por
+#   odontólogo y fecha, recorrida una sola vez; no hay consultas por día ni por horario.
+
+BLOQUE_DISPONIBILIDAD = DURACION_CITA
+MAX_DIAS_BUSQUEDA = 31
+
+
+def parsear_limite(valor, fin_de_dia=False):
+    """Acepta 'YYYY-MM-DD' o ISO8601. Para fechas sin hora, `fin_de_dia` devuelve el inicio del día siguiente.
+    Un ISO8601 con zona horaria se convierte a la hora local sin zona, como las fechas guardadas (USE_TZ=False).
+    """
+    if not valor:
+        return None
+    d = parse_date(valor)
+    if d is not None:
+        inicio = datetime.combine(d, time.min)
+        return inicio + timedelta(days=1) if fin_de_dia else inicio
+    dt = parse_datetime(valor)
+    if dt is None:
+        raise ValueError(f'Fecha inválida: {valor}')
+    if timezone.is_aware(dt):
+        dt = timezone.make_naive(dt)
+    return dt
+
+
+def fusionar_intervalos(intervalos):
+    """Une intervalos [inicio, fin) solapados o contiguos. Espera la entrada ordenada por inicio."""
+    fusionados = []
+    for inicio, fin in intervalos:
+        if fusionados and inicio <= fusionados[-1][1]:
+            if fin > fusionados[-1][1]:
+                fusionados[-1][1] = fin
+        else:
+            fusionados.append([inicio, fin])
+    return [(a, b) for a, b in fusionados]
+
+
+def restar_intervalos(base, ocupados):
+    """Resta a `base` los intervalos `ocupados`. Ambas listas ordenadas y sin solapes internos."""
+    libres = []
+    j = 0
+    for inicio, fin in base:
+        cursor = inicio
+        while j < len(ocupados) and ocupados[j][1] <= cursor:
+            j += 1
+        k = j
+        while k < len(ocupados) and ocupados[k][0] < fin:
+            o_inicio, o_fin = ocupados[k]
+            if o_inicio > cursor:
+                libres.append((cursor, o_inicio))
+            cursor = max(cursor, o_fin)
+            if cursor >= fin:
+                break
+            k += 1
+        if cursor < fin:
+            libres.append((cursor, fin))
+    return libres
+
+
+def partir_en_slots(libres, duracion):
+    """Divide los intervalos libres en horarios consecutivos de `duracion`, empaquetados desde el inicio."""
+    slots = []
+    for inicio, fin in libres:
+        cursor = inicio
+        while cursor + duracion <= fin:
+            slots.append((cursor, cursor + duracion))
+            cursor += duracion
+    return slots
+
+
+def _recortar(intervalos, desde, hasta):
+    return [(max(a, desde), min(b, hasta)) for a, b in intervalos if a < hasta and b > desde]
+
+
+def _dias(desde, hasta):
+    dia = desde.date()
+    while datetime.combine(dia, time.min) < hasta:
+        yield dia
+        dia += timedelta(days=1)
+
+
+def expandir_plantillas(ids, desde, hasta):
+    """Expande HorarioSemanal/ExcepcionHorario de los odontólogos `ids` para [desde, hasta).
+    Devuelve (abiertas, bloqueadas, duraciones): dicts por odontólogo con listas de intervalos,
+    y la duración de horario publicada de cada intervalo abierto (para el listado de disponibilidades).
+    """
+    reglas = {}
+    for regla in HorarioSemanal.objects.filter(id_odontologo_id__in=ids).order_by('hora_inicio'):
+        reglas.setdefault((regla.id_odontologo_id, regla.dia_semana), []).append(regla)
+    excepciones = {}
+    for exc in ExcepcionHorario.objects.filter(
+        id_odontologo_id__in=ids, fecha__gte=desde.date(), fecha__lte=hasta.date()
+    ):
+        excepciones.setdefault((exc.id_odontologo_id, exc.fecha), []).append(exc)
+
+    abiertas, bloqueadas, duraciones = {}, {}, {}
+    odontologos_con_reglas = {od_id for od_id, _ in reglas}
+    for dia in _dias(desde, hasta):
+        for od_id in odontologos_con_reglas:
+            for regla in reglas.get((od_id, dia.weekday()), []):
+                if regla.vigente_desde and dia < regla.vigente_desde:
+                    continue
+                if regla.vigente_hasta and dia > regla.vigente_hasta:
+                    continue
+                ventana = (datetime.combine(dia, regla.hora_inicio), datetime.combine(dia, regla.hora_fin))
+                abiertas.setdefault(od_id, []).append(ventana)
+                duraciones[(od_id, ventana[0])] = timedelta(minutes=regla.duracion_slot or 60)
+    for (od_id, dia), lista in excepciones.items():
+        for exc in lista:
+            inicio = datetime.combine(dia, exc.hora_inicio or time.min)
+            fin = datetime.combine(dia, exc.hora_fin) if exc.hora_fin else datetime.combine(dia + timedelta(days=1), time.min)
+            destino = abiertas if exc.tipo == 'extra' else bloqueadas
+            destino.setdefault(od_id, []).append((inicio, fin))
+    for dic in (abiertas, bloqueadas):
+        for lista in dic.values():
+            lista.sort()
+    return abiertas, bloqueadas, duraciones
+
+
+def ventanas_atencion(ids, desde, hasta):
+    """Ventanas de atención publicadas (plantillas, excepciones y filas de Disponibilidad) de los
+    odontólogos `ids` en [desde, hasta), ya sin los bloqueos. No descuenta citas.
+    Devuelve un dict id_odontologo -> intervalos ordenados y fusionados; los odontólogos sin
+    ninguna ventana publicada en el rango no aparecen.
+    """
+    disponibilidades = (
+        Disponibilidad.objects
+        .filter(id_odontologo_id__in=ids, fecha__gt=desde - BLOQUE_DISPONIBILIDAD, fecha__lt=hasta)
+        .order_by('id_odontologo_id', 'fecha')
+        .values_list('id_odontologo_id', 'fecha', 'estado')
+    )
+    abiertas, bloqueadas, _ = expandir_plantillas(ids, desde, hasta)
+    for od_id, grupo in groupby(disponibilidades, key=itemgetter(0)):
+        for _, fecha, estado in grupo:
+            destino = abiertas if estado == 'disponible' else bloqueadas
+            destino.setdefault(od_id, []).append((fecha, fecha + BLOQUE_DISPONIBILIDAD))
+
+    ventanas = {}
+    for od_id, lista in abiertas.items():
+        base = _recortar(fusionar_intervalos(sorted(lista)), desde, hasta)
+        ventanas[od_id] = restar_intervalos(base, fusionar_intervalos(sorted(bloqueadas.get(od_id, []))))
+    return ventanas
+
+
+def tiene_agenda_publicada(odontologo_id):
+    """True si el odontólogo publicó alguna vez horario (reglas, excepciones o filas de Disponibilidad),
+    aunque ninguna abra ventanas en el rango consultado (reglas vencidas, solo bloqueos)."""
+    return any(
+        modelo.objects.filter(id_odontologo_id=odontologo_id).exists()
+        for modelo in (HorarioSemanal, ExcepcionHorario, Disponibilidad)
+    )
+
+
+def horarios_libres(desde, hasta, duracion=DURACION_CITA, especialidad=None, odontologos=None):
+    """Horarios libres de todos los odontólogos (o los indicados) entre `desde` y `hasta`.
+    Devuelve una lista de dicts {id_odontologo, nombre, especialidad, libres: [(inicio, fin), ...]}.
+    """
+    qs_odontologos = Odontologo.objects.all()
+    if especialidad:
+        qs_odontologos = qs_odontologos.filter(especialidad__iexact=especialidad)
+    if odontologos is not None:
+        qs_odontologos = qs_odontologos.filter(pk__in=odontologos)
+    filas = list(qs_odontologos.order_by('id_odontologo').values('id_odontologo', 'nombre', 'especialidad'))
+    if not filas:
+        return []
+    ids = [f['id_odontologo'] for f in filas]
+
+    ventanas = ventanas_atencion(ids, desde, hasta)
+    citas = (
+        Cita.objects
+        .filter(id_odontologo_id__in=ids, fecha__gt=desde - DURACION_MAXIMA, fecha__lt=hasta, fecha_fin__gt=desde)
+        .exclude(estado='cancelada')
+        .order_by('id_odontologo_id', 'fecha')
+        .values_list('id_odontologo_id', 'fecha', 'fecha_fin')
+    )
+    ocupadas = {}
+    for od_id, grupo in groupby(citas, key=itemgetter(0)):
+        ocupadas[od_id] = fusionar_intervalos((fecha, fin) for _, fecha, fin in grupo)
+
+    resultado = []
+    for fila in filas:
+        od_id = fila['id_odontologo']
+        libres = restar_intervalos(ventanas.get(od_id, []), ocupadas.get(od_id, []))
+        resultado.append({**fila, 'libres': partir_en_slots(libres, duracion)})
+    return resultado
+
+
+def disponibilidades_expandidas(desde, hasta, odontologos=None):
+    """Vista expandida de la disponibilidad: horarios publicados por las plantillas en [desde, hasta).
+    Devuelve tuplas (id_odontologo, fecha, estado); 'ocupado' si el horario está bloqueado por una
+    excepción o se cruza con una cita activa. Se complementa con las filas guardadas en Disponibilidad.
+    """
+    qs = HorarioSemanal.objects.all()
+    if odontologos is not None:
+        qs = qs.filter(id_odontologo_id__in=odontologos)
+    ids = sorted(set(qs.values_list('id_odontologo_id', flat=True)))
+    if not ids:
+        return []
+    abiertas, bloqueadas, duraciones = expandir_plantillas(ids, desde, hasta)
+    citas = (
+        Cita.objects
+        .filter(id_odontologo_id__in=ids, fecha__gt=desde - DURACION_MAXIMA, fecha__lt=hasta, fecha_fin__gt=desde)
+        .exclude(estado='cancelada')
+        .order_by('id_odontologo_id', 'fecha')
+        .values_list('id_odontologo_id', 'fecha', 'fecha_fin')
+    )
+    for od_id, grupo in groupby(citas, key=itemgetter(0)):
+        bloqueadas.setdefault(od_id, []).extend((fecha, fin) for _, fecha, fin in grupo)
+
+    filas = []
+    for od_id in ids:
+        ocupados = fusionar_intervalos(sorted(bloqueadas.get(od_id, [])))
+        slots = []
+        for inicio, fin in abiertas.get(od_id, []):
+            # Los horarios extra no tienen regla propia: se publican en bloques estándar
+            duracion = duraciones.get((od_id, inicio), BLOQUE_DISPONIBILIDAD)
+            slots.extend(partir_en_slots(_recortar([(inicio, fin)], desde, hasta), duracion))
+        slots.sort()
+        j = 0
+        for a, b in slots:
+            while j < len(ocupados) and ocupados[j][1] <= a:
+                j += 1
+            ocupado = j < len(ocupados) and ocupados[j][0] < b
+            filas.append((od_id, a, 'ocupado' if ocupado else 'disponible'))
+    return filas
+
+
+def _hueco_mas_cercano(objetivo, duracion, tolerancia, ventanas, ocupados):
+    """Inicio libre más cercano a `objetivo` (a ±tolerancia) donde cabe `duracion`, o None.
+    `ventanas` son los intervalos de atención (None = sin agenda publicada: cualquier hora vale)."""
+    desde, hasta = objetivo - tolerancia, objetivo + tolerancia + duracion
+    base = [(desde, hasta)] if ventanas is None else _recortar(ventanas, desde, hasta)
+    mejor = None
+    for a, b in restar_intervalos(base, ocupados):
+        if b - a < duracion:
+            continue
+        inicio = min(max(objetivo, a), b - duracion)
+        if mejor is None or abs(inicio - objetivo) < abs(mejor - objetivo):
+            mejor = inicio
+    return mejor
+
+
+def programar_serie(paciente_id, odontologo_id, objetivos, duracion=DURACION_CITA,
+                    tolerancia=timedelta(days=3), confirmar=True):
+    """Genera una serie de citas recurrentes del paciente con el odontólogo.
+    - `objetivos`: fechas/hora deseadas de cada repetición (ordenadas).
+    - Para cada una busca el hueco libre más cercano dentro de ±tolerancia, respetando la agenda
+      publicada del odontólogo (si nunca publicó ninguna, cualquier hora vale) y las citas del paciente,
+      del odontólogo y de la propia serie.
+    - Bloquea y carga una sola vez todo el horizonte de la serie; el resto se resuelve en memoria.
+    - Con `confirmar`, inserta las citas encontradas con bulk_create en la misma transacción.
+    Devuelve una lista paralela a `objetivos` con la Cita propuesta/creada o None si no hubo hueco.
+    """
+    if not objetivos:
+        return []
+    horizonte_desde = min(objetivos) - tolerancia
+    horizonte_hasta = max(objetivos) + tolerancia + duracion
+    try:
+        with transaction.atomic():
+            bloquear_filas([paciente_id], [odontologo_id])
+            ocupacion = OcupacionEnMemoria.cargar([paciente_id], [odontologo_id], horizonte_desde, horizonte_hasta)
+            ventanas = ventanas_atencion([odontologo_id], horizonte_desde, horizonte_hasta).get(odontologo_id)
+            if ventanas is None and tiene_agenda_publicada(odontologo_id):
+                ventanas = []  # Tiene agenda pero no atiende en el horizonte: no hay huecos (como horarios_libres)
+
+            citas = []
+            for objetivo in objetivos:
+                desde, hasta = objetivo - tolerancia, objetivo + tolerancia + duracion
+                ocupados = fusionar_intervalos(sorted(
+                    ocupacion.intervalos(('paciente', paciente_id), desde, hasta)
+                    + ocupacion.intervalos(('odontologo', odontologo_id), desde, hasta)
+                ))
+                inicio = _hueco_mas_cercano(objetivo, duracion, tolerancia, ventanas, ocupados)
+                if inicio is None:
+                    citas.append(None)
+                    continue
+                cita = Cita(
+                    id_paciente_id=paciente_id,
+                    id_odontologo_id=odontologo_id,
+                    fecha=inicio,
+                    duracion=int(duracion.total_seconds() // 60),
+                    estado='pendiente',
+                )
+                cita.calcular_fin()
+                ocupacion.reservar(paciente_id, odontologo_id, cita.fecha, cita.fecha_fin)
+                citas.append(cita)
+            if confirmar:
+                creadas = Cita.objects.bulk_create([c for c in citas if c is not None])
+                invalidar_caches_de_citas(creadas)  # bulk_create no emite post_save
+            return citas
+    except IntegrityError as exc:
+        conflicto = traducir_integrity_error(exc)
+        if conflicto is None:
+            raise
+        raise conflicto
+
+
+# --- Agenda diaria por odontólogo (cacheada) ---
+# Ámbitos de versión (ver backend/cache.py):
+# - 'agenda': global, cambia si se renombra un paciente (el nombre aparece en la agenda).
+# - 'agenda:od:<id>': cambios en la plantilla semanal del odontólogo (afecta a todos sus días).
+# - 'agenda:od:<id>:<fecha>': citas, disponibilidades y excepciones de ese día.
+
+def ambitos_agenda(odontologo_id, dia):
+    return ['agenda', f'agenda:od:{odontologo_id}', f'agenda:od:{odontologo_id}:{dia.isoformat()}']
+
+
+def invalidar_agenda_dia(odontologo_id, inicio, fin=None):
+    """Invalida los días de la agenda del odontólogo tocados por [inicio, fin]."""
+    if odontologo_id is None or inicio is None:
+        return
+    dia, ultimo = inicio.date(), (fin or inicio).date()
+    ambitos = []
+    while dia <= ultimo:
+        ambitos.append(f'agenda:od:{odontologo_id}:{dia.isoformat()}')
+        dia += timedelta(days=1)
+    invalidar(*ambitos)
+
+
+def invalidar_caches_de_citas(citas):
+    """Invalida agenda e historial de pacientes para citas creadas sin señales (bulk_create)."""
+    for cita in citas:
+        invalidar_agenda_dia(cita.id_odontologo_id, cita.fecha, cita.fecha_fin)
+    invalidar_historial(*(cita.id_paciente_id for cita in citas))
+
+
+def listar_disponibilidad(guardadas, desde, hasta, odontologo_id=None):
+    """Filas guardadas de Disponibilidad + horarios expandidos de plantilla para [desde, hasta).
+    Una fila guardada para el mismo odontólogo y fecha prevalece sobre la de la plantilla."""
+    filas = list(guardadas)
+    ocupadas = {(d.id_odontologo_id, d.fecha) for d in filas}
+    for od_id, fecha, estado in disponibilidades_expandidas(
+        desde, hasta, odontologos=[odontologo_id] if odontologo_id else None
+    ):
+        if (od_id, fecha) not in ocupadas:
+            filas.append(Disponibilidad(id_odontologo_id=od_id, fecha=fecha, estado=estado))
+    filas.sort(key=lambda d: (d.fecha, d.id_odontologo_id))
+    return filas
+
+
+def agenda_del_dia(odontologo_id, dia, serializar_disponibilidad):
+    """Agenda de un odontólogo en un día: citas (con nombre del paciente) y disponibilidad.
+    El resultado se cachea por versión de ámbito; la primera carga hace las consultas y
+    las siguientes solo leen la caché hasta que una señal invalide ese día."""
+    def calcular():
+        desde = datetime.combine(dia, time.min)
+        hasta = desde + timedelta(days=1)
+        citas = (
+            Cita.objects
+            .filter(id_odontologo_id=odontologo_id, fecha__gt=desde - DURACION_MAXIMA, fecha__lt=hasta, fecha_fin__gt=desde)
+            .order_by('fecha')
+            .values('id_cita', 'fecha', 'fecha_fin', 'duracion', 'estado', 'id_paciente', 'id_paciente__nombre')
+        )
+        guardadas = Disponibilidad.objects.filter(id_odontologo_id=odontologo_id, fecha__gte=desde, fecha__lt=hasta)
+        return {
+            'id_odontologo': odontologo_id,
+            'fecha': dia,
+            'citas': [
+                {**{k: v for k, v in c.items() if k != 'id_paciente__nombre'}, 'paciente': c['id_paciente__nombre']}
+                for c in citas
+            ],
+            'disponibilidad': serializar_disponibilidad(listar_disponibilidad(guardadas, desde, hasta, odontologo_id)),
+        }
+    return obtener_o_calcular('agenda_dia', ambitos_agenda(odontologo_id, dia), [odontologo_id, dia.isoformat()], calcular)
@@ -0,0 +1,244 @@
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Cita, Odontologo, DURACION_CITA_MINUTOS, DURACION_MAXIMA_MINUTOS
+from pacientes.models import Paciente
+
+# Motor de conflictos de horario para citas.
+# - Cada cita no cancelada ocupa el intervalo semiabierto [fecha, fecha_fin), con fecha_fin = fecha + duracion.
+# - Dos citas chocan si comparten paciente u odontólogo y sus intervalos se solapan.
+# - La verificación en Python da mensajes claros; la garantía real la da la base de datos
+#   (restricción de exclusión en PostgreSQL, triggers en SQLite; ver migraciones 0011/0012).
+
+DURACION_CITA = timedelta(minutes=DURACION_CITA_MINUTOS)
+DURACION_MAXIMA = timedelta(minutes=DURACION_MAXIMA_MINUTOS)
+
+# Nombres de las restricciones/triggers de la base de datos (usados para identificar el choque)
+RESTRICCION_ODONTOLOGO = 'citas_cita_sin_solape_odontologo'
+RESTRICCION_PACIENTE = 'citas_cita_sin_solape_paciente'
+
+MENSAJE_PACIENTE = 'Ya tienes una cita que se cruza con ese horario.'
+MENSAJE_ODONTOLOGO = 'Este horario ya está ocupado para el odontólogo seleccionado.'
+
+
+class ConflictoHorario(APIException):
+    """Error 409 cuando el horario choca con otra cita activa."""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'El horario solicitado choca con otra cita.'
+    default_code = 'conflicto_horario'
+
+
+def citas_solapadas(inicio, fin, excluir_id=None):
+    """QuerySet de citas activas cuyo intervalo se solapa con [inicio, fin).
+    Ninguna cita dura más que DURACION_MAXIMA, así que `fecha` queda acotada a
+    (inicio - DURACION_MAXIMA, fin): un rango sobre los índices parciales
+    (odontólogo/paciente, fecha, fecha_fin), que además cubren el filtro por fecha_fin.
+    """
+    qs = Cita.objects.filter(
+        fecha__gt=inicio - DURACION_MAXIMA,
+        fecha__lt=fin,
+        fecha_fin__gt=inicio,
+    ).exclude(estado='cancelada')
+    if excluir_id is not None:
+        qs = qs.exclude(pk=excluir_id)
+    return qs
+
+
+def verificar_conflictos(paciente, odontologo, fecha, duracion=DURACION_CITA, excluir_id=None):
+    """Lanza ConflictoHorario si el paciente o el odontólogo ya tienen una cita solapada
+    con [fecha, fecha + duracion)."""
+    inicio, fin = fecha, fecha + duracion
+    base = citas_solapadas(inicio, fin, excluir_id=excluir_id)
+    if base.filter(id_paciente=paciente).exists():
+        raise ConflictoHorario(MENSAJE_PACIENTE)
+    if odontologo is not None and base.filter(id_odontologo=odontologo).exists():
+        raise ConflictoHorario(MENSAJE_ODONTOLOGO)
+
+
+def bloquear_filas(pacientes, odontologos):
+    """Serializa reservas concurrentes de los pacientes/odontólogos indicados (ids).
+    En PostgreSQL toma un FOR UPDATE sobre las filas padre; en SQLite no existe
+    FOR UPDATE (Django lo omite) y la exclusión la garantizan los triggers, que corren
+    bajo el bloqueo de escritura de la base. Debe llamarse dentro de transaction.atomic().
+    """
+    odontologos = [o for o in odontologos if o is not None]
+    if odontologos:
+        list(Odontologo.objects.select_for_update().filter(pk__in=odontologos).values_list('pk', flat=True))
+    list(Paciente.objects.select_for_update().filter(pk__in=pacientes).values_list('pk', flat=True))
+
+
+def traducir_integrity_error(exc):
+    """Convierte la violación de la restricción de no solapamiento en ConflictoHorario."""
+    texto = str(exc)
+    if RESTRICCION_PACIENTE in texto:
+        return ConflictoHorario(MENSAJE_PACIENTE)
+    if RESTRICCION_ODONTOLOGO in texto:
+        return ConflictoHorario(MENSAJE_ODONTOLOGO)
+    return None
+
+
+def guardar_sin_conflictos(serializer, **extra):
+    """Guarda una cita (alta o edición) verificando conflictos dentro de una transacción.
+    `serializer` es un CitaSerializer ya validado; `extra` se pasa a serializer.save().
+    """
+    datos = serializer.validated_data
+    instancia = serializer.instance
+    paciente = datos.get('id_paciente', getattr(instancia, 'id_paciente', None))
+    odontologo = datos.get('id_odontologo', getattr(instancia, 'id_odontologo', None))
+    fecha = datos.get('fecha', getattr(instancia, 'fecha', None))
+    minutos = datos.get('duracion', getattr(instancia, 'duracion', None)) or DURACION_CITA_MINUTOS
+    estado = extra.get('estado', datos.get('estado', getattr(instancia, 'estado', None)))
+    try:
+        with transaction.atomic():
+            if estado != 'cancelada':
+                bloquear_filas([paciente.pk], [getattr(odontologo, 'pk', None)])
+                verificar_conflictos(
+                    paciente, odontologo, fecha,
+                    duracion=timedelta(minutes=minutos),
+                    excluir_id=getattr(instancia, 'pk', None),
+                )
+            return serializer.save(**extra)
+    except IntegrityError as exc:
+        conflicto = traducir_integrity_error(exc)
+        if conflicto is None:
+            raise
+        raise conflicto
+
+
+def guardar_formulario_sin_conflictos(form):
+    """Como guardar_sin_conflictos, para el CitaForm de las vistas HTML (ya validado con is_valid()).
+    CitaForm.clean verifica sin bloquear; aquí se repite la verificación bajo el bloqueo y la violación
+    de la restricción de la base se convierte en ConflictoHorario en vez de un IntegrityError (500).
+    """
+    datos = form.cleaned_data
+    minutos = datos.get('duracion') or DURACION_CITA_MINUTOS
+    try:
+        with transaction.atomic():
+            if datos.get('estado') != 'cancelada':
+                odontologo = datos.get('id_odontologo')
+                bloquear_filas([datos['id_paciente'].pk], [getattr(odontologo, 'pk', None)])
+                verificar_conflictos(
+                    datos['id_paciente'], odontologo, datos['fecha'],
+                    duracion=timedelta(minutes=minutos), excluir_id=form.instance.pk,
+                )
+            return form.save()
+    except IntegrityError as exc:
+        conflicto = traducir_integrity_error(exc)
+        if conflicto is None:
+            raise
+        raise conflicto
+
+
+class OcupacionEnMemoria:
+    """Intervalos ocupados por paciente y por odontólogo, cargados con una sola consulta.
+    Permite validar muchas citas (lotes, series) sin una consulta por cita: cada verificación
+    es una búsqueda binaria sobre la lista ordenada de intervalos de la clave.
+    """
+
+    def __init__(self):
+        self._intervalos = {}
+
+    @classmethod
+    def cargar(cls, pacientes, odontologos, desde, hasta):
+        """Carga las citas activas de los pacientes/odontólogos indicados que se cruzan con [desde, hasta)."""
+        ocupacion = cls()
+        pacientes, odontologos = set(pacientes), set(odontologos)
+        if not pacientes and not odontologos:
+            return ocupacion
+        filas = (
+            citas_solapadas(desde, hasta)
+            .filter(Q(id_paciente_id__in=pacientes) | Q(id_odontologo_id__in=odontologos))
+            .values_list('id_paciente_id', 'id_odontologo_id', 'fecha', 'fecha_fin')
+        )
+        for paciente_id, odontologo_id, inicio, fin in filas:
+            if paciente_id in pacientes:
+                ocupacion.agregar(('paciente', paciente_id), inicio, fin)
+            if odontologo_id is not None and odontologo_id in odontologos:
+                ocupacion.agregar(('odontologo', odontologo_id), inicio, fin)
+        return ocupacion
+
+    def agregar(self, clave, inicio, fin):
+        insort(self._intervalos.setdefault(clave, []), (inicio, fin))
+
+    def intervalos(self, clave, desde, hasta):
+        """Intervalos ocupados de la clave que se cruzan con [desde, hasta), ordenados."""
+        lista = self._intervalos.get(clave, [])
+        i = max(bisect_left(lista, (desde, desde)) - 1, 0)
+        resultado = []
+        while i < len(lista) and lista[i][0] < hasta:
+            if lista[i][1] > desde:
+                resultado.append(lista[i])
+            i += 1
+        return resultado
+
+    def choca(self, clave, inicio, fin):
+        lista = self._intervalos.get(clave)
+        if not lista:
+            return False
+        i = bisect_left(lista, (inicio, inicio))
+        # Los intervalos de una clave no se solapan entre sí: basta mirar el anterior y el siguiente
+        if i > 0 and lista[i - 1][1] > inicio:
+            return True
+        return i < len(lista) and lista[i][0] < fin
+
+    def conflicto(self, paciente_id, odontologo_id, inicio, fin):
+        """Mensaje de conflicto para la cita propuesta, o None si el horario está libre."""
+        if self.choca(('paciente', paciente_id), inicio, fin):
+            return MENSAJE_PACIENTE
+        if odontologo_id is not None and self.choca(('odontologo', odontologo_id), inicio, fin):
+            return MENSAJE_ODONTOLOGO
+        return None
+
+    def reservar(self, paciente_id, odontologo_id, inicio, fin):
+        self.agregar(('paciente', paciente_id), inicio, fin)
+        if odontologo_id is not None:
+            self.agregar(('odontologo', odontologo_id), inicio, fin)
+
+
+def reservar_lote(citas, todo_o_nada=False):
+    """Valida y crea un lote de citas (instancias sin guardar) en una sola transacción.
+    - Bloquea pacientes y odontólogos involucrados, carga su ocupación con una consulta y
+      valida cada cita contra lo existente y contra las anteriores del mismo lote.
+    - Inserta las aceptadas con bulk_create.
+    Devuelve una lista paralela a `citas` con None (creada) o el mensaje de conflicto.
+    Con `todo_o_nada`, un solo conflicto cancela el lote completo (no se crea ninguna).
+    """
+    if not citas:
+        return []
+    for cita in citas:
+        cita.calcular_fin()
+    pacientes = {c.id_paciente_id for c in citas}
+    odontologos = {c.id_odontologo_id for c in citas if c.id_odontologo_id is not None}
+    desde = min(c.fecha for c in citas)
+    hasta = max(c.fecha_fin for c in citas)
+    try:
+        with transaction.atomic():
+            bloquear_filas(pacientes, odontologos)
+            ocupacion = OcupacionEnMemoria.cargar(pacientes, odontologos, desde, hasta)
+            resultados, aceptadas = [], []
+            for cita in citas:
+                motivo = None
+                if cita.estado != 'cancelada':
+                    motivo = ocupacion.conflicto(cita.id_paciente_id, cita.id_odontologo_id, cita.fecha, cita.fecha_fin)
+                    if motivo is None:
+                        ocupacion.reservar(cita.id_paciente_id, cita.id_odontologo_id, cita.fecha, cita.fecha_fin)
+                resultados.append(motivo)
+                if motivo is None:
+                    aceptadas.append(cita)
+            if todo_o_nada and len(aceptadas) != len(citas):
+                return resultados
+            Cita.objects.bulk_create(aceptadas)
+            # bulk_create no emite post_save: invalidar agenda e historial cacheados
+            from .agenda import invalidar_caches_de_citas
+            invalidar_caches_de_citas(aceptadas)
+            return resultados
+    except IntegrityError as exc:
+        conflicto = traducir_integrity_error(exc)
+        if conflicto is None:
+            raise
+        raise conflicto
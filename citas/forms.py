@@ -5,7 +5,21 @@ from .models import Cita, Odontologo  # Modelos Cita y Odontologo
 class CitaForm(forms.ModelForm):  # Form ligado a Cita
     class Meta:  # Configuración
         model = Cita  # Modelo objetivo
-        fields = ['fecha', 'id_paciente', 'id_odontologo', 'estado']  # Campos editables en el form
+        fields = ['fecha', 'duracion', 'id_paciente', 'id_odontologo', 'estado']  # Campos editables en el form
+
+    def clean(self):  # Misma regla de conflictos que la API (ver citas/conflictos.py)
+        cleaned = super().clean()
+        fecha = cleaned.get('fecha')
+        paciente = cleaned.get('id_paciente')
+        if fecha and paciente and cleaned.get('estado') != 'cancelada':
+            from datetime import timedelta
+            from .conflictos import ConflictoHorario, verificar_conflictos, DURACION_CITA
+            duracion = timedelta(minutes=cleaned['duracion']) if cleaned.get('duracion') else DURACION_CITA
+            try:
+                verificar_conflictos(paciente, cleaned.get('id_odontologo'), fecha, duracion=duracion, excluir_id=self.instance.pk)
+            except ConflictoHorario as e:
+                raise forms.ValidationError(str(e.detail))
+        return cleaned
 
 class OdontologoForm(forms.ModelForm):
     username = forms.CharField(
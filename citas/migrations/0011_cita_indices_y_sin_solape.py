@@ -0,0 +1,104 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+# Garantía de no solapamiento a nivel de base de datos.
+# - PostgreSQL: restricciones de exclusión GiST sobre el rango [fecha, fecha + 1 hora),
+#   limitadas a citas no canceladas (requiere la extensión btree_gist para el '=' sobre enteros).
+# - SQLite: no soporta EXCLUDE; se usan triggers BEFORE INSERT/UPDATE que abortan la escritura.
+#   Corren bajo el bloqueo de escritura de SQLite, por lo que dos altas simultáneas no pueden pasar ambas.
+
+PG_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    """
+    CREATE OR REPLACE FUNCTION citas_rango_cita(inicio timestamptz, minutos integer)
+    RETURNS tstzrange LANGUAGE sql IMMUTABLE AS
+    $$ SELECT tstzrange(inicio, inicio + make_interval(mins => minutos), '[)') $$
+    """,
+    """
+    ALTER TABLE citas_cita ADD CONSTRAINT citas_cita_sin_solape_odontologo
+    EXCLUDE USING gist (id_odontologo_id WITH =, citas_rango_cita(fecha, 60) WITH &&)
+    WHERE (estado <> 'cancelada' AND id_odontologo_id IS NOT NULL)
+    """,
+    """
+    ALTER TABLE citas_cita ADD CONSTRAINT citas_cita_sin_solape_paciente
+    EXCLUDE USING gist (id_paciente_id WITH =, citas_rango_cita(fecha, 60) WITH &&)
+    WHERE (estado <> 'cancelada')
+    """,
+]
+
+PG_REVERSE = [
+    "ALTER TABLE citas_cita DROP CONSTRAINT IF EXISTS citas_cita_sin_solape_paciente",
+    "ALTER TABLE citas_cita DROP CONSTRAINT IF EXISTS citas_cita_sin_solape_odontologo",
+    "DROP FUNCTION IF EXISTS citas_rango_cita(timestamptz, integer)",
+]
+
+_SQLITE_CUERPO = """
+BEGIN
+    SELECT RAISE(ABORT, 'citas_cita_sin_solape_paciente')
+    WHERE EXISTS (
+        SELECT 1 FROM citas_cita c
+        WHERE c.id_paciente_id = NEW.id_paciente_id
+          AND c.estado <> 'cancelada'
+          AND c.id_cita IS NOT NEW.id_cita
+          AND c.fecha > datetime(NEW.fecha, '-60 minutes')
+          AND c.fecha < datetime(NEW.fecha, '+60 minutes')
+    );
+    SELECT RAISE(ABORT, 'citas_cita_sin_solape_odontologo')
+    WHERE NEW.id_odontologo_id IS NOT NULL AND EXISTS (
+        SELECT 1 FROM citas_cita c
+        WHERE c.id_odontologo_id = NEW.id_odontologo_id
+          AND c.estado <> 'cancelada'
+          AND c.id_cita IS NOT NEW.id_cita
+          AND c.fecha > datetime(NEW.fecha, '-60 minutes')
+          AND c.fecha < datetime(NEW.fecha, '+60 minutes')
+    );
+END
+"""
+
+SQLITE_FORWARD = [
+    "CREATE TRIGGER citas_cita_sin_solape_ins BEFORE INSERT ON citas_cita "
+    "WHEN NEW.estado <> 'cancelada'" + _SQLITE_CUERPO,
+    "CREATE TRIGGER citas_cita_sin_solape_upd BEFORE UPDATE ON citas_cita "
+    "WHEN NEW.estado <> 'cancelada'" + _SQLITE_CUERPO,
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS citas_cita_sin_solape_ins",
+    "DROP TRIGGER IF EXISTS citas_cita_sin_solape_upd",
+]
+
+
+def _ejecutar(schema_editor, por_motor):
+    sentencias = por_motor.get(schema_editor.connection.vendor, [])
+    for sql in sentencias:
+        schema_editor.execute(sql)
+
+
+def crear_restricciones(apps, schema_editor):
+    _ejecutar(schema_editor, {'postgresql': PG_FORWARD, 'sqlite': SQLITE_FORWARD})
+
+
+def eliminar_restricciones(apps, schema_editor):
+    _ejecutar(schema_editor, {'postgresql': PG_REVERSE, 'sqlite': SQLITE_REVERSE})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0010_alter_odontologo_matricula_profesional'),
+        ('pacientes', '0003_remove_archivoclinico_archivo_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(condition=models.Q(('estado', 'cancelada'), _negated=True), fields=['id_odontologo', 'fecha'], name='cita_odontologo_fecha_activa'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(condition=models.Q(('estado', 'cancelada'), _negated=True), fields=['id_paciente', 'fecha'], name='cita_paciente_fecha_activa'),
+        ),
+        migrations.RunPython(crear_restricciones, eliminar_restricciones),
+    ]
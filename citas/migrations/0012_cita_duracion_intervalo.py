@@ -0,0 +1,162 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:40
+
+import datetime
+import django.core.validators
+from django.db import migrations, models
+
+
+# Citas de duración variable: cada cita ocupa [fecha, fecha_fin).
+# - PostgreSQL: las restricciones de exclusión pasan a usar tstzrange(fecha, fecha_fin).
+# - SQLite: los triggers comparan intervalos; el límite inferior fecha > inicio - duración máxima
+#   mantiene la búsqueda como un rango sobre el índice (odontólogo/paciente, fecha, fecha_fin).
+
+PG_FORWARD = [
+    "ALTER TABLE citas_cita DROP CONSTRAINT IF EXISTS citas_cita_sin_solape_paciente",
+    "ALTER TABLE citas_cita DROP CONSTRAINT IF EXISTS citas_cita_sin_solape_odontologo",
+    "DROP FUNCTION IF EXISTS citas_rango_cita(timestamptz, integer)",
+    """
+    ALTER TABLE citas_cita ADD CONSTRAINT citas_cita_sin_solape_odontologo
+    EXCLUDE USING gist (id_odontologo_id WITH =, tstzrange(fecha, fecha_fin, '[)') WITH &&)
+    WHERE (estado <> 'cancelada' AND id_odontologo_id IS NOT NULL)
+    """,
+    """
+    ALTER TABLE citas_cita ADD CONSTRAINT citas_cita_sin_solape_paciente
+    EXCLUDE USING gist (id_paciente_id WITH =, tstzrange(fecha, fecha_fin, '[)') WITH &&)
+    WHERE (estado <> 'cancelada')
+    """,
+]
+
+PG_REVERSE = [
+    "ALTER TABLE citas_cita DROP CONSTRAINT IF EXISTS citas_cita_sin_solape_paciente",
+    "ALTER TABLE citas_cita DROP CONSTRAINT IF EXISTS citas_cita_sin_solape_odontologo",
+    """
+    CREATE OR REPLACE FUNCTION citas_rango_cita(inicio timestamptz, minutos integer)
+    RETURNS tstzrange LANGUAGE sql IMMUTABLE AS
+    $$ SELECT tstzrange(inicio, inicio + make_interval(mins => minutos), '[)') $$
+    """,
+    """
+    ALTER TABLE citas_cita ADD CONSTRAINT citas_cita_sin_solape_odontologo
+    EXCLUDE USING gist (id_odontologo_id WITH =, citas_rango_cita(fecha, 60) WITH &&)
+    WHERE (estado <> 'cancelada' AND id_odontologo_id IS NOT NULL)
+    """,
+    """
+    ALTER TABLE citas_cita ADD CONSTRAINT citas_cita_sin_solape_paciente
+    EXCLUDE USING gist (id_paciente_id WITH =, citas_rango_cita(fecha, 60) WITH &&)
+    WHERE (estado <> 'cancelada')
+    """,
+]
+
+_SQLITE_CUERPO = """
+BEGIN
+    SELECT RAISE(ABORT, 'citas_cita_sin_solape_paciente')
+    WHERE EXISTS (
+        SELECT 1 FROM citas_cita c
+        WHERE c.id_paciente_id = NEW.id_paciente_id
+          AND c.estado <> 'cancelada'
+          AND c.id_cita IS NOT NEW.id_cita
+          AND c.fecha > datetime(NEW.fecha, '-480 minutes')
+          AND c.fecha < NEW.fecha_fin
+          AND c.fecha_fin > NEW.fecha
+    );
+    SELECT RAISE(ABORT, 'citas_cita_sin_solape_odontologo')
+    WHERE NEW.id_odontologo_id IS NOT NULL AND EXISTS (
+        SELECT 1 FROM citas_cita c
+        WHERE c.id_odontologo_id = NEW.id_odontologo_id
+          AND c.estado <> 'cancelada'
+          AND c.id_cita IS NOT NEW.id_cita
+          AND c.fecha > datetime(NEW.fecha, '-480 minutes')
+          AND c.fecha < NEW.fecha_fin
+          AND c.fecha_fin > NEW.fecha
+    );
+END
+"""
+
+SQLITE_FORWARD = [
+    "DROP TRIGGER IF EXISTS citas_cita_sin_solape_ins",
+    "DROP TRIGGER IF EXISTS citas_cita_sin_solape_upd",
+    "CREATE TRIGGER citas_cita_sin_solape_ins BEFORE INSERT ON citas_cita "
+    "WHEN NEW.estado <> 'cancelada'" + _SQLITE_CUERPO,
+    "CREATE TRIGGER citas_cita_sin_solape_upd BEFORE UPDATE ON citas_cita "
+    "WHEN NEW.estado <> 'cancelada'" + _SQLITE_CUERPO,
+]
+
+# Los triggers de 0011 se recrean al revertir esa migración; aquí basta con quitarlos
+# antes de que se elimine la columna fecha_fin que referencian.
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS citas_cita_sin_solape_ins",
+    "DROP TRIGGER IF EXISTS citas_cita_sin_solape_upd",
+]
+
+
+def _ejecutar(schema_editor, por_motor):
+    sentencias = por_motor.get(schema_editor.connection.vendor, [])
+    for sql in sentencias:
+        schema_editor.execute(sql)
+
+
+def calcular_fechas_fin(apps, schema_editor):
+    # Todas las citas existentes duraban 1 hora (regla anterior de ±1 hora)
+    Cita = apps.get_model('citas', 'Cita')
+    Cita.objects.update(fecha_fin=models.F('fecha') + datetime.timedelta(minutes=60))
+
+
+def usar_intervalos(apps, schema_editor):
+    _ejecutar(schema_editor, {'postgresql': PG_FORWARD, 'sqlite': SQLITE_FORWARD})
+
+
+def volver_a_bloques_fijos(apps, schema_editor):
+    _ejecutar(schema_editor, {'postgresql': PG_REVERSE, 'sqlite': SQLITE_REVERSE})
+
+
+def recrear_triggers_fijos(apps, schema_editor):
+    # Al revertir en SQLite, restaurar los triggers de bloques de 1 hora de 0011
+    if schema_editor.connection.vendor == 'sqlite':
+        from importlib import import_module
+        previa = import_module('citas.migrations.0011_cita_indices_y_sin_solape')
+        for sql in previa.SQLITE_FORWARD:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0011_cita_indices_y_sin_solape'),
+        ('pacientes', '0003_remove_archivoclinico_archivo_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recrear_triggers_fijos),
+        migrations.AddField(
+            model_name='cita',
+            name='duracion',
+            field=models.PositiveSmallIntegerField(default=60, validators=[django.core.validators.MinValueValidator(5), django.core.validators.MaxValueValidator(480)]),
+        ),
+        migrations.AddField(
+            model_name='cita',
+            name='fecha_fin',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(calcular_fechas_fin, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cita',
+            name='fecha_fin',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.RemoveIndex(
+            model_name='cita',
+            name='cita_odontologo_fecha_activa',
+        ),
+        migrations.RemoveIndex(
+            model_name='cita',
+            name='cita_paciente_fecha_activa',
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(condition=models.Q(('estado', 'cancelada'), _negated=True), fields=['id_odontologo', 'fecha', 'fecha_fin'], name='cita_odontologo_intervalo'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(condition=models.Q(('estado', 'cancelada'), _negated=True), fields=['id_paciente', 'fecha', 'fecha_fin'], name='cita_paciente_intervalo'),
+        ),
+        migrations.RunPython(usar_intervalos, volver_a_bloques_fijos),
+    ]
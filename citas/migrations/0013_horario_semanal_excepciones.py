@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0012_cita_duracion_intervalo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExcepcionHorario',
+            fields=[
+                ('id_excepcion', models.AutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('hora_inicio', models.TimeField(blank=True, null=True)),
+                ('hora_fin', models.TimeField(blank=True, null=True)),
+                ('tipo', models.CharField(choices=[('bloqueo', 'Bloqueo'), ('extra', 'Horario extra')], default='bloqueo', max_length=20)),
+                ('motivo', models.CharField(blank=True, default='', max_length=255)),
+                ('id_odontologo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='excepciones_horario', to='citas.odontologo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['id_odontologo', 'fecha'], name='excepcion_odontologo_fecha')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HorarioSemanal',
+            fields=[
+                ('id_horario', models.AutoField(primary_key=True, serialize=False)),
+                ('dia_semana', models.PositiveSmallIntegerField(choices=[(0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'), (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo')])),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fin', models.TimeField()),
+                ('duracion_slot', models.PositiveSmallIntegerField(default=60)),
+                ('vigente_desde', models.DateField(blank=True, null=True)),
+                ('vigente_hasta', models.DateField(blank=True, null=True)),
+                ('id_odontologo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='horarios', to='citas.odontologo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['id_odontologo', 'dia_semana'], name='horario_odontologo_dia')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0013_horario_semanal_excepciones'),
+        ('pacientes', '0004_archivoclinico_archivo_fecha_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha', 'id_cita'], name='cita_fecha'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0014_cita_cita_fecha'),
+        ('seguridad_y_personal', '0011_evento_sincronizacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='odontologo',
+            name='telefono_normalizado',
+            field=models.CharField(blank=True, default='', editable=False, max_length=15),
+        ),
+        migrations.AddIndex(
+            model_name='odontologo',
+            index=models.Index(fields=['telefono_normalizado'], name='odontologo_telefono_norm'),
+        ),
+    ]
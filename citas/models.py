@@ -1,7 +1,14 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.auth.hashers import make_password
-from django.core.validators import RegexValidator
+from django.core.validators import RegexValidator, MinValueValidator, MaxValueValidator
+from datetime import timedelta
+
+from pacientes.normalizacion import telefono_canonico
+
+# Límites de duración de una cita (minutos). El máximo acota las búsquedas de solapamiento por índice.
+DURACION_CITA_MINUTOS = 60
+DURACION_MAXIMA_MINUTOS = 480
 
 # Create your models here.
 # Clase para los odontólogos
@@ -14,6 +21,8 @@ class Odontologo(models.Model):
     nombre = models.CharField(max_length=255)  # Nombre del odontólogo
     especialidad = models.CharField(max_length=100)  # Especialidad del odontólogo
     telefono = models.CharField(max_length=15)  # Teléfono de contacto
+    # Teléfono canónico (pacientes.normalizacion.telefono_canonico), se calcula al guardar
+    telefono_normalizado = models.CharField(max_length=15, blank=True, default='', editable=False)
     email = models.EmailField(max_length=255)  # Correo electrónico
     matricula_profesional = models.CharField(
         max_length=100,
@@ -24,6 +33,16 @@ class Odontologo(models.Model):
         ]
     )  # Matrícula profesional (solo letras y números)
 
+    class Meta:
+        indexes = [models.Index(fields=['telefono_normalizado'], name='odontologo_telefono_norm')]
+
+    def save(self, *args, **kwargs):
+        self.telefono_normalizado = telefono_canonico(self.telefono)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'telefono' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'telefono_normalizado'}
+        super().save(*args, **kwargs)
+
     def delete(self, *args, **kwargs):
         # Eliminar el usuario asociado si existe
         if self.user:
@@ -44,6 +63,45 @@ class Cita(models.Model):
     estado = models.CharField(max_length=50, choices=[('pendiente', 'Pendiente'), 
                                                      ('confirmada', 'Confirmada'), 
                                                      ('cancelada', 'Cancelada')])  # Estado de la cita
+    duracion = models.PositiveSmallIntegerField(
+        default=DURACION_CITA_MINUTOS,
+        validators=[MinValueValidator(5), MaxValueValidator(DURACION_MAXIMA_MINUTOS)],
+    )  # Duración en minutos
+    fecha_fin = models.DateTimeField(editable=False)  # Fin de la cita (fecha + duracion), se calcula al guardar
+
+    class Meta:
+        # Índices parciales: las búsquedas de conflictos solo miran citas activas,
+        # así que las canceladas no ocupan espacio en el índice.
+        indexes = [
+            # Incluyen fecha_fin para resolver el solapamiento sin leer la tabla.
+            models.Index(
+                fields=['id_odontologo', 'fecha', 'fecha_fin'],
+                name='cita_odontologo_intervalo',
+                condition=~models.Q(estado='cancelada'),
+            ),
+            models.Index(
+                fields=['id_paciente', 'fecha', 'fecha_fin'],
+                name='cita_paciente_intervalo',
+                condition=~models.Q(estado='cancelada'),
+            ),
+            # Listado general (todas las citas, incluidas canceladas) paginado por fecha
+            models.Index(fields=['fecha', 'id_cita'], name='cita_fecha'),
+        ]
+
+    def calcular_fin(self):
+        """Actualiza fecha_fin a partir de fecha y duracion (también usado antes de bulk_create)."""
+        if self.fecha is not None:
+            # Admite cadenas ISO como el resto de DateTimeField (p.ej. objects.create(fecha='...'))
+            self.fecha = self._meta.get_field('fecha').to_python(self.fecha)
+            self.fecha_fin = self.fecha + timedelta(minutes=self.duracion or DURACION_CITA_MINUTOS)
+        return self.fecha_fin
+
+    def save(self, *args, **kwargs):
+        self.calcular_fin()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ('fecha' in update_fields or 'duracion' in update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'fecha_fin'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Cita de {self.id_paciente.nombre} con {self.id_odontologo.nombre if self.id_odontologo else '-'} - {self.estado}"
@@ -57,4 +115,53 @@ class Disponibilidad(models.Model):
                                                      ('ocupado', 'Ocupado')])  # Estado de la disponibilidad
 
     def __str__(self):
-        return f"Disponibilidad de {self.id_odontologo.nombre} - {self.estado} en {self.fecha}"
\ No newline at end of file
+        return f"Disponibilidad de {self.id_odontologo.nombre} - {self.estado} en {self.fecha}"
+
+# Plantilla semanal de atención del odontólogo (p.ej. lunes 08:00–12:00).
+# - Reemplaza la publicación de una Disponibilidad por cada fecha: las reglas se expanden
+#   en horarios concretos solo para la ventana consultada (ver citas/agenda.py).
+class HorarioSemanal(models.Model):
+    DIAS_SEMANA = [
+        (0, 'Lunes'),
+        (1, 'Martes'),
+        (2, 'Miércoles'),
+        (3, 'Jueves'),
+        (4, 'Viernes'),
+        (5, 'Sábado'),
+        (6, 'Domingo'),
+    ]
+    id_horario = models.AutoField(primary_key=True)  # ID único de la regla
+    id_odontologo = models.ForeignKey(Odontologo, on_delete=models.CASCADE, related_name='horarios')  # Odontólogo (FK)
+    dia_semana = models.PositiveSmallIntegerField(choices=DIAS_SEMANA)  # Día de la semana (0 = lunes)
+    hora_inicio = models.TimeField()  # Inicio de la atención
+    hora_fin = models.TimeField()  # Fin de la atención
+    duracion_slot = models.PositiveSmallIntegerField(default=DURACION_CITA_MINUTOS)  # Minutos por horario publicado
+    vigente_desde = models.DateField(null=True, blank=True)  # Primer día en que aplica (opcional)
+    vigente_hasta = models.DateField(null=True, blank=True)  # Último día en que aplica (opcional)
+
+    class Meta:
+        indexes = [models.Index(fields=['id_odontologo', 'dia_semana'], name='horario_odontologo_dia')]
+
+    def __str__(self):
+        return f"{self.id_odontologo.nombre} - {self.get_dia_semana_display()} {self.hora_inicio}-{self.hora_fin}"
+
+
+# Excepciones a la plantilla semanal: bloqueos (vacaciones, feriados) u horas extra en una fecha.
+class ExcepcionHorario(models.Model):
+    TIPOS = [
+        ('bloqueo', 'Bloqueo'),
+        ('extra', 'Horario extra'),
+    ]
+    id_excepcion = models.AutoField(primary_key=True)  # ID único de la excepción
+    id_odontologo = models.ForeignKey(Odontologo, on_delete=models.CASCADE, related_name='excepciones_horario')  # Odontólogo (FK)
+    fecha = models.DateField()  # Día afectado
+    hora_inicio = models.TimeField(null=True, blank=True)  # Sin horas = todo el día
+    hora_fin = models.TimeField(null=True, blank=True)
+    tipo = models.CharField(max_length=20, choices=TIPOS, default='bloqueo')  # Bloquea o agrega horario
+    motivo = models.CharField(max_length=255, blank=True, default='')  # Descripción opcional
+
+    class Meta:
+        indexes = [models.Index(fields=['id_odontologo', 'fecha'], name='excepcion_odontologo_fecha')]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} de {self.id_odontologo.nombre} el {self.fecha}"
@@ -1,5 +1,9 @@
 from rest_framework import serializers
-from .models import Odontologo, Cita, Disponibilidad
+from .models import (
+    Odontologo, Cita, Disponibilidad, HorarioSemanal, ExcepcionHorario,
+    DURACION_CITA_MINUTOS, DURACION_MAXIMA_MINUTOS,
+)
+from pacientes.models import Paciente
 
 class OdontologoSerializer(serializers.ModelSerializer):
     # Exponer matriculaProfesional en formato camelCase hacia el frontend
@@ -34,7 +38,65 @@ class CitaSerializer(serializers.ModelSerializer):
         model = Cita
         fields = '__all__'
 
+class CitaLoteItemSerializer(serializers.Serializer):
+    """Elemento de una reserva por lote. Valida solo formato: la existencia de pacientes y
+    odontólogos se comprueba para todo el lote con una consulta por tabla."""
+    id_paciente = serializers.IntegerField()
+    id_odontologo = serializers.IntegerField(required=False, allow_null=True)
+    fecha = serializers.DateTimeField()
+    duracion = serializers.IntegerField(required=False, default=DURACION_CITA_MINUTOS, min_value=5, max_value=DURACION_MAXIMA_MINUTOS)
+
+class SerieCitasSerializer(serializers.Serializer):
+    """Definición de una serie recurrente: primera fecha, intervalo y número de repeticiones."""
+    id_paciente = serializers.PrimaryKeyRelatedField(queryset=Paciente.objects.all())
+    id_odontologo = serializers.PrimaryKeyRelatedField(queryset=Odontologo.objects.all())
+    fecha_inicio = serializers.DateTimeField()
+    intervalo_dias = serializers.IntegerField(min_value=1, max_value=365, default=14)
+    repeticiones = serializers.IntegerField(min_value=1, max_value=104)
+    duracion = serializers.IntegerField(required=False, default=DURACION_CITA_MINUTOS, min_value=5, max_value=DURACION_MAXIMA_MINUTOS)
+    tolerancia_dias = serializers.IntegerField(min_value=0, max_value=14, default=3)
+    confirmar = serializers.BooleanField(default=True)
+
 class DisponibilidadSerializer(serializers.ModelSerializer):
+    # 'registro' = fila guardada en Disponibilidad; 'plantilla' = horario expandido de HorarioSemanal (sin id)
+    origen = serializers.SerializerMethodField()
+
     class Meta:
         model = Disponibilidad
         fields = '__all__'
+
+    def get_origen(self, obj):
+        return 'registro' if obj.pk else 'plantilla'
+
+class HorarioSemanalSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HorarioSemanal
+        fields = '__all__'
+
+    def validate(self, attrs):
+        inicio = attrs.get('hora_inicio', getattr(self.instance, 'hora_inicio', None))
+        fin = attrs.get('hora_fin', getattr(self.instance, 'hora_fin', None))
+        if inicio and fin and fin <= inicio:
+            raise serializers.ValidationError('hora_fin debe ser posterior a hora_inicio.')
+        desde = attrs.get('vigente_desde', getattr(self.instance, 'vigente_desde', None))
+        hasta = attrs.get('vigente_hasta', getattr(self.instance, 'vigente_hasta', None))
+        if desde and hasta and hasta < desde:
+            raise serializers.ValidationError('vigente_hasta no puede ser anterior a vigente_desde.')
+        return attrs
+
+class ExcepcionHorarioSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ExcepcionHorario
+        fields = '__all__'
+
+    def validate(self, attrs):
+        inicio = attrs.get('hora_inicio', getattr(self.instance, 'hora_inicio', None))
+        fin = attrs.get('hora_fin', getattr(self.instance, 'hora_fin', None))
+        tipo = attrs.get('tipo', getattr(self.instance, 'tipo', 'bloqueo'))
+        if (inicio is None) != (fin is None):
+            raise serializers.ValidationError('Indique hora_inicio y hora_fin, o ninguna para todo el día.')
+        if inicio and fin and fin <= inicio:
+            raise serializers.ValidationError('hora_fin debe ser posterior a hora_inicio.')
+        if tipo == 'extra' and inicio is None:
+            raise serializers.ValidationError('Un horario extra requiere hora_inicio y hora_fin.')
+        return attrs
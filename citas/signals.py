@@ -1,6 +1,9 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
-from .models import Odontologo
+from backend.cache import invalidar
+from pacientes.models import Paciente
+from .agenda import invalidar_agenda_dia
+from .models import Odontologo, Cita, Disponibilidad, HorarioSemanal, ExcepcionHorario
 
 # Deshabilitado: la creación y eliminación del User asociado
 # se maneja explícitamente en el formulario y en el método delete del modelo.
@@ -15,12 +18,101 @@ def eliminar_user_auth_odontologo(sender, instance, **kwargs):
     """Eliminar el usuario de auth asociado también en borrados masivos.
 
     Usamos user_id directamente para evitar fallos de acceso lazy tras el delete.
+    La eliminación se encola en el outbox de sincronización (seguridad_y_personal/sincronizacion.py).
     """
     try:
         user_id = getattr(instance, 'user_id', None)
         if user_id:
-            from django.contrib.auth.models import User
-            User.objects.filter(pk=user_id).delete()
+            from seguridad_y_personal.sincronizacion import encolar
+            encolar('auth_user_baja', f'auth_user:{user_id}', {'user_id': user_id})
     except Exception:
         # Evitar romper el flujo de borrado si algo falla
         pass
+
+
+# --- Invalidación de la agenda diaria cacheada (ver citas/agenda.py: agenda_del_dia) ---
+# Al cargar una instancia se recuerda su (odontólogo, inicio, fin) para invalidar también el día
+# anterior cuando una edición mueve la cita/disponibilidad a otra fecha u odontólogo.
+# Se lee de __dict__ para no disparar consultas con campos diferidos (only()/defer()).
+
+def _valor(instance, campo):
+    # Normaliza valores asignados como texto (p.ej. create(fecha='2026-01-01 10:00'))
+    valor = instance.__dict__.get(campo)
+    return instance._meta.get_field(campo).to_python(valor) if isinstance(valor, str) else valor
+
+
+def _ubicacion(instance):
+    inicio = _valor(instance, 'fecha')
+    fin = _valor(instance, 'fecha_fin') if 'fecha_fin' in instance.__dict__ else None
+    return instance.__dict__.get('id_odontologo_id'), inicio, fin or inicio
+
+
+@receiver(post_init, sender=Cita)
+@receiver(post_init, sender=Disponibilidad)
+def recordar_ubicacion_agenda(sender, instance, **kwargs):
+    instance._agenda_previa = _ubicacion(instance)
+
+
+@receiver(post_save, sender=Cita)
+@receiver(post_delete, sender=Cita)
+@receiver(post_save, sender=Disponibilidad)
+@receiver(post_delete, sender=Disponibilidad)
+def invalidar_agenda_por_cambio(sender, instance, **kwargs):
+    try:
+        actual = _ubicacion(instance)
+        previa = getattr(instance, '_agenda_previa', None)
+        invalidar_agenda_dia(*actual)
+        if previa and previa != actual:
+            invalidar_agenda_dia(*previa)
+        instance._agenda_previa = actual
+    except Exception:
+        # La caché no debe romper el guardado; en el peor caso la entrada expira por timeout
+        pass
+
+
+# Borrar un odontólogo deja sus citas con id_odontologo NULL mediante un UPDATE (SET_NULL) que no emite
+# señales de Cita. Se rota su ámbito completo, que cubre todos sus días cacheados.
+@receiver(post_delete, sender=Odontologo)
+def invalidar_agenda_por_odontologo(sender, instance, **kwargs):
+    try:
+        invalidar(f'agenda:od:{instance.pk}')
+    except Exception:
+        pass
+
+
+@receiver(post_init, sender=ExcepcionHorario)
+def recordar_dia_excepcion(sender, instance, **kwargs):
+    instance._agenda_previa = (instance.__dict__.get('id_odontologo_id'), _valor(instance, 'fecha'))
+
+
+@receiver(post_save, sender=ExcepcionHorario)
+@receiver(post_delete, sender=ExcepcionHorario)
+def invalidar_agenda_por_excepcion(sender, instance, **kwargs):
+    try:
+        actual = (instance.id_odontologo_id, _valor(instance, 'fecha'))
+        dias = {actual, getattr(instance, '_agenda_previa', (None, None))}
+        invalidar(*(f'agenda:od:{od}:{fecha.isoformat()}' for od, fecha in dias if od and fecha))
+        instance._agenda_previa = actual
+    except Exception:
+        pass
+
+
+@receiver(post_save, sender=HorarioSemanal)
+@receiver(post_delete, sender=HorarioSemanal)
+def invalidar_agenda_por_horario(sender, instance, **kwargs):
+    # Una regla semanal afecta a todos los días del odontólogo: se rota su ámbito completo
+    try:
+        invalidar(f'agenda:od:{instance.id_odontologo_id}')
+    except Exception:
+        pass
+
+
+@receiver(post_save, sender=Paciente)
+def invalidar_agenda_por_paciente(sender, instance, created, **kwargs):
+    # La agenda muestra el nombre del paciente; un paciente nuevo aún no tiene citas
+    if created:
+        return
+    try:
+        invalidar('agenda')
+    except Exception:
+        pass
@@ -1,3 +1,289 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+
+from pacientes.models import Paciente
+from .agenda import agenda_del_dia, parsear_limite, programar_serie
+from .conflictos import ConflictoHorario, MENSAJE_ODONTOLOGO, MENSAJE_PACIENTE, reservar_lote, verificar_conflictos
+from .models import Cita, ExcepcionHorario, HorarioSemanal, Odontologo
+
+DIA = datetime(2026, 3, 2)
+CACHE_LOCAL = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'},
+    'versiones': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-versiones'},
+    'sesiones': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-sesiones'},
+}
+
+
+def a_las(hora, minuto=0, dia=DIA):
+    return dia.replace(hour=hora, minute=minuto)
+
+
+class BaseCitas(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        datos = dict(fecha_nacimiento='1990-01-01', direccion='x', email='p@x.com')
+        cls.ana = Paciente.objects.create(nombre='Ana Ríos', telefono='70000001', **datos)
+        cls.beto = Paciente.objects.create(nombre='Beto Paz', telefono='70000002', **datos)
+        cls.odontologo = Odontologo.objects.create(
+            nombre='Dra. Vega', especialidad='General', telefono='70000003', email='o@x.com',
+        )
+        cls.otro_odontologo = Odontologo.objects.create(
+            nombre='Dr. Luna', especialidad='General', telefono='70000004', email='l@x.com',
+        )
+
+    def cita(self, paciente, fecha, odontologo=None, estado='pendiente', duracion=60, guardar=True):
+        cita = Cita(id_paciente=paciente, id_odontologo=odontologo, fecha=fecha, estado=estado, duracion=duracion)
+        if guardar:
+            cita.save()
+        return cita
+
+
+class SolapamientoTests(BaseCitas):
+    def test_odontologo_con_cita_solapada(self):
+        self.cita(self.ana, a_las(10), self.odontologo)
+        with self.assertRaisesMessage(ConflictoHorario, MENSAJE_ODONTOLOGO):
+            verificar_conflictos(self.beto, self.odontologo, a_las(10, 30))
+
+    def test_paciente_con_cita_solapada(self):
+        self.cita(self.ana, a_las(10), self.odontologo)
+        with self.assertRaisesMessage(ConflictoHorario, MENSAJE_PACIENTE):
+            verificar_conflictos(self.ana, self.otro_odontologo, a_las(9, 30))
+
+    def test_citas_contiguas_no_chocan(self):
+        self.cita(self.ana, a_las(10), self.odontologo)
+        verificar_conflictos(self.ana, self.odontologo, a_las(11))
+        verificar_conflictos(self.ana, self.odontologo, a_las(9))
+        self.cita(self.ana, a_las(11), self.odontologo)
+        self.cita(self.ana, a_las(9), self.odontologo)
+        self.assertEqual(Cita.objects.count(), 3)
+
+    def test_editar_no_choca_consigo_misma(self):
+        cita = self.cita(self.ana, a_las(10), self.odontologo)
+        verificar_conflictos(self.ana, self.odontologo, a_las(10, 15), excluir_id=cita.pk)
+
+    def test_la_base_rechaza_el_solape(self):
+        # Garantía de la base de datos (triggers/restricción de exclusión), sin pasar por la validación
+        self.cita(self.ana, a_las(10), self.odontologo)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.cita(self.beto, a_las(10, 59), self.odontologo)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.cita(self.ana, a_las(9, 1), self.otro_odontologo)
+        self.cita(self.beto, a_las(11), self.odontologo)
+
+    def test_la_base_rechaza_el_solape_al_editar(self):
+        self.cita(self.ana, a_las(10), self.odontologo)
+        otra = self.cita(self.beto, a_las(12), self.odontologo)
+        otra.fecha = a_las(10, 30)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            otra.save()
+
+
+class CanceladasTests(BaseCitas):
+    def test_cita_cancelada_no_ocupa_el_horario(self):
+        self.cita(self.ana, a_las(10), self.odontologo, estado='cancelada')
+        verificar_conflictos(self.beto, self.odontologo, a_las(10))
+        verificar_conflictos(self.ana, self.otro_odontologo, a_las(10))
+        self.cita(self.beto, a_las(10), self.odontologo)
+
+    def test_cancelar_libera_el_horario(self):
+        cita = self.cita(self.ana, a_las(10), self.odontologo)
+        cita.estado = 'cancelada'
+        cita.save()
+        self.cita(self.beto, a_las(10, 30), self.odontologo)
+
+    def test_canceladas_pueden_solaparse_entre_si(self):
+        self.cita(self.ana, a_las(10), self.odontologo, estado='cancelada')
+        self.cita(self.beto, a_las(10), self.odontologo, estado='cancelada')
+        self.assertEqual(Cita.objects.filter(estado='cancelada').count(), 2)
+
+    def test_reactivar_sobre_horario_ocupado(self):
+        cancelada = self.cita(self.ana, a_las(10), self.odontologo, estado='cancelada')
+        self.cita(self.beto, a_las(10), self.odontologo)
+        cancelada.estado = 'pendiente'
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            cancelada.save()
+
+
+class ReservarLoteTests(BaseCitas):
+    def lote(self):
+        return [
+            self.cita(self.ana, a_las(9), self.odontologo, guardar=False),
+            self.cita(self.beto, a_las(10), self.odontologo, guardar=False),  # choca con la existente
+            self.cita(self.ana, a_las(9, 30), self.otro_odontologo, guardar=False),  # choca con la 1.ª del lote
+            self.cita(self.beto, a_las(11), self.odontologo, guardar=False),
+        ]
+
+    def setUp(self):
+        self.cita(self.ana, a_las(10), self.odontologo)
+
+    def test_parcial_crea_las_que_caben(self):
+        resultados = reservar_lote(self.lote())
+        self.assertEqual(resultados, [None, MENSAJE_ODONTOLOGO, MENSAJE_PACIENTE, None])
+        self.assertEqual(
+            sorted(Cita.objects.values_list('fecha', flat=True)),
+            [a_las(9), a_las(10), a_las(11)],
+        )
+
+    def test_todo_o_nada_no_crea_ninguna(self):
+        resultados = reservar_lote(self.lote(), todo_o_nada=True)
+        self.assertEqual(resultados, [None, MENSAJE_ODONTOLOGO, MENSAJE_PACIENTE, None])
+        self.assertEqual(Cita.objects.count(), 1)
+
+    def test_todo_o_nada_sin_conflictos_crea_todas(self):
+        lote = [
+            self.cita(self.ana, a_las(8), self.odontologo, guardar=False),
+            self.cita(self.beto, a_las(9), self.odontologo, guardar=False),
+        ]
+        self.assertEqual(reservar_lote(lote, todo_o_nada=True), [None, None])
+        self.assertEqual(Cita.objects.count(), 3)
+
+    def test_cancelada_en_el_lote_no_ocupa(self):
+        lote = [
+            self.cita(self.beto, a_las(10), self.odontologo, estado='cancelada', guardar=False),
+            self.cita(self.beto, a_las(11), self.odontologo, guardar=False),
+        ]
+        self.assertEqual(reservar_lote(lote), [None, None])
+        self.assertEqual(Cita.objects.count(), 3)
+
+
+class ProgramarSerieTests(BaseCitas):
+    def test_sin_conflictos_respeta_los_objetivos(self):
+        objetivos = [a_las(10, dia=DIA + timedelta(weeks=i)) for i in range(3)]
+        citas = programar_serie(self.ana.pk, self.odontologo.pk, objetivos)
+        self.assertEqual([c.fecha for c in citas], objetivos)
+        self.assertEqual(Cita.objects.filter(id_paciente=self.ana).count(), 3)
+
+    def test_desplaza_al_hueco_libre_mas_cercano(self):
+        self.cita(self.beto, a_las(9, 30), self.odontologo)  # ocupa 9:30-10:30
+        citas = programar_serie(self.ana.pk, self.odontologo.pk, [a_las(10)])
+        self.assertEqual(citas[0].fecha, a_las(10, 30))
+
+    def test_considera_las_citas_del_paciente(self):
+        self.cita(self.ana, a_las(10), self.otro_odontologo)
+        citas = programar_serie(self.ana.pk, self.odontologo.pk, [a_las(10, 15)])
+        self.assertEqual(citas[0].fecha, a_las(11))
+
+    def test_no_se_solapa_con_la_propia_serie(self):
+        citas = programar_serie(self.ana.pk, self.odontologo.pk, [a_las(10), a_las(10, 30)])
+        self.assertEqual([c.fecha for c in citas], [a_las(10), a_las(11)])
+
+    def test_sin_hueco_dentro_de_la_tolerancia(self):
+        self.cita(self.beto, a_las(10), self.odontologo)
+        citas = programar_serie(
+            self.ana.pk, self.odontologo.pk, [a_las(10, 30), a_las(14)], tolerancia=timedelta(minutes=15),
+        )
+        self.assertIsNone(citas[0])
+        self.assertEqual(citas[1].fecha, a_las(14))
+        self.assertEqual(Cita.objects.filter(id_paciente=self.ana).count(), 1)
+
+    def test_sin_confirmar_no_guarda(self):
+        citas = programar_serie(self.ana.pk, self.odontologo.pk, [a_las(10)], confirmar=False)
+        self.assertEqual(citas[0].fecha, a_las(10))
+        self.assertIsNone(citas[0].pk)
+        self.assertFalse(Cita.objects.exists())
+
+    def test_respeta_la_agenda_publicada(self):
+        HorarioSemanal.objects.create(
+            id_odontologo=self.odontologo, dia_semana=DIA.weekday(), hora_inicio=time(14), hora_fin=time(18),
+        )
+        citas = programar_serie(self.ana.pk, self.odontologo.pk, [a_las(10)], tolerancia=timedelta(hours=6))
+        self.assertEqual(citas[0].fecha, a_las(14))
+
+    def test_regla_vencida_no_abre_horario(self):
+        HorarioSemanal.objects.create(
+            id_odontologo=self.odontologo, dia_semana=DIA.weekday(), hora_inicio=time(8), hora_fin=time(18),
+            vigente_hasta=date(2026, 1, 31),
+        )
+        citas = programar_serie(self.ana.pk, self.odontologo.pk, [a_las(10)])
+        self.assertEqual(citas, [None])
+        self.assertFalse(Cita.objects.exists())
+
+    def test_solo_bloqueos_no_abre_horario(self):
+        ExcepcionHorario.objects.create(id_odontologo=self.odontologo, fecha=DIA.date(), tipo='bloqueo')
+        citas = programar_serie(self.ana.pk, self.odontologo.pk, [a_las(10)])
+        self.assertEqual(citas, [None])
+        self.assertFalse(Cita.objects.exists())
+
+
+@override_settings(DISABLE_ROLE_PERMS=True)
+class ExcepcionesHorarioApiTests(BaseCitas):
+    url = '/citas/api/excepciones_horario/'
+
+    def test_filtra_por_rango_de_fechas(self):
+        for dia in (1, 2, 3):
+            ExcepcionHorario.objects.create(id_odontologo=self.odontologo, fecha=date(2026, 3, dia))
+        respuesta = self.client.get(self.url, {'desde': '2026-03-02', 'hasta': '2026-03-03'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([e['fecha'] for e in respuesta.json()['results']], ['2026-03-02', '2026-03-03'])
+
+    def test_fecha_invalida_es_400(self):
+        for valor in ('foo', '2026-02-30', '2026-03-02T10:00'):
+            respuesta = self.client.get(self.url, {'desde': valor})
+            self.assertEqual(respuesta.status_code, 400, valor)
+
+
+@override_settings(DISABLE_ROLE_PERMS=True)
+class HorariosLibresApiTests(BaseCitas):
+    def test_limite_con_zona_horaria_se_convierte_a_hora_local(self):
+        self.assertEqual(parsear_limite('2026-03-02T10:00:00-04:00'), a_las(14))
+        self.assertEqual(parsear_limite('2026-03-02T10:00:00Z'), a_las(10))
+        self.assertEqual(parsear_limite('2026-03-02', fin_de_dia=True), DIA + timedelta(days=1))
+
+    def test_libres_con_zona_horaria(self):
+        HorarioSemanal.objects.create(
+            id_odontologo=self.odontologo, dia_semana=DIA.weekday(), hora_inicio=time(8), hora_fin=time(18),
+        )
+        respuesta = self.client.get(
+            '/citas/api/disponibilidades/libres/',
+            {'desde': '2026-03-02T10:00:00-04:00', 'hasta': '2026-03-02'},
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        libres = respuesta.json()['odontologos'][0]['libres']
+        self.assertEqual((libres[0]['inicio'], libres[-1]['fin']), ('2026-03-02T14:00:00', '2026-03-02T18:00:00'))
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class AgendaCacheadaTests(BaseCitas):
+    def setUp(self):
+        cache.clear()
+
+    def agenda(self, odontologo=None, dia=DIA):
+        datos = agenda_del_dia((odontologo or self.odontologo).pk, dia.date(), lambda filas: [])
+        return [(c['fecha'], c['paciente']) for c in datos['citas']]
+
+    def test_cita_nueva_invalida_el_dia(self):
+        self.assertEqual(self.agenda(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cita(self.ana, a_las(10), self.odontologo)
+        self.assertEqual(self.agenda(), [(a_las(10), 'Ana Ríos')])
+
+    def test_mover_la_cita_invalida_ambos_dias(self):
+        cita = self.cita(self.ana, a_las(10), self.odontologo)
+        otro_dia = DIA + timedelta(days=1)
+        self.assertEqual(len(self.agenda()), 1)
+        self.assertEqual(self.agenda(dia=otro_dia), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            cita = Cita.objects.get(pk=cita.pk)
+            cita.fecha = a_las(10, dia=otro_dia)
+            cita.save()
+        self.assertEqual(self.agenda(), [])
+        self.assertEqual(len(self.agenda(dia=otro_dia)), 1)
+
+    def test_renombrar_paciente_invalida_la_agenda(self):
+        self.cita(self.ana, a_las(10), self.odontologo)
+        self.agenda()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ana.nombre = 'Ana María Ríos'
+            self.ana.save()
+        self.assertEqual(self.agenda(), [(a_las(10), 'Ana María Ríos')])
+
+    def test_borrar_el_odontologo_invalida_su_agenda(self):
+        self.cita(self.ana, a_las(10), self.odontologo)
+        pk = self.odontologo.pk
+        self.assertEqual(len(self.agenda()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Odontologo.objects.filter(pk=pk).delete()
+        self.assertEqual(agenda_del_dia(pk, DIA.date(), lambda filas: [])['citas'], [])
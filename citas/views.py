@@ -1,15 +1,31 @@
+import logging
 from django.shortcuts import render, redirect, get_object_or_404  # Helpers de vistas
 from django.contrib import messages  # Mensajes flash
+from datetime import datetime, time, timedelta  # Rangos y duraciones de horarios
+from django.db import transaction
+from django.utils.dateparse import parse_date
 from .models import Cita  # Modelo Cita
 from .forms import CitaForm  # Formulario Cita
-from datetime import timedelta  # Para validar rangos de 1 hora
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import Odontologo, Cita, Disponibilidad
-from .serializers import OdontologoSerializer, CitaSerializer, DisponibilidadSerializer
-from seguridad_y_personal.models import Bitacora, Usuario, Rol, UsuarioRol
+from rest_framework.exceptions import ValidationError
+from .models import Odontologo, Cita, Disponibilidad, HorarioSemanal, ExcepcionHorario
+from .serializers import (
+    OdontologoSerializer, CitaSerializer, DisponibilidadSerializer,
+    HorarioSemanalSerializer, ExcepcionHorarioSerializer, CitaLoteItemSerializer, SerieCitasSerializer,
+)
+from .conflictos import ConflictoHorario, guardar_formulario_sin_conflictos, guardar_sin_conflictos, reservar_lote
+from pacientes.models import Paciente
+from .agenda import (
+    MAX_DIAS_BUSQUEDA, horarios_libres, parsear_limite, listar_disponibilidad, programar_serie, agenda_del_dia,
+)
+from seguridad_y_personal.models import Usuario, Rol, UsuarioRol
+from seguridad_y_personal.auditoria import actor, actor_id, diferencias, evento, registrar, registrar_varios
 from seguridad_y_personal.permissions import RolesPermission
+from backend import exportacion
+
+logger = logging.getLogger(__name__)
 
 # Este módulo combina views HTML clásicas (para compatibilidad) y APIs DRF.
 # El frontend moderno consume principalmente los ViewSets.
@@ -18,11 +34,19 @@ def listado_citas(request):  # READ: lista de citas
     citas = Cita.objects.all()  # Todas las citas
     return render(request, 'citas/listado_citas.html', {'citas': citas})  # Manda al template
 
+def _guardar_formulario(form):
+    """Guarda el CitaForm bajo bloqueo; si otra reserva ocupó el horario entre la validación y el guardado,
+    el conflicto queda como error del formulario (se vuelve a mostrar) y devuelve None."""
+    try:
+        return guardar_formulario_sin_conflictos(form)
+    except ConflictoHorario as e:
+        form.add_error(None, str(e.detail))
+        return None
+
 def crear_cita(request):  # CREATE: crear cita
     if request.method == 'POST':  # Si envían form
         form = CitaForm(request.POST)  # Pobla con POST
-        if form.is_valid():  # Valida datos
-            form.save()  # Inserta
+        if form.is_valid() and _guardar_formulario(form):  # Valida e inserta sin solapes
             messages.success(request, 'Cita creada correctamente')  # Éxito
             return redirect('listado_citas')  # Redirige
     else:
@@ -33,8 +57,7 @@ def editar_cita(request, id_cita):  # UPDATE: editar cita
     cita = get_object_or_404(Cita, pk=id_cita)  # Obtiene o 404
     if request.method == 'POST':  # Si envían cambios
         form = CitaForm(request.POST, instance=cita)  # Edición con instancia
-        if form.is_valid():  # Valida
-            form.save()  # Guarda cambios
+        if form.is_valid() and _guardar_formulario(form):  # Valida y guarda sin solapes
             messages.success(request, 'Cita actualizada correctamente')  # Éxito
             return redirect('listado_citas')  # Redirige
     else:
@@ -63,25 +86,19 @@ class OdontologoViewSet(viewsets.ModelViewSet):
     # CU22: Gestionar odontólogo - este ViewSet expone CRUD completo sobre Odontologo.
     # Puedes usar filtros básicos desde el frontend (e.g., ?search=nombre) si añades SearchFilter aquí.
 
-    # Bitácora: registrar creación/edición/eliminación de odontólogos
-    def _actor(self, request):
-        try:
-            user_id = request.session.get('usuario_id')
-            if not user_id:
-                return None
-            return Usuario.objects.filter(pk=user_id).first()
-        except Exception:
-            return None
+    # Bitácora: registrar creación/edición/eliminación de odontólogos (ver seguridad_y_personal/auditoria.py)
 
-    def perform_create(self, serializer):
-        # Guardar odontólogo
-        odontologo = serializer.save()
-        # Crear/actualizar usuario de seguridad si vienen username/contrasena
+    def _provisionar_usuario_seguridad(self, odontologo):
+        """Crea/actualiza el Usuario de seguridad del odontólogo si vienen username/contrasena,
+        le asigna el rol odontologo y lo vincula. En una sola transacción: los efectos encolados
+        por las señales (auth.User, Odontologo por rol) se aplican con el vínculo ya guardado."""
+        username = self.request.data.get('username', '')
+        contrasena = self.request.data.get('contrasena', '')
+        email = odontologo.email or ''
+        if not (email and (username or contrasena)):
+            return
         try:
-            username = self.request.data.get('username', '')
-            contrasena = self.request.data.get('contrasena', '')
-            email = odontologo.email or ''
-            if email and (username or contrasena):
+            with transaction.atomic():
                 usuario_sec, created = Usuario.objects.get_or_create(
                     correo=email,
                     defaults={
@@ -101,7 +118,7 @@ class OdontologoViewSet(viewsets.ModelViewSet):
                     usuario_sec.nombre = odontologo.nombre; cambios = True
                 if cambios:
                     usuario_sec.save()
-                # Asignar rol odontologo
+                # Asignar rol odontologo si no lo tiene
                 rol = Rol.objects.filter(nombre_rol__iexact='odontologo').first()
                 if not rol:
                     rol = Rol.objects.create(nombre_rol='odontologo', descripcion='Odontólogo')
@@ -111,79 +128,27 @@ class OdontologoViewSet(viewsets.ModelViewSet):
                     odontologo.usuario_seguridad = usuario_sec
                     odontologo.save(update_fields=['usuario_seguridad'])
         except Exception:
-            # No romper el flujo de creación por problemas de sincronización
-            pass
-        try:
-            actor = self._actor(self.request)
-            if actor:
-                Bitacora.objects.create(
-                    id_usuario=actor,
-                    accion=f"Creación de odontólogo: {getattr(odontologo, 'nombre', '')} (id={getattr(odontologo, 'id_odontologo', '')})",
-                )
-        except Exception:
-            pass
+            # No romper el flujo del odontólogo por problemas de sincronización
+            logger.exception('No se pudo vincular el usuario de seguridad del odontólogo %s', odontologo.pk)
+
+    def perform_create(self, serializer):
+        # Guardar odontólogo
+        odontologo = serializer.save()
+        self._provisionar_usuario_seguridad(odontologo)
+        registrar(actor_id(self.request), f"Creación de odontólogo: {getattr(odontologo, 'nombre', '')} (id={getattr(odontologo, 'id_odontologo', '')})",
+                  'creacion', odontologo)
 
     def perform_update(self, serializer):
+        cambios_auditoria = diferencias(serializer.instance, serializer.validated_data)
         odontologo = serializer.save()
-        # Actualizar usuario de seguridad si se envían username/contrasena
-        try:
-            username = self.request.data.get('username', '')
-            contrasena = self.request.data.get('contrasena', '')
-            email = odontologo.email or ''
-            if email and (username or contrasena):
-                usuario_sec = Usuario.objects.filter(correo=email).first()
-                if not usuario_sec:
-                    # Crear si no existe
-                    usuario_sec = Usuario.objects.create(
-                        correo=email,
-                        username=username or email,
-                        nombre=odontologo.nombre or username or email,
-                        contrasena=contrasena or '',
-                        estado='activo',
-                    )
-                else:
-                    cambios = False
-                    if username and usuario_sec.username != username:
-                        usuario_sec.username = username; cambios = True
-                    if contrasena and usuario_sec.contrasena != contrasena:
-                        usuario_sec.contrasena = contrasena; cambios = True
-                    if (odontologo.nombre or '') and usuario_sec.nombre != odontologo.nombre:
-                        usuario_sec.nombre = odontologo.nombre; cambios = True
-                    if cambios:
-                        usuario_sec.save()
-                # Asignar rol odontologo si no lo tiene
-                rol = Rol.objects.filter(nombre_rol__iexact='odontologo').first()
-                if not rol:
-                    rol = Rol.objects.create(nombre_rol='odontologo', descripcion='Odontólogo')
-                UsuarioRol.objects.get_or_create(id_usuario=usuario_sec, id_rol=rol)
-                # Vincular al odontólogo
-                if odontologo.usuario_seguridad_id != usuario_sec.id_usuario:
-                    odontologo.usuario_seguridad = usuario_sec
-                    odontologo.save(update_fields=['usuario_seguridad'])
-        except Exception:
-            pass
-        try:
-            actor = self._actor(self.request)
-            if actor:
-                Bitacora.objects.create(
-                    id_usuario=actor,
-                    accion=f"Edición de odontólogo: {getattr(odontologo, 'nombre', '')} (id={getattr(odontologo, 'id_odontologo', '')})",
-                )
-        except Exception:
-            pass
+        self._provisionar_usuario_seguridad(odontologo)
+        registrar(actor_id(self.request), f"Edición de odontólogo: {getattr(odontologo, 'nombre', '')} (id={getattr(odontologo, 'id_odontologo', '')})",
+                  'edicion', odontologo, datos=cambios_auditoria)
 
     def perform_destroy(self, instance):
         nombre = getattr(instance, 'nombre', '')
         oid = getattr(instance, 'id_odontologo', '')
-        try:
-            actor = self._actor(self.request)
-            if actor:
-                Bitacora.objects.create(
-                    id_usuario=actor,
-                    accion=f"Eliminación de odontólogo: {nombre} (id={oid})",
-                )
-        except Exception:
-            pass
+        registrar(actor_id(self.request), f"Eliminación de odontólogo: {nombre} (id={oid})", 'eliminacion', instance)
         instance.delete()
 
 class CitaViewSet(viewsets.ModelViewSet):
@@ -200,7 +165,51 @@ class CitaViewSet(viewsets.ModelViewSet):
         'destroy': ['recepcionista'],
         'cancelar': ['recepcionista'],
         'solicitar': ['recepcionista'],
+        'solicitar_lote': ['recepcionista'],
+        'programar_serie': ['recepcionista'],
+        'agenda': ['recepcionista', 'odontologo'],
+        'exportar': ['recepcionista'],
     }
+    # Paginación por cursor sobre el índice de fecha (las más recientes primero)
+    orden_cursor = ('-fecha', '-id_cita')
+
+    # Tamaño máximo de una reserva por lote
+    MAX_LOTE = 500
+
+    def get_queryset(self):
+        """
+        Filtros por query params (todos opcionales):
+        - desde, hasta (YYYY-MM-DD o ISO8601; 'hasta' con solo fecha es inclusivo): rango por fecha de inicio
+        - estado: pendiente | confirmada | cancelada
+        - id_odontologo, id_paciente
+        """
+        qs = super().get_queryset()
+        if self.action not in ('list', 'exportar'):
+            return qs
+        params = self.request.query_params
+        try:
+            desde = parsear_limite(params.get('desde'))
+            hasta = parsear_limite(params.get('hasta'), fin_de_dia=True)
+        except ValueError as e:
+            raise ValidationError({'detail': str(e)})
+        if desde:
+            qs = qs.filter(fecha__gte=desde)
+        if hasta:
+            qs = qs.filter(fecha__lt=hasta)
+        if params.get('estado'):
+            qs = qs.filter(estado=params['estado'])
+        if params.get('id_odontologo'):
+            qs = qs.filter(id_odontologo_id=params['id_odontologo'])
+        if params.get('id_paciente'):
+            qs = qs.filter(id_paciente_id=params['id_paciente'])
+        return qs
+
+    # Altas y ediciones directas pasan por el mismo motor de conflictos que `solicitar`
+    def perform_create(self, serializer):
+        guardar_sin_conflictos(serializer)
+
+    def perform_update(self, serializer):
+        guardar_sin_conflictos(serializer)
 
     @action(detail=True, methods=['post'])
     def cancelar(self, request, pk=None):
@@ -212,17 +221,34 @@ class CitaViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(cita)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """
+        Todas las citas (mismos filtros que el listado: desde, hasta, estado, id_odontologo, id_paciente)
+        con los nombres de paciente y odontólogo, en ?formato=csv|ndjson y en streaming por fecha.
+        """
+        qs = self.filter_queryset(self.get_queryset()).order_by('fecha', 'id_cita')
+        return exportacion.exportar(
+            request, qs,
+            ['id_cita', 'fecha', 'fecha_fin', 'duracion', 'estado',
+             'id_paciente_id', 'id_paciente__nombre', 'id_odontologo_id', 'id_odontologo__nombre'],
+            'citas',
+            encabezados=['id_cita', 'fecha', 'fecha_fin', 'duracion', 'estado',
+                         'id_paciente', 'paciente', 'id_odontologo', 'odontologo'],
+        )
+
     @action(detail=False, methods=['post'])
     def solicitar(self, request):
         """
         CU9: Solicitar cita
         Crea una cita en estado 'pendiente'.
-        Body esperado (JSON): {"id_paciente": int, "fecha": ISO8601, "id_odontologo": int|null, "usuario_id": int opcional}
+        Body esperado (JSON): {"id_paciente": int, "fecha": ISO8601, "id_odontologo": int|null,
+                               "duracion": minutos opcional (60 por defecto)}
         """
         id_paciente = request.data.get('id_paciente')
         fecha = request.data.get('fecha')
         id_odontologo = request.data.get('id_odontologo')
-        usuario_id = request.data.get('usuario_id')  # Para registrar en bitácora si viene
+        duracion = request.data.get('duracion')
 
         if not id_paciente or not fecha:
             return Response({'detail': 'id_paciente y fecha son obligatorios'}, status=status.HTTP_400_BAD_REQUEST)
@@ -236,66 +262,288 @@ class CitaViewSet(viewsets.ModelViewSet):
             }
             if id_odontologo:
                 payload['id_odontologo'] = id_odontologo
+            if duracion:
+                payload['duracion'] = duracion
             serializer = self.get_serializer(data=payload)
             serializer.is_valid(raise_exception=True)
 
-            # Validación de conflicto de horario antes de crear la cita
-            # Usamos los datos validados para obtener instancias y fecha como datetime
-            paciente_obj = serializer.validated_data['id_paciente']
-            fecha_dt = serializer.validated_data['fecha']
-            odontologo_obj = serializer.validated_data.get('id_odontologo')
-
-            # Regla de conflictos:
-            # - No permitir dos citas no canceladas en el mismo horario exacto (ya cubierto por el rango)
-            # - Además, bloquear cualquier cita en un rango de ±1 hora del horario solicitado.
-            inicio = fecha_dt - timedelta(hours=1)
-            fin = fecha_dt + timedelta(hours=1)
-
-            # Conflicto por paciente: el mismo paciente no puede tener otra cita dentro de ±1 hora
-            conflicto_paciente = Cita.objects.filter(
-                id_paciente=paciente_obj,
-                fecha__gte=inicio,
-                fecha__lt=fin,
-            ).exclude(estado='cancelada').exists()
-            if conflicto_paciente:
-                return Response(
-                    {'detail': 'Ya tienes una cita dentro de 1 hora de ese horario.'},
-                    status=status.HTTP_409_CONFLICT,
-                )
+            # Validación de conflicto de horario y alta en una sola transacción:
+            # - El mismo paciente no puede tener otra cita activa cuyo intervalo [fecha, fecha_fin) se cruce.
+            # - Si se especifica odontólogo, tampoco puede tener otra cita solapada.
+            # La base de datos rechaza igualmente cualquier solapamiento que se cuele por concurrencia.
+            cita = guardar_sin_conflictos(serializer)
 
-            # Conflicto por odontólogo (si se especifica): el odontólogo no puede tener otra cita dentro de ±1 hora
-            if odontologo_obj is not None:
-                conflicto_odontologo = Cita.objects.filter(
-                    id_odontologo=odontologo_obj,
-                    fecha__gte=inicio,
-                    fecha__lt=fin,
-                ).exclude(estado='cancelada').exists()
-                if conflicto_odontologo:
-                    return Response(
-                        {'detail': 'Este horario (±1 hora) ya está ocupado para el odontólogo seleccionado.'},
-                        status=status.HTTP_409_CONFLICT,
-                    )
-
-            # Si no hay conflicto, crear la cita
-            cita = serializer.save()
-
-            # Bitácora opcional
-            try:
-                if usuario_id:
-                    usuario = Usuario.objects.get(pk=usuario_id)
-                    Bitacora.objects.create(
-                        id_usuario=usuario,
-                        accion=f"Solicitud de cita creada (cita_id={cita.id_cita})",
-                    )
-            except Exception:
-                pass
+            # Bitácora, a nombre del usuario en sesión (mismo contexto que usan los permisos)
+            registrar(actor(request), f"Solicitud de cita creada (cita_id={cita.id_cita})", 'creacion', cita)
 
             return Response(self.get_serializer(cita).data, status=status.HTTP_201_CREATED)
+        except ConflictoHorario as e:
+            return Response({'detail': e.detail}, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['get'])
+    def agenda(self, request):
+        """
+        Agenda diaria de un odontólogo: GET citas/api/citas/agenda/?id_odontologo=<id>&fecha=YYYY-MM-DD
+        Devuelve las citas del día (con nombre del paciente) y la disponibilidad expandida.
+        Respuesta cacheada; se invalida por señales al cambiar citas, disponibilidades, plantillas o excepciones.
+        """
+        odontologo_id = request.query_params.get('id_odontologo')
+        dia = parse_date(request.query_params.get('fecha') or '')
+        if not odontologo_id or not str(odontologo_id).isdigit() or dia is None:
+            return Response({'detail': 'id_odontologo y fecha (YYYY-MM-DD) son obligatorios'}, status=status.HTTP_400_BAD_REQUEST)
+        data = agenda_del_dia(
+            int(odontologo_id), dia,
+            lambda filas: DisponibilidadSerializer(filas, many=True).data,
+        )
+        return Response(data)
+
+    @action(detail=False, methods=['post'])
+    def solicitar_lote(self, request):
+        """
+        Reserva por lote (series de tratamiento, migración desde papel).
+        Body (JSON): {"citas": [{"id_paciente", "fecha", "id_odontologo"?, "duracion"?}, ...],
+                      "todo_o_nada": bool opcional}
+        - Valida todo el lote y detecta conflictos contra citas existentes y entre las citas del lote.
+        - Inserta las citas aceptadas con bulk_create en una sola transacción.
+        - Devuelve el resultado por elemento: 'creada', 'conflicto', 'invalida' o 'no_creada'
+          (esta última cuando todo_o_nada=true y otro elemento falló).
+        """
+        items = request.data.get('citas')
+        if not isinstance(items, list) or not items:
+            return Response({'detail': 'citas debe ser una lista no vacía'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.MAX_LOTE:
+            return Response({'detail': f'El lote no puede superar {self.MAX_LOTE} citas'}, status=status.HTTP_400_BAD_REQUEST)
+        todo_o_nada = str(request.data.get('todo_o_nada', '')).lower() in ('1', 'true', 'yes', 'on')
+
+        resultados = [None] * len(items)
+        validos = []
+        for i, item in enumerate(items):
+            ser = CitaLoteItemSerializer(data=item)
+            if ser.is_valid():
+                validos.append((i, ser.validated_data))
+            else:
+                resultados[i] = {'indice': i, 'estado': 'invalida', 'errores': ser.errors}
+
+        # Existencia de pacientes y odontólogos: una consulta por tabla para todo el lote
+        pacientes = set(Paciente.objects.filter(pk__in={d['id_paciente'] for _, d in validos}).values_list('pk', flat=True))
+        odontologos = set(Odontologo.objects.filter(
+            pk__in={d['id_odontologo'] for _, d in validos if d.get('id_odontologo')}
+        ).values_list('pk', flat=True))
+        citas, indices = [], []
+        for i, d in validos:
+            errores = {}
+            if d['id_paciente'] not in pacientes:
+                errores['id_paciente'] = ['Paciente inexistente.']
+            if d.get('id_odontologo') and d['id_odontologo'] not in odontologos:
+                errores['id_odontologo'] = ['Odontólogo inexistente.']
+            if errores:
+                resultados[i] = {'indice': i, 'estado': 'invalida', 'errores': errores}
+                continue
+            citas.append(Cita(
+                id_paciente_id=d['id_paciente'],
+                id_odontologo_id=d.get('id_odontologo') or None,
+                fecha=d['fecha'],
+                duracion=d['duracion'],
+                estado='pendiente',
+            ))
+            indices.append(i)
+
+        hay_errores = any(r is not None for r in resultados)
+        if todo_o_nada and hay_errores:
+            motivos = [None] * len(citas)
+        else:
+            try:
+                motivos = reservar_lote(citas, todo_o_nada=todo_o_nada)
+            except ConflictoHorario as e:
+                # Solapamiento detectado por la base de datos (reserva concurrente): se revierte el lote
+                return Response({'detail': e.detail}, status=status.HTTP_409_CONFLICT)
+        creado = not (todo_o_nada and (hay_errores or any(motivos)))
+
+        creadas = []
+        for i, cita, motivo in zip(indices, citas, motivos):
+            if motivo:
+                resultados[i] = {'indice': i, 'estado': 'conflicto', 'detail': motivo}
+            elif not creado:
+                resultados[i] = {'indice': i, 'estado': 'no_creada'}
+            else:
+                resultados[i] = {'indice': i, 'estado': 'creada', 'cita': CitaSerializer(cita).data}
+                creadas.append(cita)
+
+        # Bitácora: una fila por cita creada a nombre del usuario en sesión (se escriben juntas en el siguiente lote)
+        registrar_varios(actor(request), [
+            evento(f"Solicitud de cita creada (cita_id={c.id_cita})", 'creacion', c) for c in creadas
+        ])
+
+        return Response({
+            'creadas': len(creadas),
+            'rechazadas': len(items) - len(creadas),
+            'resultados': resultados,
+        }, status=status.HTTP_201_CREATED if creadas else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def programar_serie(self, request):
+        """
+        Serie de citas recurrentes (p.ej. cada 2 semanas, 10 veces, con el mismo odontólogo).
+        Body (JSON): {"id_paciente", "id_odontologo", "fecha_inicio", "repeticiones",
+                      "intervalo_dias"? (14), "duracion"? (60), "tolerancia_dias"? (3),
+                      "confirmar"? (true; false = solo propuesta)}
+        Cada repetición se ubica en el hueco libre más cercano a su fecha objetivo (±tolerancia),
+        saltando conflictos. Todo se calcula en memoria tras una sola carga de citas y agenda.
+        """
+        ser = SerieCitasSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        d = ser.validated_data
+        objetivos = [d['fecha_inicio'] + timedelta(days=d['intervalo_dias'] * n) for n in range(d['repeticiones'])]
+        try:
+            citas = programar_serie(
+                d['id_paciente'].pk, d['id_odontologo'].pk, objetivos,
+                duracion=timedelta(minutes=d['duracion']),
+                tolerancia=timedelta(days=d['tolerancia_dias']),
+                confirmar=d['confirmar'],
+            )
+        except ConflictoHorario as e:
+            return Response({'detail': e.detail}, status=status.HTTP_409_CONFLICT)
+
+        resultados = []
+        for n, (objetivo, cita) in enumerate(zip(objetivos, citas)):
+            if cita is None:
+                resultados.append({'repeticion': n + 1, 'objetivo': objetivo, 'estado': 'sin_hueco'})
+                continue
+            resultados.append({
+                'repeticion': n + 1,
+                'objetivo': objetivo,
+                'estado': 'creada' if d['confirmar'] else 'propuesta',
+                'desplazamiento_minutos': int((cita.fecha - objetivo).total_seconds() // 60),
+                'cita': CitaSerializer(cita).data,
+            })
+        creadas = [c for c in citas if c is not None] if d['confirmar'] else []
+
+        registrar_varios(actor(request), [
+            evento(f"Solicitud de cita creada (cita_id={c.id_cita})", 'creacion', c) for c in creadas
+        ])
+
+        return Response({
+            'creadas': len(creadas),
+            'sin_hueco': sum(1 for c in citas if c is None),
+            'resultados': resultados,
+        }, status=status.HTTP_201_CREATED if creadas else status.HTTP_200_OK)
+
 class DisponibilidadViewSet(viewsets.ModelViewSet):
     queryset = Disponibilidad.objects.all()
     serializer_class = DisponibilidadSerializer
     permission_classes = [RolesPermission]
     # No mapeamos explícito: por defecto permitido. Si se requiere, puede agregarse roles_per_action.
+
+    # Ventana por defecto del listado cuando no se indican fechas
+    DIAS_LISTADO_POR_DEFECTO = 14
+
+    def list(self, request, *args, **kwargs):
+        """
+        Listado de disponibilidad: filas guardadas + horarios expandidos de las plantillas semanales.
+        Query params (opcionales):
+        - desde, hasta (YYYY-MM-DD o ISO8601): ventana a listar. Por defecto, hoy y los próximos 14 días.
+          La ventana (máx. MAX_DIAS_BUSQUEDA días) acota la respuesta, por eso este listado no se pagina.
+        - id_odontologo: limita a un odontólogo.
+        Una fila guardada para el mismo odontólogo y fecha prevalece sobre el horario de la plantilla.
+        """
+        params = request.query_params
+        try:
+            desde = parsear_limite(params.get('desde'))
+            hasta = parsear_limite(params.get('hasta'), fin_de_dia=True)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        desde = desde or datetime.combine(datetime.now().date(), time.min)
+        hasta = hasta or desde + timedelta(days=self.DIAS_LISTADO_POR_DEFECTO)
+        if hasta - desde > timedelta(days=MAX_DIAS_BUSQUEDA):
+            return Response({'detail': f'El rango no puede superar {MAX_DIAS_BUSQUEDA} días'}, status=status.HTTP_400_BAD_REQUEST)
+        guardadas = self.filter_queryset(self.get_queryset()).filter(fecha__gte=desde, fecha__lt=hasta)
+        odontologo_id = params.get('id_odontologo')
+        if odontologo_id:
+            guardadas = guardadas.filter(id_odontologo_id=odontologo_id)
+
+        filas = listar_disponibilidad(guardadas, desde, hasta, odontologo_id)
+        return Response(self.get_serializer(filas, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def libres(self, request):
+        """
+        Horarios libres de todos los odontólogos en una sola respuesta.
+        Query params:
+        - desde, hasta (YYYY-MM-DD o ISO8601; 'hasta' con solo fecha es inclusivo). Obligatorios.
+        - especialidad (opcional): filtra odontólogos por especialidad (sin distinguir mayúsculas).
+        - duracion (opcional): minutos por horario, por defecto 60.
+        """
+        params = request.query_params
+        try:
+            desde = parsear_limite(params.get('desde'))
+            hasta = parsear_limite(params.get('hasta'), fin_de_dia=True)
+            duracion = int(params.get('duracion') or 60)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not desde or not hasta:
+            return Response({'detail': 'desde y hasta son obligatorios'}, status=status.HTTP_400_BAD_REQUEST)
+        if hasta <= desde or duracion <= 0:
+            return Response({'detail': 'Rango o duración inválidos'}, status=status.HTTP_400_BAD_REQUEST)
+        if hasta - desde > timedelta(days=MAX_DIAS_BUSQUEDA):
+            return Response({'detail': f'El rango no puede superar {MAX_DIAS_BUSQUEDA} días'}, status=status.HTTP_400_BAD_REQUEST)
+
+        odontologos = horarios_libres(
+            desde, hasta,
+            duracion=timedelta(minutes=duracion),
+            especialidad=params.get('especialidad'),
+        )
+        return Response({
+            'desde': desde,
+            'hasta': hasta,
+            'duracion': duracion,
+            'odontologos': [
+                {
+                    'id_odontologo': o['id_odontologo'],
+                    'nombre': o['nombre'],
+                    'especialidad': o['especialidad'],
+                    'libres': [{'inicio': a, 'fin': b} for a, b in o['libres']],
+                }
+                for o in odontologos
+            ],
+        })
+
+class HorarioSemanalViewSet(viewsets.ModelViewSet):
+    queryset = HorarioSemanal.objects.all()
+    serializer_class = HorarioSemanalSerializer
+    permission_classes = [RolesPermission]
+    # Igual que Disponibilidad: sin mapeo explícito de roles.
+    # El cursor de DRF se posiciona solo con la primera columna: con una no única (odontólogo, fecha)
+    # los empates se resuelven con OFFSET. La pk es única y creciente: cada página es un WHERE pk > último.
+    orden_cursor = 'id_horario'
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        odontologo_id = self.request.query_params.get('id_odontologo')
+        if odontologo_id:
+            qs = qs.filter(id_odontologo_id=odontologo_id)
+        return qs.order_by('id_odontologo_id', 'dia_semana', 'hora_inicio')
+
+class ExcepcionHorarioViewSet(viewsets.ModelViewSet):
+    queryset = ExcepcionHorario.objects.all()
+    serializer_class = ExcepcionHorarioSerializer
+    permission_classes = [RolesPermission]
+    orden_cursor = 'id_excepcion'  # Ver HorarioSemanalViewSet
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        params = self.request.query_params
+        if params.get('id_odontologo'):
+            qs = qs.filter(id_odontologo_id=params['id_odontologo'])
+        for param, lookup in (('desde', 'fecha__gte'), ('hasta', 'fecha__lte')):
+            if not params.get(param):
+                continue
+            try:
+                dia = parse_date(params[param])
+            except ValueError:
+                dia = None
+            if dia is None:
+                raise ValidationError({'detail': f'Fecha inválida: {params[param]}'})
+            qs = qs.filter(**{lookup: dia})
+        return qs.order_by('fecha', 'hora_inicio')
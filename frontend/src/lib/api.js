@@ -53,6 +53,33 @@ export async function apiGet(path) {
   return res.json()
 }
 
+// Listados paginados por cursor: el backend responde { next, previous, results }.
+// `next` es una URL absoluta; se reduce a ruta + query para seguir usando el proxy/API_BASE_URL.
+function toPath(url) {
+  if (!url) return null
+  const u = new URL(url, window.location.origin)
+  return `${u.pathname}${u.search}`
+}
+
+// Una página: devuelve { results, next } (next = ruta de la página siguiente o null)
+export async function apiGetPage(path) {
+  const data = await apiGet(path)
+  if (Array.isArray(data)) return { results: data, next: null }
+  return { results: data.results || [], next: toPath(data.next) }
+}
+
+// Todas las páginas concatenadas (para selects y catálogos pequeños: odontólogos, roles, usuarios...)
+export async function apiGetAll(path) {
+  const items = []
+  let next = path
+  while (next) {
+    const page = await apiGetPage(next)
+    items.push(...page.results)
+    next = page.next
+  }
+  return items
+}
+
 // POST JSON con CSRF
 export async function apiPost(path, data) {
   await ensureCsrfCookie()
@@ -70,7 +97,11 @@ export async function apiPost(path, data) {
   if (!res.ok) {
     const text = await res.text().catch(() => '')
     maybeAlertUnauthorized(res.status, text)
-    throw new Error(`POST ${path} -> ${res.status} ${res.statusText} ${text}`)
+    const error = new Error(`POST ${path} -> ${res.status} ${res.statusText} ${text}`)
+    // Para respuestas que la vista maneja (p.ej. 409 con los pacientes parecidos)
+    error.status = res.status
+    error.body = text
+    throw error
   }
   return res.json()
 }
@@ -1,10 +1,12 @@
 import React, { useEffect, useState } from 'react'
 import { Paper, Typography, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, CircularProgress, Alert, Stack, Button, ButtonGroup, Dialog, DialogTitle, DialogContent, DialogActions, TextField, MenuItem } from '@mui/material'
-import { apiGet, apiPost, apiPut, apiDelete } from '../../lib/api'
+import { apiGetPage, apiGetAll, apiPost, apiPut, apiDelete } from '../../lib/api'
 
 // Listado de Citas con CRUD inline y acción de Cancelar
 export default function Citas() {
   const [citas, setCitas] = useState([])
+  const [siguiente, setSiguiente] = useState(null)
+  const [cargandoMas, setCargandoMas] = useState(false)
   const [pacientes, setPacientes] = useState({})
   const [odontologos, setOdontologos] = useState({})
   const [loading, setLoading] = useState(true)
@@ -19,12 +21,13 @@ export default function Citas() {
   const cargar = async () => {
     setLoading(true)
     try {
-      const [citasJson, pacientesJson, odontologosJson] = await Promise.all([
-        apiGet('/citas/api/citas/'),
-        apiGet('/pacientes/api/pacientes/'),
-        apiGet('/citas/api/odontologos/'),
+      const [citasPage, pacientesJson, odontologosJson] = await Promise.all([
+        apiGetPage('/citas/api/citas/'),
+        apiGetAll('/pacientes/api/pacientes/'),
+        apiGetAll('/citas/api/odontologos/'),
       ])
-      setCitas(citasJson)
+      setCitas(citasPage.results)
+      setSiguiente(citasPage.next)
       setPacientes(Object.fromEntries(pacientesJson.map(p => [p.id_paciente, p.nombre])))
       setOdontologos(Object.fromEntries(odontologosJson.map(o => [o.id_odontologo, o.nombre])))
       setError('')
@@ -37,6 +40,21 @@ export default function Citas() {
 
   useEffect(() => { cargar() }, [])
 
+  // Paginación por cursor: agrega la página siguiente al listado
+  const cargarMas = async () => {
+    if (!siguiente) return
+    setCargandoMas(true)
+    try {
+      const page = await apiGetPage(siguiente)
+      setCitas(prev => [...prev, ...page.results])
+      setSiguiente(page.next)
+    } catch (e) {
+      setError(e.message)
+    } finally {
+      setCargandoMas(false)
+    }
+  }
+
   const pad = (n) => String(n).padStart(2, '0')
   const toInputDateTime = (iso) => {
     if (!iso) return ''
@@ -152,6 +170,11 @@ export default function Citas() {
               ))}
             </TableBody>
           </Table>
+          {siguiente && (
+            <Stack alignItems="center" sx={{ mt: 2 }}>
+              <Button onClick={cargarMas} disabled={cargandoMas}>{cargandoMas ? 'Cargando...' : 'Cargar más'}</Button>
+            </Stack>
+          )}
         </TableContainer>
       )}
       <Dialog open={open} onClose={closeDialog} fullWidth maxWidth="sm">
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react'
 import { Paper, Typography, Table, TableHead, TableRow, TableCell, TableBody, Alert, Stack, TextField, Button } from '@mui/material'
-import { apiGet, apiPost, apiPatch, apiDelete } from '../../lib/api'
+import { apiGetAll, apiPost, apiPatch, apiDelete } from '../../lib/api'
 
 // CU22: Gestionar odontólogo
 // - CRUD completo contra /citas/api/odontologos/
@@ -16,7 +16,7 @@ export default function Odontologos() {
 
   async function cargar() {
     try {
-      const data = await apiGet('/citas/api/odontologos/')
+      const data = await apiGetAll('/citas/api/odontologos/')
       setLista(data)
       setError('')
     } catch (e) { setError(e.message) }
@@ -1,21 +1,22 @@
 import React, { useEffect, useState } from 'react'
 import { Paper, Typography, TextField, Button, Alert, Stack, MenuItem } from '@mui/material'
-import { apiGet, apiPost } from '../../lib/api'
+import { apiGetAll, apiPost } from '../../lib/api'
 
 // CU9: Solicitar cita
 // - Formulario para crear una cita en estado 'pendiente'
-// - El backend valida conflictos de horario (±1 hora) para paciente y odontólogo
+// - El backend valida que el intervalo [fecha, fecha + duración) no se cruce con otras citas del paciente u odontólogo
 export default function SolicitarCita() {
   const [pacienteId, setPacienteId] = useState('')
   const [fecha, setFecha] = useState('')
   const [odontologoId, setOdontologoId] = useState('')
+  const [duracion, setDuracion] = useState('60')
   const [odontologos, setOdontologos] = useState([])
   const [msg, setMsg] = useState('')
   const [error, setError] = useState('')
   const [loading, setLoading] = useState(false)
 
   useEffect(() => {
-    apiGet('/citas/api/odontologos/').then(setOdontologos).catch(() => {})
+    apiGetAll('/citas/api/odontologos/').then(setOdontologos).catch(() => {})
   }, [])
 
   async function solicitar() {
@@ -26,6 +27,7 @@ export default function SolicitarCita() {
       const payload = {
         id_paciente: Number(pacienteId),
         fecha: new Date(fecha).toISOString(),
+        duracion: Number(duracion) || 60,
       }
       if (odontologoId) payload.id_odontologo = Number(odontologoId)
       const res = await apiPost('/citas/api/citas/solicitar/', payload)
@@ -46,6 +48,7 @@ export default function SolicitarCita() {
       <Stack spacing={2} sx={{ maxWidth: 480 }}>
         <TextField label="ID Paciente" value={pacienteId} onChange={e => setPacienteId(e.target.value)} size="small" />
         <TextField label="Fecha y hora" type="datetime-local" value={fecha} onChange={e => setFecha(e.target.value)} size="small" InputLabelProps={{ shrink: true }} />
+        <TextField label="Duración (minutos)" type="number" value={duracion} onChange={e => setDuracion(e.target.value)} size="small" inputProps={{ min: 5, max: 480, step: 5 }} />
         <TextField select label="Odontólogo (opcional)" size="small" value={odontologoId} onChange={e => setOdontologoId(e.target.value)}>
           <MenuItem value="">(Cualquiera)</MenuItem>
           {odontologos.map(o => <MenuItem key={o.id_odontologo} value={o.id_odontologo}>{o.nombre}</MenuItem>)}
@@ -3,7 +3,7 @@ import { Paper, Typography, TextField, Button, Alert, Table, TableHead, TableRow
 import { apiGet } from '../../lib/api'
 
 // CU6: Consultar historial del paciente
-// - Permite ingresar el ID del paciente y consultar su info, citas y archivos clínicos
+// - Permite ingresar el ID del paciente y consultar su info, citas, historias clínicas y archivos clínicos
 export default function HistorialPaciente() {
   const [pacienteId, setPacienteId] = useState('')
   const [data, setData] = useState(null)
@@ -63,6 +63,29 @@ export default function HistorialPaciente() {
             </TableBody>
           </Table>
 
+          <Typography variant="h6">Historias clínicas</Typography>
+          <Table size="small" sx={{ mb: 2 }}>
+            <TableHead>
+              <TableRow>
+                <TableCell>Fecha</TableCell>
+                <TableCell>Descripción</TableCell>
+                <TableCell>Diagnóstico</TableCell>
+              </TableRow>
+            </TableHead>
+            <TableBody>
+              {(data.historiales || []).map(h => (
+                <TableRow key={h.id_historial}>
+                  <TableCell>{new Date(h.fecha_atencion).toLocaleString()}</TableCell>
+                  <TableCell>{h.descripcion}</TableCell>
+                  <TableCell>{h.diagnostico}</TableCell>
+                </TableRow>
+              ))}
+              {(data.historiales || []).length === 0 && (
+                <TableRow><TableCell colSpan={3} align="center">Sin historias clínicas</TableCell></TableRow>
+              )}
+            </TableBody>
+          </Table>
+
           <Typography variant="h6">Archivos clínicos</Typography>
           <Table size="small">
             <TableHead>
@@ -1,26 +1,60 @@
 import React from 'react'
 import { useEffect, useState } from 'react'
 import { Paper, Typography, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, CircularProgress, Alert, Stack, Button, Dialog, DialogTitle, DialogContent, DialogActions, TextField, MenuItem } from '@mui/material'
-import { apiGet, apiPost, apiPut, apiDelete } from '../../lib/api'
+import { apiGetPage, apiPost, apiPostForm, apiPut, apiDelete } from '../../lib/api'
 
 // Listado de Pacientes con CRUD en la misma vista (Dialog para crear/editar)
 export default function Pacientes() {
   const [data, setData] = useState([])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState('')
+  const [buscar, setBuscar] = useState('')
+  const [siguiente, setSiguiente] = useState(null)
 
-  // Carga la lista de pacientes desde la API
-  const fetchPacientes = () => {
+  // Carga la primera página de pacientes; con texto, la búsqueda (sin acentos, tolera errores) la hace el backend
+  const fetchPacientes = (filtro = buscar) => {
     setLoading(true)
-    apiGet('/pacientes/api/pacientes/')
-      .then(json => { setData(json); setError('') })
+    const query = filtro.trim() ? `?buscar=${encodeURIComponent(filtro.trim())}` : ''
+    apiGetPage(`/pacientes/api/pacientes/${query}`)
+      .then(page => { setData(page.results); setSiguiente(page.next); setError('') })
       .catch(err => { setError(err.message) })
       .finally(() => { setLoading(false) })
   }
 
+  const cargarMas = async () => {
+    if (!siguiente) return
+    try {
+      const page = await apiGetPage(siguiente)
+      setData(prev => [...prev, ...page.results])
+      setSiguiente(page.next)
+    } catch (e) { setError(e.message) }
+  }
+
+  // Importación masiva (CSV/XLSX): el backend valida por lotes y devuelve un reporte de filas rechazadas
+  const [importacion, setImportacion] = useState(null)
+  const [importando, setImportando] = useState(false)
+  const importarArchivo = async (e) => {
+    const archivo = e.target.files && e.target.files[0]
+    e.target.value = ''
+    if (!archivo) return
+    const fd = new FormData()
+    fd.append('archivo', archivo)
+    setImportando(true)
+    try {
+      setImportacion(await apiPostForm('/pacientes/api/pacientes/importar/', fd))
+      fetchPacientes()
+    } catch (err) {
+      setError(err.message || 'Error al importar pacientes')
+    } finally {
+      setImportando(false)
+    }
+  }
+
+  // Espera a que el usuario deje de escribir antes de consultar
   useEffect(() => {
-    fetchPacientes()
-  }, [])
+    const t = setTimeout(() => fetchPacientes(buscar), 300)
+    return () => clearTimeout(t)
+  }, [buscar])
 
   // Estado y handlers del Dialog (crear/editar paciente)
   const [open, setOpen] = useState(false)
@@ -66,7 +100,17 @@ export default function Pacientes() {
       if (editing && editId) {
         await apiPut(`/pacientes/api/pacientes/${editId}/`, form)
       } else {
-        await apiPost('/pacientes/api/pacientes/', form)
+        try {
+          await apiPost('/pacientes/api/pacientes/', form)
+        } catch (e) {
+          // 409: ya hay pacientes muy parecidos; se muestran y se pide confirmar antes de crearlo igual
+          if (e.status !== 409) throw e
+          const candidatos = (JSON.parse(e.body || '{}').candidatos || [])
+            .map(c => `- ${c.nombre} (${c.fecha_nacimiento || 's/f'}, ${c.telefono || 's/tel'}) #${c.id_paciente}`)
+            .join('\n')
+          if (!window.confirm(`Posibles duplicados:\n${candidatos}\n\n¿Crear el paciente de todas formas?`)) return
+          await apiPost('/pacientes/api/pacientes/', { ...form, ignorar_duplicados: true })
+        }
       }
       // Refrescar lista y cerrar
       fetchPacientes()
@@ -97,8 +141,22 @@ export default function Pacientes() {
     <Paper sx={{ p: 3 }}>
       <Stack direction="row" justifyContent="space-between" alignItems="center" sx={{ mb: 2 }}>
         <Typography variant="h5">Pacientes - Casos de uso</Typography>
-        <Button variant="contained" onClick={openCrear}>Crear paciente</Button>
+        <Stack direction="row" spacing={1}>
+          <Button variant="outlined" component="label" disabled={importando}>
+            {importando ? 'Importando...' : 'Importar CSV/XLSX'}
+            <input type="file" hidden accept=".csv,.xlsx" onChange={importarArchivo} />
+          </Button>
+          <Button variant="contained" onClick={openCrear}>Crear paciente</Button>
+        </Stack>
       </Stack>
+      {importacion && (
+        <Alert severity={importacion.errores || importacion.duplicados ? 'warning' : 'success'} onClose={() => setImportacion(null)} sx={{ mb: 2 }}>
+          {importacion.importados} paciente(s) importado(s) de {importacion.filas} fila(s); {importacion.errores} con error
+          {importacion.duplicados ? `, ${importacion.duplicados} posible(s) duplicado(s) sin importar` : ''}.
+          {importacion.reporte && <> <a href={importacion.reporte}>Descargar reporte de errores</a></>}
+        </Alert>
+      )}
+      <TextField size="small" label="Buscar por nombre, teléfono o email" value={buscar} onChange={e => setBuscar(e.target.value)} fullWidth sx={{ mb: 2 }} />
       {loading && <CircularProgress />}
       {error && <Alert severity="error">{error}</Alert>}
       {!loading && !error && (
@@ -134,6 +192,7 @@ export default function Pacientes() {
           </Table>
         </TableContainer>
       )}
+      {!loading && !error && siguiente && <Button onClick={cargarMas} sx={{ mt: 1 }}>Cargar más pacientes</Button>}
 
       {/* Dialog Crear Paciente */}
       <Dialog open={open} onClose={closeCrear} fullWidth maxWidth="sm">
@@ -1,28 +1,42 @@
 import React, { useEffect, useState } from 'react'
-import { Paper, Typography, Alert, CircularProgress, Table, TableBody, TableCell, TableContainer, TableHead, TableRow } from '@mui/material'
-import { apiGet } from '../../lib/api'
+import { Paper, Typography, Alert, CircularProgress, Button, Stack, TextField, Table, TableBody, TableCell, TableContainer, TableHead, TableRow } from '@mui/material'
+import { apiGetPage, apiGetAll } from '../../lib/api'
 
 // CU25: Ver bitácora
 // - Lista los registros de la bitácora provenientes de /seguridad/api/bitacoras/
 // - Muestra usuario, acción y fecha y resuelve el nombre del usuario
+// - Paginada por cursor (más recientes primero): "Cargar más" trae la página siguiente
+// - Búsqueda por texto de la acción (índice de texto completo): resultados por relevancia
 export default function Bitacora() {
   const [registros, setRegistros] = useState([])
+  const [siguiente, setSiguiente] = useState(null)
+  const [cargandoMas, setCargandoMas] = useState(false)
   const [usuariosMap, setUsuariosMap] = useState({})
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState('')
+  const [busqueda, setBusqueda] = useState('')
+  const [filtro, setFiltro] = useState('')
+
+  useEffect(() => {
+    let mounted = true
+    apiGetAll('/seguridad/api/usuarios/')
+      .then(usuarios => {
+        if (mounted) setUsuariosMap(Object.fromEntries(usuarios.map(u => [u.id_usuario, u.username || u.nombre || u.correo])))
+      })
+      .catch(e => { if (mounted) setError(e.message) })
+    return () => { mounted = false }
+  }, [])
 
   useEffect(() => {
     let mounted = true
     async function load() {
       setLoading(true)
       try {
-        const [bits, usuarios] = await Promise.all([
-          apiGet('/seguridad/api/bitacoras/'),
-          apiGet('/seguridad/api/usuarios/'),
-        ])
+        const query = filtro ? `?accion=${encodeURIComponent(filtro)}` : ''
+        const bits = await apiGetPage(`/seguridad/api/bitacoras/${query}`)
         if (!mounted) return
-        setRegistros(bits)
-        setUsuariosMap(Object.fromEntries(usuarios.map(u => [u.id_usuario, u.username || u.nombre || u.correo])))
+        setRegistros(bits.results)
+        setSiguiente(bits.next)
         setError('')
       } catch (e) {
         if (mounted) setError(e.message)
@@ -32,11 +46,29 @@ export default function Bitacora() {
     }
     load()
     return () => { mounted = false }
-  }, [])
+  }, [filtro])
+
+  const cargarMas = async () => {
+    if (!siguiente) return
+    setCargandoMas(true)
+    try {
+      const page = await apiGetPage(siguiente)
+      setRegistros(prev => [...prev, ...page.results])
+      setSiguiente(page.next)
+    } catch (e) {
+      setError(e.message)
+    } finally {
+      setCargandoMas(false)
+    }
+  }
 
   return (
     <Paper sx={{ p: 3 }}>
       <Typography variant="h5" gutterBottom>Bitácora</Typography>
+      <Stack direction="row" spacing={1} sx={{ mb: 2 }} component="form" onSubmit={e => { e.preventDefault(); setFiltro(busqueda.trim()) }}>
+        <TextField size="small" label="Buscar acción" value={busqueda} onChange={e => setBusqueda(e.target.value)} />
+        <Button type="submit" variant="outlined">Buscar</Button>
+      </Stack>
       {loading && <CircularProgress />}
       {error && <Alert severity="error">{error}</Alert>}
       {!loading && !error && (
@@ -64,6 +96,11 @@ export default function Bitacora() {
               )}
             </TableBody>
           </Table>
+          {siguiente && (
+            <Stack alignItems="center" sx={{ mt: 2 }}>
+              <Button onClick={cargarMas} disabled={cargandoMas}>{cargandoMas ? 'Cargando...' : 'Cargar más'}</Button>
+            </Stack>
+          )}
         </TableContainer>
       )}
     </Paper>
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react'
 import { Paper, Typography, TextField, MenuItem, Button, Alert, Stack } from '@mui/material'
-import { apiGet, apiPost } from '../../lib/api'
+import { apiGetAll, apiPost } from '../../lib/api'
 
 // CU24: Cambiar contraseña
 // - Permite seleccionar un usuario y actualizar su contraseña en el módulo de seguridad
@@ -13,7 +13,7 @@ export default function CambiarContrasena() {
   const [error, setError] = useState('')
 
   useEffect(() => {
-    apiGet('/seguridad/api/usuarios/').then(setUsuarios).catch(() => {})
+    apiGetAll('/seguridad/api/usuarios/').then(setUsuarios).catch(() => {})
   }, [])
 
   async function cambiar() {
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react'
 import { List, ListItem, ListItemText, Paper, Typography, Divider, Alert, CircularProgress, Table, TableBody, TableCell, TableContainer, TableHead, TableRow } from '@mui/material'
-import { apiGet } from '../../lib/api'
+import { apiGetAll } from '../../lib/api'
 
 const useCases = [
   // Enlaces de administración
@@ -26,8 +26,8 @@ export default function Seguridad() {
       setLoading(true)
       try {
         const [odonto, usuarios] = await Promise.all([
-          apiGet('/citas/api/odontologos/'),
-          apiGet('/seguridad/api/usuarios/'),
+          apiGetAll('/citas/api/odontologos/'),
+          apiGetAll('/seguridad/api/usuarios/'),
         ])
         if (!mounted) return
         setOdontologos(odonto)
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react'
 import { Paper, Typography, Table, TableHead, TableRow, TableCell, TableBody, Alert, Stack, TextField, Button, MenuItem, Divider } from '@mui/material'
-import { apiGet, apiPost, apiPatch, apiDelete } from '../../lib/api'
+import { apiGetAll, apiGetPage, apiPost, apiPatch, apiDelete } from '../../lib/api'
 
 // CU4: Gestionar Roles
 // - CRUD completo contra /seguridad/api/roles/
@@ -16,32 +16,52 @@ export default function Roles() {
 
   // Estado para "Asignar rol a usuario"
   const [elegibles, setElegibles] = useState([])
+  const [elegiblesSiguiente, setElegiblesSiguiente] = useState(null)
+  const [buscarUsuario, setBuscarUsuario] = useState('')
+  const [filtroUsuario, setFiltroUsuario] = useState('')
   const [roles, setRoles] = useState([])
   const [selUsuario, setSelUsuario] = useState('')
   const [selRol, setSelRol] = useState('')
 
   async function cargar() {
     try {
-      const data = await apiGet('/seguridad/api/roles/')
+      const data = await apiGetAll('/seguridad/api/roles/')
       setLista(data)
       setError('')
     } catch (e) { setError(e.message) }
   }
   useEffect(() => { cargar() }, [])
 
-  async function cargarElegiblesYRoles() {
+  // Elegibles: paginados y filtrados en el backend (?buscar=); se carga la primera página y "más" a pedido
+  async function cargarElegibles(filtro = filtroUsuario) {
     try {
-      const [u, r] = await Promise.all([
-        apiGet('/seguridad/api/usuarios/elegibles_para_roles/'),
-        apiGet('/seguridad/api/roles/'),
-      ])
-      setElegibles(u)
-      setRoles(r)
+      const query = filtro ? `?buscar=${encodeURIComponent(filtro)}` : ''
+      const page = await apiGetPage(`/seguridad/api/usuarios/elegibles_para_roles/${query}`)
+      setElegibles(page.results)
+      setElegiblesSiguiente(page.next)
     } catch (e) {
       // error ya se maneja arriba si corresponde
     }
   }
-  useEffect(() => { cargarElegiblesYRoles() }, [])
+
+  async function cargarMasElegibles() {
+    if (!elegiblesSiguiente) return
+    try {
+      const page = await apiGetPage(elegiblesSiguiente)
+      setElegibles(prev => [...prev, ...page.results])
+      setElegiblesSiguiente(page.next)
+    } catch (e) { setError(e.message) }
+  }
+
+  async function cargarRoles() {
+    try {
+      setRoles(await apiGetAll('/seguridad/api/roles/'))
+    } catch (e) {
+      // error ya se maneja arriba si corresponde
+    }
+  }
+  useEffect(() => { cargarRoles() }, [])
+  useEffect(() => { cargarElegibles(filtroUsuario) }, [filtroUsuario])
 
   async function crear() {
     setMsg(''); setError('')
@@ -86,7 +106,8 @@ export default function Roles() {
       setMsg('Rol asignado correctamente')
       setSelUsuario(''); setSelRol('')
       // refrescar listas
-      cargarElegiblesYRoles()
+      cargarElegibles()
+      cargarRoles()
     } catch (e) { setError(e.message) }
   }
 
@@ -153,6 +174,11 @@ export default function Roles() {
       <Typography variant="body2" sx={{ mb: 1 }}>
         Solo se muestran usuarios elegibles: se excluyen los Recepcionistas, los Odontólogos y los vinculados a un odontólogo.
       </Typography>
+      <Stack direction="row" spacing={1} sx={{ mb: 2 }} component="form" onSubmit={e => { e.preventDefault(); setFiltroUsuario(buscarUsuario.trim()) }}>
+        <TextField size="small" label="Buscar usuario" value={buscarUsuario} onChange={e => setBuscarUsuario(e.target.value)} />
+        <Button type="submit" variant="outlined">Buscar</Button>
+        {elegiblesSiguiente && <Button onClick={cargarMasElegibles}>Cargar más usuarios</Button>}
+      </Stack>
       <Stack spacing={2} direction="row" sx={{ flexWrap: 'wrap', gap: 2, mb: 2 }}>
         <TextField select size="small" label="Usuario" value={selUsuario} onChange={e => setSelUsuario(e.target.value)} sx={{ minWidth: 280 }}>
           {elegibles.map(u => (
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react'
 import { Paper, Typography, Table, TableHead, TableRow, TableCell, TableBody, Alert, Stack, TextField, Button, MenuItem } from '@mui/material'
-import { apiGet, apiPost, apiPatch, apiDelete } from '../../lib/api'
+import { apiGetAll, apiPost, apiPatch, apiDelete } from '../../lib/api'
 
 // CU3: Gestionar Usuarios
 // - CRUD completo contra /seguridad/api/usuarios/
@@ -17,7 +17,7 @@ export default function Usuarios() {
 
   async function cargar() {
     try {
-      const data = await apiGet('/seguridad/api/usuarios/')
+      const data = await apiGetAll('/seguridad/api/usuarios/')
       setLista(data)
       setError('')
     } catch (e) {
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PacientesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pacientes'
+
+    def ready(self):
+        # Señales de invalidación del historial cacheado
+        import pacientes.signals
@@ -0,0 +1,119 @@
+from django.db import connection
+from django.db.models import Case, FloatField, Value, When
+from django.db.models.functions import Cast
+
+from .models import Paciente
+from .normalizacion import normalizar, solo_digitos
+
+# Búsqueda de pacientes por nombre, teléfono o email (migración 0005), sin acentos y tolerante a errores
+# de tipeo ("jose perz" encuentra a "José Pérez"). Se busca sobre Paciente.busqueda, ya normalizado.
+# - PostgreSQL: índice GIN gin_trgm_ops; filtra por similitud de palabra (pg_trgm, operador %>) o
+#   subcadena, y ordena por TrigramWordSimilarity.
+# - SQLite: la tabla FTS5 con tokenizador trigram devuelve los LIMITE_CANDIDATOS pacientes que más
+#   trigramas comparten con lo buscado (bm25); esos pocos se puntúan en Python con la misma medida.
+# - Textos de menos de 3 caracteres, o sin índice disponible: subcadena (icontains) como antes.
+# - Los resultados se anotan con `rango` (0..1, mayor = más parecido) para paginarlos por (rango, pk)
+#   con backend.pagination.PaginacionPorRelevancia.
+
+TABLA = Paciente._meta.db_table
+TABLA_FTS = f'{TABLA}_fts'
+LONGITUD_MINIMA = 3
+LIMITE_CANDIDATOS = 500
+UMBRAL_SIMILITUD = 0.5
+
+
+def consulta(texto):
+    """Texto buscado en la forma de Paciente.busqueda. Si es un teléfono ("+591 700-12345") quedan solo los dígitos."""
+    digitos = solo_digitos(texto)
+    normalizado = normalizar(texto)
+    if digitos and normalizado.replace(' ', '') == digitos:
+        return digitos
+    return normalizado
+
+
+def _trigramas(palabra):
+    # Mismo relleno que pg_trgm: dos espacios delante y uno detrás
+    relleno = f'  {palabra} '
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def similitud(buscado, texto):
+    """Aproximación de word_similarity de pg_trgm: por cada palabra buscada, la fracción de sus trigramas
+    presente en la palabra más parecida del texto; se promedia. Una subcadena exacta vale 1."""
+    palabras = [_trigramas(p) for p in texto.split()]
+    if not palabras:
+        return 0.0
+    if buscado in texto:
+        return 1.0
+    puntajes = []
+    for palabra in buscado.split():
+        propios = _trigramas(palabra)
+        puntajes.append(max(len(propios & otros) for otros in palabras) / len(propios))
+    return sum(puntajes) / len(puntajes)
+
+
+_fts_sqlite = False
+
+
+def _fts_sqlite_disponible():
+    # Solo se recuerda el resultado positivo: la tabla puede crearse (migrate) con el proceso ya en marcha
+    global _fts_sqlite
+    if not _fts_sqlite:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLA_FTS])
+            _fts_sqlite = cursor.fetchone() is not None
+    return _fts_sqlite
+
+
+def _candidatos_sqlite(buscado):
+    """{pk: rango} de los pacientes parecidos, a partir de los candidatos del índice FTS5."""
+    trigramas = sorted({p[i:i + 3] for p in buscado.split() for i in range(len(p) - 2)})
+    if not trigramas:
+        return None
+    # Solo letras, dígitos y espacios (normalizar): no hay comillas que escapar en la expresión
+    expresion = ' OR '.join(f'"{t}"' for t in trigramas)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, busqueda FROM "{TABLA_FTS}" WHERE "{TABLA_FTS}" MATCH %s '
+            f'ORDER BY bm25("{TABLA_FTS}") LIMIT %s', [expresion, LIMITE_CANDIDATOS],
+        )
+        filas = cursor.fetchall()
+    rangos = {}
+    for pk, texto in filas:
+        rango = round(similitud(buscado, texto or ''), 4)
+        if rango >= UMBRAL_SIMILITUD:
+            rangos[pk] = rango
+    return rangos
+
+
+def buscar(qs, texto, con_rango=False):
+    """Filtra `qs` (de Paciente) por los pacientes cuyo nombre, teléfono o email se parecen a `texto`.
+    Con `con_rango`, anota `rango` para ordenar por relevancia."""
+    buscado = consulta(texto)
+    if not buscado:
+        return qs
+
+    if len(buscado) >= LONGITUD_MINIMA and connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        from django.db.models import Q
+        qs = qs.filter(Q(busqueda__trigram_word_similar=buscado) | Q(busqueda__contains=buscado))
+        if con_rango:
+            # similarity es real (float4): double precision para que el cursor (rango, pk) compare exacto
+            qs = qs.annotate(rango=Cast(TrigramWordSimilarity(buscado, 'busqueda'), FloatField()))
+        return qs
+
+    if len(buscado) >= LONGITUD_MINIMA and connection.vendor == 'sqlite' and _fts_sqlite_disponible():
+        rangos = _candidatos_sqlite(buscado)
+        if rangos is not None:
+            qs = qs.filter(pk__in=list(rangos))
+            if con_rango:
+                qs = qs.annotate(rango=Case(
+                    *(When(pk=pk, then=Value(r)) for pk, r in rangos.items()),
+                    default=Value(0.0), output_field=FloatField(),
+                ))
+            return qs
+
+    qs = qs.filter(busqueda__contains=buscado)
+    if con_rango:
+        qs = qs.annotate(rango=Value(0.0, output_field=FloatField()))
+    return qs
@@ -0,0 +1,291 @@
+from difflib import SequenceMatcher
+from functools import lru_cache
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from citas.models import Cita
+from .historial import invalidar_historial
+from .models import ArchivoClinico, ClaveBloqueo, HistorialClinica, Paciente
+from .normalizacion import claves_bloqueo, normalizar, telefono_canonico
+
+# Detección y fusión de pacientes duplicados.
+# - Bloqueo: cada paciente tiene unas pocas claves (ClaveBloqueo, mantenidas al guardar). Solo se comparan
+#   pacientes que comparten una clave, así el costo crece con el tamaño de los bloques y no con n².
+# - Puntaje (0..1): similitud del nombre normalizado (palabras en cualquier orden), fecha de nacimiento,
+#   teléfono canónico y email, con los pesos de PESOS. Desde UMBRAL se considera un posible duplicado.
+# - Alta: PacienteViewSet.create rechaza con 409 si hay candidatos (salvo ignorar_duplicados).
+# - Revisión completa: comando detectar_duplicados (recorre el índice ordenado por clave).
+# - Fusión: Cita, HistorialClinica y ArchivoClinico pasan al paciente principal con un UPDATE por tabla
+#   y los duplicados se eliminan, todo en una transacción.
+
+PESOS = {'nombre': 0.5, 'fecha_nacimiento': 0.25, 'telefono': 0.15, 'email': 0.1}
+UMBRAL = 0.75
+MAX_CANDIDATOS = 200  # Pacientes leídos por alta: con bloques enormes (fecha muy común) se recortan
+MAX_BLOQUE = 50  # En la revisión completa, bloques más grandes se omiten (clave poco selectiva)
+LOTE_PARES = 2000
+CAMPOS = ('id_paciente', 'nombre', 'fecha_nacimiento', 'telefono', 'telefono_normalizado', 'email')
+
+
+class PosibleDuplicado(APIException):
+    """Error 409 al crear un paciente muy parecido a otro ya registrado."""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Ya existen pacientes muy parecidos. Reenvíe con ignorar_duplicados=true para crearlo igual.'
+    default_code = 'posible_duplicado'
+
+    def __init__(self, candidatos):
+        super().__init__()
+        # Se asigna tal cual (sin pasar por ErrorDetail) para que puntajes y fechas conserven su tipo en el JSON
+        self.detail = {'detail': self.detail, 'candidatos': candidatos}
+
+
+class FusionInvalida(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'No se pudieron fusionar los pacientes.'
+    default_code = 'fusion_invalida'
+
+
+def actualizar_claves(pacientes):
+    """Recalcula las claves de bloqueo de los pacientes (ya guardados): un DELETE y un INSERT en bloque."""
+    pacientes = [p for p in pacientes if p.pk is not None]
+    if not pacientes:
+        return
+    ClaveBloqueo.objects.filter(paciente_id__in=[p.pk for p in pacientes]).delete()
+    ClaveBloqueo.objects.bulk_create([
+        ClaveBloqueo(paciente_id=p.pk, clave=clave)
+        for p in pacientes
+        for clave in claves_bloqueo(p.nombre, p.fecha_nacimiento, p.telefono)
+    ])
+
+
+def reindexar(lote=2000):
+    """Reconstruye el índice de claves de todos los pacientes, por lotes. Devuelve los pacientes procesados."""
+    total = ultimo = 0
+    while True:
+        pacientes = list(
+            Paciente.objects.filter(pk__gt=ultimo).order_by('pk').only('nombre', 'fecha_nacimiento', 'telefono')[:lote]
+        )
+        if not pacientes:
+            return total
+        with transaction.atomic():
+            actualizar_claves(pacientes)
+        total += len(pacientes)
+        ultimo = pacientes[-1].pk
+
+
+@lru_cache(maxsize=20000)
+def _nombre_comparable(nombre):
+    """Nombre normalizado con las palabras ordenadas. Se calcula solo si la comparación llega al nombre
+    (puntaje descarta antes los pares que no pueden alcanzar el umbral) y se recuerda entre lotes."""
+    return ' '.join(sorted(normalizar(nombre).split()))
+
+
+def _datos(paciente):
+    """Valores comparables de un paciente (instancia o dict de values(CAMPOS)); el nombre va sin normalizar."""
+    if isinstance(paciente, dict):
+        # Filas de la base: telefono_normalizado ya es el teléfono canónico
+        nombre, fecha, telefono, email = (
+            paciente['nombre'], paciente['fecha_nacimiento'], paciente['telefono_normalizado'], paciente['email'],
+        )
+    else:
+        nombre, fecha, email = paciente.nombre, paciente.fecha_nacimiento, paciente.email
+        telefono = telefono_canonico(paciente.telefono)
+    return {
+        'nombre': nombre or '',
+        'fecha_nacimiento': str(fecha or '')[:10],
+        'telefono': telefono or '',
+        'email': (email or '').strip().lower(),
+    }
+
+
+def _similitud_nombre(a, b):
+    a, b = _nombre_comparable(a), _nombre_comparable(b)
+    if not a or not b:
+        return 0.0
+    palabras_a, palabras_b = set(a.split()), set(b.split())
+    # "Ana Pérez" frente a "Ana María Pérez López": todas las palabras del nombre corto están en el largo
+    if palabras_a <= palabras_b or palabras_b <= palabras_a:
+        return max(0.9, SequenceMatcher(None, a, b).ratio())
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def _similitud_fecha(a, b):
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    # Día y mes invertidos al cargar (05/03 frente a 03/05)
+    if a[:4] == b[:4] and a[5:7] == b[8:10] and a[8:10] == b[5:7]:
+        return 0.5
+    return 0.0
+
+
+def puntaje(a, b, umbral=0.0):
+    """(puntaje 0..1, motivos) de dos pacientes ya pasados por _datos. Con `umbral`, si ni un nombre idéntico
+    alcanzaría ese puntaje se devuelve sin comparar los nombres (la parte costosa)."""
+    parciales = {
+        'fecha_nacimiento': _similitud_fecha(a['fecha_nacimiento'], b['fecha_nacimiento']),
+        'telefono': 1.0 if a['telefono'] and a['telefono'] == b['telefono'] else 0.0,
+        'email': 1.0 if a['email'] and a['email'] == b['email'] else 0.0,
+    }
+    parcial = sum(PESOS[campo] * valor for campo, valor in parciales.items())
+    if parcial + PESOS['nombre'] < umbral:
+        return round(parcial, 4), []
+    parciales['nombre'] = _similitud_nombre(a['nombre'], b['nombre'])
+    total = round(parcial + PESOS['nombre'] * parciales['nombre'], 4)
+    motivos = [campo for campo in PESOS if parciales[campo] >= 0.8]
+    return total, motivos
+
+
+def candidatos(paciente, umbral=UMBRAL, limite=10):
+    """Pacientes parecidos a `paciente` (guardado o no), del más al menos parecido.
+    Una consulta: los que comparten alguna clave de bloqueo, vía el índice clave_bloqueo_clave."""
+    claves = claves_bloqueo(paciente.nombre, paciente.fecha_nacimiento, paciente.telefono)
+    if not claves:
+        return []
+    ids = ClaveBloqueo.objects.filter(clave__in=claves).values('paciente_id')
+    qs = Paciente.objects.filter(pk__in=ids)
+    if paciente.pk is not None:
+        qs = qs.exclude(pk=paciente.pk)
+    propio = _datos(paciente)
+    resultado = []
+    for fila in qs.values(*CAMPOS)[:MAX_CANDIDATOS]:
+        valor, motivos = puntaje(propio, _datos(fila), umbral)
+        if valor >= umbral:
+            resultado.append({
+                'id_paciente': fila['id_paciente'],
+                'nombre': fila['nombre'],
+                'fecha_nacimiento': fila['fecha_nacimiento'],
+                'telefono': fila['telefono'],
+                'email': fila['email'],
+                'puntaje': valor,
+                'motivos': motivos,
+            })
+    resultado.sort(key=lambda c: (-c['puntaje'], c['id_paciente']))
+    return resultado[:limite]
+
+
+def parecidos_en_lote(pacientes, umbral=UMBRAL):
+    """Para una lista de pacientes sin guardar (p.ej. un lote de importación), devuelve {índice: parecido}
+    con el mejor candidato de cada uno, si lo hay: {'id_paciente', 'nombre', 'puntaje'} de un paciente ya
+    registrado o {'indice': j} de un paciente anterior de la misma lista.
+    Una sola consulta para todo el lote (JOIN con ClaveBloqueo por las claves selectivas del lote)."""
+    claves = [claves_bloqueo(p.nombre, p.fecha_nacimiento, p.telefono) for p in pacientes]
+    todas = set().union(*claves)
+    if not todas:
+        return {}
+    # Como en detectar, las claves compartidas por más de MAX_BLOQUE pacientes (p.ej. apellido común + año)
+    # no aportan candidatos: se descartan en la misma consulta con un conteo sobre el índice de claves
+    selectivas = (
+        ClaveBloqueo.objects.filter(clave__in=todas).values('clave')
+        .annotate(n=Count('paciente_id')).filter(n__lte=MAX_BLOQUE).values('clave')
+    )
+    por_clave, existentes = {}, {}
+    filas = Paciente.objects.filter(claves_bloqueo__clave__in=selectivas).values(*CAMPOS, 'claves_bloqueo__clave')
+    for fila in filas:
+        por_clave.setdefault(fila['claves_bloqueo__clave'], set()).add(fila['id_paciente'])
+        if fila['id_paciente'] not in existentes:
+            existentes[fila['id_paciente']] = (fila['nombre'], _datos(fila))
+    propios = [_datos(p) for p in pacientes]
+    anteriores = {}  # clave -> índices previos del lote
+    resultado = {}
+    for i, (datos, claves_i) in enumerate(zip(propios, claves)):
+        ids = sorted({pk for k in claves_i for pk in por_clave.get(k, ())})[:MAX_CANDIDATOS]
+        previos = sorted({j for k in claves_i for j in anteriores.get(k, ())})
+        mejor = None
+        for pk in ids:
+            valor, _ = puntaje(datos, existentes[pk][1], umbral)
+            if valor >= umbral and (mejor is None or valor > mejor['puntaje']):
+                mejor = {'id_paciente': pk, 'nombre': existentes[pk][0], 'puntaje': valor}
+        for j in previos:
+            valor, _ = puntaje(datos, propios[j], umbral)
+            if valor >= umbral and (mejor is None or valor > mejor['puntaje']):
+                mejor = {'indice': j, 'puntaje': valor}
+        if mejor is not None:
+            resultado[i] = mejor
+        else:
+            # Solo los que se van a insertar cuentan como "anteriores" para el resto del lote
+            for k in claves_i:
+                anteriores.setdefault(k, []).append(i)
+    return resultado
+
+
+def _puntuar_bloques(bloques, omitidas, umbral, estadisticas):
+    """Puntúa los pares de una tanda de bloques [(clave, miembros)]. Un par que comparte varias claves se
+    compara solo en la menor de ellas que no se omitió: así no hace falta recordar los pares ya vistos."""
+    ids = {pk for _, miembros in bloques for pk in miembros}
+    claves_de = {}
+    for pk, clave in ClaveBloqueo.objects.filter(paciente_id__in=ids).values_list('paciente_id', 'clave'):
+        claves_de.setdefault(pk, set()).add(clave)
+    datos = {f['id_paciente']: _datos(f) for f in Paciente.objects.filter(pk__in=ids).values(*CAMPOS)}
+    for clave, miembros in bloques:
+        for a, b in combinations(miembros, 2):
+            if a not in datos or b not in datos:
+                continue  # Eliminado durante la revisión
+            compartidas = (claves_de.get(a, set()) & claves_de.get(b, set())) - omitidas
+            if compartidas and min(compartidas) < clave:
+                continue  # Ya se comparó en un bloque anterior
+            estadisticas['comparaciones'] += 1
+            valor, motivos = puntaje(datos[a], datos[b], umbral)
+            if valor >= umbral:
+                yield a, b, valor, motivos
+
+
+def detectar(umbral=UMBRAL, max_bloque=MAX_BLOQUE, estadisticas=None):
+    """Genera (id_a, id_b, puntaje, motivos) de todos los pares de posibles duplicados.
+    Recorre el índice ordenado por clave (sin cargar la tabla) y solo compara dentro de cada bloque:
+    O(n · tamaño de bloque) en vez de O(n²). Los bloques se procesan en tandas de unos LOTE_PARES pares
+    (dos consultas por tanda), con memoria acotada por la tanda. Los bloques de más de `max_bloque`
+    pacientes se omiten y se cuentan en `estadisticas['bloques_omitidos']`."""
+    estadisticas = estadisticas if estadisticas is not None else {}
+    estadisticas.update(bloques=0, bloques_omitidos=0, comparaciones=0)
+    filas = ClaveBloqueo.objects.order_by('clave', 'paciente_id').values_list('clave', 'paciente_id').iterator(chunk_size=5000)
+    # Claves omitidas por tamaño: a lo sumo (claves / max_bloque), no crece con los pares
+    omitidas = set()
+    tanda, pares = [], 0
+    for clave, grupo in groupby(filas, key=itemgetter(0)):
+        miembros = sorted({pk for _, pk in grupo})
+        if len(miembros) < 2:
+            continue
+        estadisticas['bloques'] += 1
+        if len(miembros) > max_bloque:
+            estadisticas['bloques_omitidos'] += 1
+            omitidas.add(clave)
+            continue
+        tanda.append((clave, miembros))
+        pares += len(miembros) * (len(miembros) - 1) // 2
+        if pares >= LOTE_PARES:
+            yield from _puntuar_bloques(tanda, omitidas, umbral, estadisticas)
+            tanda, pares = [], 0
+    if tanda:
+        yield from _puntuar_bloques(tanda, omitidas, umbral, estadisticas)
+
+
+def fusionar(principal, duplicados):
+    """Pasa las citas, historias clínicas y archivos de `duplicados` (ids) a `principal` y elimina los
+    duplicados. Un UPDATE por tabla dentro de una transacción; si las citas de ambos se solapan, la base
+    lo rechaza y no se cambia nada. Devuelve los conteos."""
+    from citas.agenda import invalidar_caches_de_citas
+
+    ids = sorted({int(i) for i in duplicados} - {principal.pk})
+    existentes = set(Paciente.objects.filter(pk__in=ids).values_list('pk', flat=True))
+    faltantes = [i for i in ids if i not in existentes]
+    if not ids or faltantes:
+        raise FusionInvalida(f'Pacientes inexistentes: {faltantes}' if faltantes else 'Indique al menos un duplicado.')
+    with transaction.atomic():
+        citas = list(Cita.objects.filter(id_paciente_id__in=ids).only('id_odontologo_id', 'fecha', 'fecha_fin', 'id_paciente_id'))
+        try:
+            with transaction.atomic():
+                movidas = Cita.objects.filter(id_paciente_id__in=ids).update(id_paciente=principal)
+        except IntegrityError:
+            raise FusionInvalida('Hay citas activas de los pacientes que se solapan; cancele o mueva una antes de fusionar.')
+        historiales = HistorialClinica.objects.filter(id_paciente_id__in=ids).update(id_paciente=principal)
+        archivos = ArchivoClinico.objects.filter(paciente_id__in=ids).update(paciente=principal)
+        Paciente.objects.filter(pk__in=ids).delete()
+        # update() no dispara señales: agenda (citas movidas) e historial del principal se invalidan aquí
+        transaction.on_commit(lambda: (invalidar_caches_de_citas(citas), invalidar_historial(principal.pk)))
+    return {'fusionados': ids, 'citas': movidas, 'historiales': historiales, 'archivos': archivos}
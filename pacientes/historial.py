@@ -0,0 +1,58 @@
+from backend.cache import clave_versionada, invalidar
+from citas.models import Cita
+from .models import HistorialClinica, ArchivoClinico
+from .serializers import PacienteSerializer, ArchivoClinicoSerializer
+
+# Historial del paciente (CU6) compuesto con pocas consultas y cacheado por paciente.
+# - Citas e historias clínicas se proyectan con values(): sin instancias de modelo y con el
+#   nombre del odontólogo resuelto en el mismo JOIN (antes, una consulta por cita).
+# - Ámbitos de versión (ver backend/cache.py):
+#   - 'historial': global, cambia si se renombra un odontólogo (aparece en cada cita).
+#   - 'historial:paciente:<id>': datos del paciente, sus citas, historias clínicas y archivos.
+
+
+def ambitos_historial(paciente_id):
+    return ['historial', f'historial:paciente:{paciente_id}']
+
+
+def clave_historial(paciente_id):
+    return clave_versionada('historial', ambitos_historial(paciente_id), paciente_id)
+
+
+def invalidar_historial(*pacientes):
+    ambitos = [f'historial:paciente:{p}' for p in set(pacientes) if p is not None]
+    if ambitos:
+        invalidar(*ambitos)
+
+
+def componer_historial(paciente):
+    """Payload de PacienteViewSet.historial: paciente, citas, historias clínicas y archivos."""
+    citas = (
+        Cita.objects
+        .filter(id_paciente=paciente)
+        .order_by('-fecha')
+        .values('id_cita', 'fecha', 'fecha_fin', 'duracion', 'estado', 'id_odontologo__nombre')
+    )
+    historiales = (
+        HistorialClinica.objects
+        .filter(id_paciente=paciente)
+        .order_by('-fecha_atencion')
+        .values('id_historial', 'fecha_atencion', 'descripcion', 'diagnostico')
+    )
+    archivos = ArchivoClinico.objects.filter(paciente=paciente).order_by('-fechaAdjunto')
+    return {
+        'paciente': PacienteSerializer(paciente).data,
+        'citas': [
+            {
+                'id_cita': c['id_cita'],
+                'fecha': c['fecha'],
+                'fecha_fin': c['fecha_fin'],
+                'duracion': c['duracion'],
+                'estado': c['estado'],
+                'odontologo': c['id_odontologo__nombre'],
+            }
+            for c in citas
+        ],
+        'historiales': list(historiales),
+        'archivos': ArchivoClinicoSerializer(archivos, many=True).data,
+    }
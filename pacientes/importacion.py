@@ -0,0 +1,243 @@
+import csv
+import io
+import os
+import re
+import uuid
+from datetime import date, datetime
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from . import duplicados
+from .models import Paciente
+from .normalizacion import normalizar
+from .serializers import PacienteSerializer
+
+try:
+    import openpyxl
+except Exception:  # Instalaciones sin openpyxl (requirements.txt lo incluye): solo CSV
+    openpyxl = None
+
+# Importación masiva de pacientes desde CSV/XLSX (comando importar_pacientes y PacienteViewSet.importar).
+# - El archivo se lee fila a fila con generadores (csv.reader / openpyxl en modo read_only): la memoria
+#   depende del tamaño del lote, no del archivo.
+# - Cada lote de LOTE filas se valida con PacienteSerializer y las válidas se insertan con un
+#   bulk_create en su propia transacción; las filas con errores no detienen al resto.
+# - Las filas rechazadas se escriben a medida en un reporte CSV (fila, errores y valores originales).
+# - Las filas muy parecidas a un paciente existente o a otra fila del archivo se rechazan como en el alta
+#   individual (duplicados.parecidos_en_lote, una consulta por lote), salvo ignorar_duplicados.
+# - bulk_create no llama a save() ni dispara señales: las columnas de búsqueda se calculan con
+#   actualizar_busqueda() y las claves de duplicados con duplicados.actualizar_claves().
+
+LOTE = 1000
+CAMPOS = ('nombre', 'fecha_nacimiento', 'genero', 'telefono', 'direccion', 'email')
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y')
+GENEROS = {'m': 'M', 'masculino': 'M', 'f': 'F', 'femenino': 'F'}
+EXTENSIONES = ('.csv', '.xlsx')
+
+
+class ErrorImportacion(Exception):
+    """Archivo que no puede leerse (formato no soportado, sin encabezados, faltan columnas)."""
+
+
+def _columna(encabezado):
+    # "Fecha de nacimiento" / "FECHA_NACIMIENTO" -> "fecha_nacimiento"
+    columna = normalizar(str(encabezado or '')).replace(' ', '_')
+    return 'fecha_nacimiento' if columna == 'fecha_de_nacimiento' else columna
+
+
+def _validar_encabezados(columnas):
+    faltantes = [c for c in CAMPOS if c not in columnas and c != 'genero']
+    if faltantes:
+        raise ErrorImportacion(f'Faltan columnas: {", ".join(faltantes)}')
+
+
+def filas_csv(archivo):
+    """(número de fila, dict) de un CSV binario; admite BOM y separador ',' o ';'."""
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(texto, dialecto)
+    encabezados = next(lector, None)
+    if not encabezados:
+        raise ErrorImportacion('El archivo está vacío')
+    columnas = [_columna(e) for e in encabezados]
+    _validar_encabezados(columnas)
+    for numero, valores in enumerate(lector, start=2):
+        if any(v.strip() for v in valores):
+            yield numero, dict(zip(columnas, valores))
+
+
+def filas_xlsx(archivo):
+    """(número de fila, dict) de la primera hoja de un XLSX, sin cargar el libro completo."""
+    if openpyxl is None:
+        raise ErrorImportacion('Para importar XLSX se necesita openpyxl (pip install openpyxl); use CSV')
+    libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        hoja = libro.worksheets[0]
+        filas = hoja.iter_rows(values_only=True)
+        encabezados = next(filas, None)
+        if not encabezados:
+            raise ErrorImportacion('El archivo está vacío')
+        columnas = [_columna(e) for e in encabezados]
+        _validar_encabezados(columnas)
+        for numero, valores in enumerate(filas, start=2):
+            if any(v not in (None, '') for v in valores):
+                yield numero, dict(zip(columnas, valores))
+    finally:
+        libro.close()
+
+
+def leer_filas(archivo, nombre):
+    extension = os.path.splitext(nombre or '')[1].lower()
+    if extension == '.csv':
+        return filas_csv(archivo)
+    if extension == '.xlsx':
+        return filas_xlsx(archivo)
+    raise ErrorImportacion(f'Formato no soportado: use {" o ".join(EXTENSIONES)}')
+
+
+def _fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    texto = str(valor).strip()
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).date().isoformat()
+        except ValueError:
+            pass
+    return texto  # El serializer informa el formato inválido
+
+
+def _limpiar(fila):
+    """Datos para el serializer: solo las columnas conocidas, como texto y sin espacios sobrantes."""
+    datos = {}
+    for campo in CAMPOS:
+        valor = fila.get(campo)
+        if valor is None or valor == '':
+            continue
+        if campo == 'fecha_nacimiento':
+            datos[campo] = _fecha(valor)
+        elif campo == 'genero':
+            datos[campo] = GENEROS.get(str(valor).strip().lower(), str(valor).strip())
+        elif isinstance(valor, float) and valor.is_integer():
+            datos[campo] = str(int(valor))  # Teléfonos leídos como número en la planilla
+        else:
+            datos[campo] = str(valor).strip()
+    return datos
+
+
+def _lotes(filas, tamano):
+    while True:
+        lote = list(islice(filas, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+class ReporteErrores:
+    """CSV de filas rechazadas, escrito a medida (se crea al primer error)."""
+    COLUMNAS = ('fila', 'errores', *CAMPOS)
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.total = 0
+        self._archivo = self._escritor = None
+
+    def agregar(self, numero, errores, fila):
+        if self._escritor is None:
+            os.makedirs(os.path.dirname(self.ruta) or '.', exist_ok=True)
+            self._archivo = open(self.ruta, 'w', encoding='utf-8-sig', newline='')
+            self._escritor = csv.writer(self._archivo)
+            self._escritor.writerow(self.COLUMNAS)
+        detalle = '; '.join(
+            f'{campo}: {" ".join(str(m) for m in mensajes)}' for campo, mensajes in errores.items()
+        )
+        self._escritor.writerow([numero, detalle, *('' if fila.get(c) is None else fila.get(c) for c in CAMPOS)])
+        self.total += 1
+
+    def cerrar(self):
+        if self._archivo is not None:
+            self._archivo.close()
+
+
+def importar(filas, reporte=None, lote=LOTE, dry_run=False, ignorar_duplicados=False):
+    """Valida e inserta las filas (iterable de (número, dict)) por lotes.
+    Como en el alta individual, las filas muy parecidas a un paciente ya registrado (o a otra fila del archivo)
+    no se insertan y van al reporte, salvo con `ignorar_duplicados`.
+    Devuelve {'filas', 'importados', 'errores', 'duplicados'}; las rechazadas van a `reporte`
+    (ReporteErrores) si se indica."""
+    # Una sola instancia del serializer para todas las filas: valida igual que ListSerializer (run_validation
+    # por elemento), pero conserva las filas válidas de un lote que también trae errores
+    validador = PacienteSerializer()
+    resumen = {'filas': 0, 'importados': 0, 'errores': 0, 'duplicados': 0}
+    for bloque in _lotes(iter(filas), lote):
+        nuevos, origen = [], []
+        for numero, fila in bloque:
+            try:
+                datos = validador.run_validation(_limpiar(fila))
+            except ValidationError as exc:
+                resumen['errores'] += 1
+                if reporte is not None:
+                    reporte.agregar(numero, exc.detail, fila)
+                continue
+            paciente = Paciente(**datos)
+            paciente.actualizar_busqueda()
+            nuevos.append(paciente)
+            origen.append((numero, fila))
+        if nuevos and not ignorar_duplicados:
+            # Una consulta por lote; los lotes anteriores ya están insertados con sus claves
+            parecidos = duplicados.parecidos_en_lote(nuevos)
+            for i, parecido in parecidos.items():
+                numero, fila = origen[i]
+                if 'indice' in parecido:
+                    motivo = f'parecido a la fila {origen[parecido["indice"]][0]} del archivo'
+                else:
+                    motivo = f'parecido al paciente #{parecido["id_paciente"]} ({parecido["nombre"]})'
+                resumen['duplicados'] += 1
+                if reporte is not None:
+                    reporte.agregar(numero, {'duplicado': [f'{motivo}, puntaje {parecido["puntaje"]:.2f}']}, fila)
+            nuevos = [p for i, p in enumerate(nuevos) if i not in parecidos]
+        if nuevos and not dry_run:
+            with transaction.atomic():
+                Paciente.objects.bulk_create(nuevos)
+                duplicados.actualizar_claves(nuevos)
+        resumen['filas'] += len(bloque)
+        resumen['importados'] += len(nuevos)
+    return resumen
+
+
+def directorio_reportes():
+    return getattr(settings, 'IMPORTACION_REPORTES_DIR', os.path.join(settings.BASE_DIR, 'reportes_importacion'))
+
+
+def ruta_reporte(identificador):
+    """Ruta del reporte de errores `identificador` (hex de uuid4); None si el identificador no es válido."""
+    if not re.fullmatch(r'[0-9a-f]{32}', identificador or ''):
+        return None
+    return os.path.join(directorio_reportes(), f'importacion-{identificador}.csv')
+
+
+def importar_archivo(archivo, nombre, lote=LOTE, dry_run=False, ruta=None, ignorar_duplicados=False):
+    """Importa un archivo abierto en modo binario. El reporte de errores va a `ruta` o, si no se indica,
+    a un archivo nuevo en directorio_reportes(). Devuelve el resumen con 'reporte': identificador
+    (o la ruta indicada), o None si no hubo errores."""
+    identificador = uuid.uuid4().hex
+    reporte = ReporteErrores(ruta or ruta_reporte(identificador))
+    try:
+        resumen = importar(
+            leer_filas(archivo, nombre), reporte=reporte, lote=lote, dry_run=dry_run,
+            ignorar_duplicados=ignorar_duplicados,
+        )
+    finally:
+        reporte.cerrar()
+    resumen['reporte'] = (ruta or identificador) if reporte.total else None
+    return resumen
@@ -0,0 +1,50 @@
+import csv
+
+from django.core.management.base import BaseCommand
+
+from pacientes import duplicados
+
+
+class Command(BaseCommand):
+    help = (
+        'Lista los pares de pacientes posiblemente duplicados. Solo compara pacientes que comparten una '
+        'clave de bloqueo, así que no recorre todos los pares.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--umbral', type=float, default=duplicados.UMBRAL, help='Puntaje mínimo (0..1).')
+        parser.add_argument(
+            '--max-bloque', type=int, default=duplicados.MAX_BLOQUE,
+            help='Omite las claves compartidas por más pacientes que este número.',
+        )
+        parser.add_argument('--salida', default=None, help='Escribe los pares en este CSV en vez de la consola.')
+        parser.add_argument('--reindexar', action='store_true', help='Reconstruye antes el índice de claves.')
+
+    def handle(self, *args, **opciones):
+        if not 0 < opciones['umbral'] <= 1 or opciones['max_bloque'] < 2:
+            self.stderr.write('--umbral debe estar en (0, 1] y --max-bloque ser al menos 2')
+            return
+        if opciones['reindexar']:
+            self.stdout.write(f'{duplicados.reindexar()} paciente(s) reindexado(s).')
+        estadisticas = {}
+        pares = duplicados.detectar(opciones['umbral'], opciones['max_bloque'], estadisticas)
+        total = 0
+        archivo = open(opciones['salida'], 'w', encoding='utf-8-sig', newline='') if opciones['salida'] else None
+        try:
+            escritor = csv.writer(archivo) if archivo else None
+            if escritor:
+                escritor.writerow(['id_paciente_a', 'id_paciente_b', 'puntaje', 'motivos'])
+            for a, b, valor, motivos in pares:
+                total += 1
+                if escritor:
+                    escritor.writerow([a, b, valor, ' '.join(motivos)])
+                else:
+                    self.stdout.write(f'{a}\t{b}\t{valor:.2f}\t{", ".join(motivos)}')
+        finally:
+            if archivo:
+                archivo.close()
+        self.stdout.write(
+            f'{estadisticas["bloques"]} bloque(s), {estadisticas["comparaciones"]} comparación(es), '
+            f'{estadisticas["bloques_omitidos"]} bloque(s) omitido(s) por tamaño.'
+        )
+        self.stdout.write(self.style.SUCCESS(f'{total} par(es) de posibles duplicados.'))
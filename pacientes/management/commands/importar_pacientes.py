@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pacientes import importacion
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa pacientes desde un CSV o XLSX (columnas: nombre, fecha_nacimiento, genero, telefono, '
+        'direccion, email), validando y agrupando las inserciones por lotes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del .csv o .xlsx.')
+        parser.add_argument('--lote', type=int, default=importacion.LOTE, help='Filas por transacción.')
+        parser.add_argument('--reporte', default=None, help='CSV donde escribir las filas rechazadas.')
+        parser.add_argument('--dry-run', action='store_true', help='Solo valida; no inserta.')
+        parser.add_argument(
+            '--ignorar-duplicados', action='store_true',
+            help='Importa también las filas muy parecidas a pacientes existentes (por defecto van al reporte).',
+        )
+
+    def handle(self, *args, **opciones):
+        if opciones['lote'] <= 0:
+            self.stderr.write('--lote debe ser positivo')
+            return
+        inicio = time.perf_counter()
+        try:
+            with open(opciones['archivo'], 'rb') as archivo:
+                resumen = importacion.importar_archivo(
+                    archivo, opciones['archivo'], lote=opciones['lote'],
+                    dry_run=opciones['dry_run'], ruta=opciones['reporte'],
+                    ignorar_duplicados=opciones['ignorar_duplicados'],
+                )
+        except (OSError, importacion.ErrorImportacion) as exc:
+            self.stderr.write(str(exc))
+            return
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(
+            f'{resumen["filas"]} fila(s) leída(s), {resumen["importados"]} válida(s), {resumen["errores"]} con error, '
+            f'{resumen["duplicados"]} posible(s) duplicado(s) en {segundos:.1f} s ({resumen["filas"] / max(segundos, 1e-6):.0f} filas/s).'
+        )
+        if resumen['reporte']:
+            ruta = opciones['reporte'] or importacion.ruta_reporte(resumen['reporte'])
+            self.stdout.write(f'Reporte de errores: {ruta}')
+        if opciones['dry_run']:
+            self.stdout.write('Sin cambios (--dry-run).')
+        self.stdout.write(self.style.SUCCESS('Importación terminada.'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from pacientes import telefonos
+
+
+class Command(BaseCommand):
+    help = (
+        'Completa telefono_normalizado de pacientes y odontólogos existentes, por lotes '
+        '(necesario una vez tras la migración que agrega la columna).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Filas por transacción.')
+        parser.add_argument(
+            '--solo', choices=sorted(telefonos.MODELOS), default=None, help='Procesa solo esa tabla.',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Solo cuenta las filas a corregir.')
+
+    def handle(self, *args, **opciones):
+        if opciones['lote'] <= 0:
+            self.stderr.write('--lote debe ser positivo')
+            return
+        nombres = [opciones['solo']] if opciones['solo'] else sorted(telefonos.MODELOS)
+        for nombre in nombres:
+            revisados, corregidos = telefonos.normalizar_existentes(
+                telefonos.MODELOS[nombre], lote=opciones['lote'], dry_run=opciones['dry_run'],
+            )
+            self.stdout.write(f'{nombre}: {revisados} revisado(s), {corregidos} a corregir.')
+        if opciones['dry_run']:
+            self.stdout.write('Sin cambios (--dry-run).')
+        self.stdout.write(self.style.SUCCESS('Normalización terminada.'))
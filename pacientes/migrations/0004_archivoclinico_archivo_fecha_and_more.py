@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0003_remove_archivoclinico_archivo_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivoclinico',
+            index=models.Index(fields=['fechaAdjunto'], name='archivo_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='historialclinica',
+            index=models.Index(fields=['id_paciente', 'fecha_atencion'], name='historial_paciente_fecha'),
+        ),
+    ]
@@ -0,0 +1,121 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:55
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Búsqueda de pacientes por nombre/teléfono/email sin acentos y tolerante a errores (pacientes/busqueda.py).
+# - Paciente.busqueda guarda el texto normalizado; se rellena aquí para los pacientes existentes.
+# - PostgreSQL: extensión pg_trgm e índice GIN gin_trgm_ops sobre busqueda (similitud por trigramas y LIKE).
+# - SQLite: tabla FTS5 de contenido externo con tokenizador trigram, sincronizada con triggers.
+#   Si SQLite no tiene FTS5 o es anterior a 3.34 (sin trigram), no se crea y la búsqueda usa LIKE.
+
+TABLA = 'pacientes_paciente'
+TABLA_FTS = f'{TABLA}_fts'
+INDICE_PG = 'paciente_busqueda_trgm'
+LOTE = 2000
+
+SQLITE_FORWARD = [
+    f"""CREATE VIRTUAL TABLE "{TABLA_FTS}" USING fts5(
+        busqueda, content='{TABLA}', content_rowid='id_paciente', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER "{TABLA_FTS}_ai" AFTER INSERT ON "{TABLA}" BEGIN
+        INSERT INTO "{TABLA_FTS}"(rowid, busqueda) VALUES (NEW.id_paciente, NEW.busqueda);
+    END""",
+    f"""CREATE TRIGGER "{TABLA_FTS}_ad" AFTER DELETE ON "{TABLA}" BEGIN
+        INSERT INTO "{TABLA_FTS}"("{TABLA_FTS}", rowid, busqueda) VALUES ('delete', OLD.id_paciente, OLD.busqueda);
+    END""",
+    f"""CREATE TRIGGER "{TABLA_FTS}_au" AFTER UPDATE OF busqueda ON "{TABLA}" BEGIN
+        INSERT INTO "{TABLA_FTS}"("{TABLA_FTS}", rowid, busqueda) VALUES ('delete', OLD.id_paciente, OLD.busqueda);
+        INSERT INTO "{TABLA_FTS}"(rowid, busqueda) VALUES (NEW.id_paciente, NEW.busqueda);
+    END""",
+    # Indexa las filas existentes
+    f"""INSERT INTO "{TABLA_FTS}"("{TABLA_FTS}") VALUES ('rebuild')""",
+]
+
+SQLITE_REVERSE = [
+    f'DROP TRIGGER IF EXISTS "{TABLA_FTS}_ai"',
+    f'DROP TRIGGER IF EXISTS "{TABLA_FTS}_ad"',
+    f'DROP TRIGGER IF EXISTS "{TABLA_FTS}_au"',
+    f'DROP TABLE IF EXISTS "{TABLA_FTS}"',
+]
+
+
+# Copia de pacientes/normalizacion.py al crear esta migración: la migración no depende del código vigente,
+# que puede cambiar después sin alterar lo que produce un `migrate` desde cero.
+def _normalizar(texto):
+    sin_acentos = ''.join(
+        c for c in unicodedata.normalize('NFKD', texto or '') if not unicodedata.combining(c)
+    )
+    return ' '.join(re.findall(r'[^\W_]+', sin_acentos.lower()))
+
+
+def _texto_busqueda(nombre, telefono, email):
+    digitos = re.sub(r'\D', '', telefono or '')
+    return ' '.join(p for p in (_normalizar(nombre), digitos, _normalizar(email)) if p)
+
+
+def rellenar_busqueda(apps, schema_editor):
+    Paciente = apps.get_model('pacientes', 'Paciente')
+    ultimo = 0
+    while True:
+        lote = list(Paciente.objects.filter(pk__gt=ultimo).order_by('pk').only('nombre', 'telefono', 'email')[:LOTE])
+        if not lote:
+            break
+        for paciente in lote:
+            paciente.busqueda = _texto_busqueda(paciente.nombre, paciente.telefono, paciente.email)
+        Paciente.objects.bulk_update(lote, ['busqueda'])
+        ultimo = lote[-1].pk
+
+
+def _indice_pg():
+    from django.contrib.postgres.indexes import GinIndex
+    return GinIndex(fields=['busqueda'], name=INDICE_PG, opclasses=['gin_trgm_ops'])
+
+
+def _fts5_trigram_disponible(schema_editor):
+    import sqlite3
+    if sqlite3.sqlite_version_info < (3, 34, 0):
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def crear_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.add_index(apps.get_model('pacientes', 'Paciente'), _indice_pg())
+    elif vendor == 'sqlite' and _fts5_trigram_disponible(schema_editor):
+        for sql in SQLITE_FORWARD:
+            schema_editor.execute(sql)
+
+
+def eliminar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # La extensión se deja: puede usarla otra parte de la base
+        schema_editor.remove_index(apps.get_model('pacientes', 'Paciente'), _indice_pg())
+    elif vendor == 'sqlite':
+        for sql in SQLITE_REVERSE:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0004_archivoclinico_archivo_fecha_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='busqueda',
+            field=models.CharField(blank=True, default='', editable=False, max_length=600),
+        ),
+        migrations.RunPython(rellenar_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+# Teléfono canónico indexado para la búsqueda exacta por número (PacienteViewSet.por_telefono).
+# Las filas existentes se completan con `manage.py normalizar_telefonos` (por lotes, fuera de la migración).
+# En SQLite, AddField con default recrea la tabla y se pierden los triggers FTS de 0005:
+# se vuelven a crear al final (la tabla FTS conserva el índice: los rowid no cambian).
+
+
+def recrear_triggers_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from importlib import import_module
+    previa = import_module('pacientes.migrations.0005_paciente_busqueda')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [previa.TABLA_FTS])
+        if cursor.fetchone() is None:
+            return
+    for sufijo in ('ai', 'ad', 'au'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS "{previa.TABLA_FTS}_{sufijo}"')
+    # Los triggers son las sentencias 2 a 4 de 0005 (la 1 crea la tabla FTS, la 5 la reconstruye)
+    for sql in previa.SQLITE_FORWARD[1:4]:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0005_paciente_busqueda'),
+    ]
+
+    operations = [
+        # Al revertir, RemoveField también recrea la tabla: restaurar los triggers al final
+        migrations.RunPython(migrations.RunPython.noop, recrear_triggers_fts),
+        migrations.AddField(
+            model_name='paciente',
+            name='telefono_normalizado',
+            field=models.CharField(blank=True, default='', editable=False, max_length=15),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['telefono_normalizado'], name='paciente_telefono_norm'),
+        ),
+        migrations.RunPython(recrear_triggers_fts, migrations.RunPython.noop),
+    ]
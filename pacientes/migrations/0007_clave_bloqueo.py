@@ -0,0 +1,88 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:10
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Índice de claves de bloqueo para la detección de pacientes duplicados (pacientes/duplicados.py),
+# calculado aquí para los pacientes existentes.
+
+LOTE = 2000
+
+
+# Copia de pacientes/normalizacion.py al crear esta migración: la migración no depende del código vigente,
+# que puede cambiar después sin alterar lo que produce un `migrate` desde cero.
+def _normalizar(texto):
+    sin_acentos = ''.join(
+        c for c in unicodedata.normalize('NFKD', texto or '') if not unicodedata.combining(c)
+    )
+    return ' '.join(re.findall(r'[^\W_]+', sin_acentos.lower()))
+
+
+def _telefono_canonico(texto):
+    digitos = re.sub(r'\D', '', texto or '')
+    if digitos.startswith('00'):
+        digitos = digitos[2:]
+    codigo = getattr(settings, 'TELEFONO_CODIGO_PAIS', '')
+    if codigo and digitos.startswith(codigo) and len(digitos) - len(codigo) >= 7:
+        digitos = digitos[len(codigo):]
+    return digitos.lstrip('0')
+
+
+def _claves_bloqueo(nombre, fecha_nacimiento, telefono):
+    fecha = str(fecha_nacimiento or '')[:10]
+    claves = set()
+    for palabra in _normalizar(nombre).split():
+        if len(palabra) >= 3 and fecha:
+            claves.add(f'nom:{palabra[:4]}:{fecha[:4]}')
+    if fecha:
+        claves.add(f'nac:{fecha}')
+    canonico = _telefono_canonico(telefono)
+    if len(canonico) >= 7:
+        claves.add(f'tel:{canonico}')
+    return sorted(claves)
+
+
+def rellenar_claves(apps, schema_editor):
+    Paciente = apps.get_model('pacientes', 'Paciente')
+    ClaveBloqueo = apps.get_model('pacientes', 'ClaveBloqueo')
+    ultimo = 0
+    while True:
+        lote = list(
+            Paciente.objects.filter(pk__gt=ultimo).order_by('pk')
+            .values_list('pk', 'nombre', 'fecha_nacimiento', 'telefono')[:LOTE]
+        )
+        if not lote:
+            break
+        ClaveBloqueo.objects.bulk_create([
+            ClaveBloqueo(paciente_id=pk, clave=clave)
+            for pk, nombre, fecha, telefono in lote
+            for clave in _claves_bloqueo(nombre, fecha, telefono)
+        ])
+        ultimo = lote[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0006_paciente_telefono_normalizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveBloqueo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=40)),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='claves_bloqueo', to='pacientes.paciente')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['clave', 'paciente'], name='clave_bloqueo_clave')],
+            },
+        ),
+        migrations.RunPython(rellenar_claves, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 
+from .normalizacion import telefono_canonico, texto_busqueda
+
 # Modelos del dominio de Pacientes: datos básicos, historial clínico y archivos adjuntos.
 class Paciente(models.Model):
     id_paciente = models.AutoField(primary_key=True)  # ID único del paciente
@@ -17,6 +19,29 @@ class Paciente(models.Model):
     telefono = models.CharField(max_length=15)  # Teléfono de contacto
     direccion = models.CharField(max_length=255)  # Dirección del paciente
     email = models.EmailField(max_length=255)  # Correo electrónico del paciente
+    # Nombre, teléfono y email normalizados (sin acentos, minúsculas) para la búsqueda indexada
+    # (pacientes/busqueda.py). Se recalcula al guardar; bulk_create debe llamar antes a actualizar_busqueda().
+    busqueda = models.CharField(max_length=600, blank=True, default='', editable=False)
+    # Teléfono canónico (normalizacion.telefono_canonico) para la búsqueda exacta por número entrante
+    telefono_normalizado = models.CharField(max_length=15, blank=True, default='', editable=False)
+
+    CAMPOS_BUSQUEDA = ('nombre', 'telefono', 'email')
+
+    class Meta:
+        indexes = [models.Index(fields=['telefono_normalizado'], name='paciente_telefono_norm')]
+
+    def actualizar_busqueda(self):
+        """Recalcula las columnas derivadas (busqueda, telefono_normalizado); también antes de bulk_create."""
+        self.busqueda = texto_busqueda(self.nombre, self.telefono, self.email)
+        self.telefono_normalizado = telefono_canonico(self.telefono)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(self.CAMPOS_BUSQUEDA) & set(update_fields):
+            self.actualizar_busqueda()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'busqueda', 'telefono_normalizado'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.nombre
@@ -30,6 +55,9 @@ class HistorialClinica(models.Model):
     descripcion = models.TextField()  # Descripción del tratamiento realizado
     diagnostico = models.TextField()  # Diagnóstico del paciente
 
+    class Meta:
+        indexes = [models.Index(fields=['id_paciente', 'fecha_atencion'], name='historial_paciente_fecha')]
+
     def __str__(self):
         return f"Historial de {self.id_paciente.nombre} - {self.fecha_atencion}"
 
@@ -43,6 +71,9 @@ class ArchivoClinico(models.Model):
     descripcion = models.TextField(blank=True)
     fechaAdjunto = models.DateTimeField(auto_now_add=True, null=True, blank=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['fechaAdjunto'], name='archivo_fecha')]
+
     def adjuntarArchivo(self, **kwargs):
         for k, v in kwargs.items():
             if hasattr(self, k):
@@ -62,4 +93,18 @@ class ArchivoClinico(models.Model):
         return ArchivoClinico.objects.filter(pk=pk).first()
 
     def __str__(self):
-        return f"Archivo de {self.paciente.nombre} - {self.nombreArchivo}"
\ No newline at end of file
+        return f"Archivo de {self.paciente.nombre} - {self.nombreArchivo}"
+
+# Claves de bloqueo de la detección de duplicados (ver pacientes/duplicados.py).
+# - Cada paciente tiene unas pocas claves (normalizacion.claves_bloqueo): prefijo de cada palabra del nombre
+#   con el año de nacimiento, fecha de nacimiento y teléfono canónico.
+# - Solo se comparan pacientes que comparten una clave: el índice por clave evita comparar todos contra todos.
+class ClaveBloqueo(models.Model):
+    paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, related_name='claves_bloqueo')
+    clave = models.CharField(max_length=40)  # p.ej. 'nom:gonz:1990', 'nac:1990-03-05', 'tel:70012345'
+
+    class Meta:
+        indexes = [models.Index(fields=['clave', 'paciente'], name='clave_bloqueo_clave')]
+
+    def __str__(self):
+        return f"{self.clave} ({self.paciente_id})"
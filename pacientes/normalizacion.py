@@ -0,0 +1,57 @@
+import re
+import unicodedata
+
+from django.conf import settings
+
+# Normalización de texto para búsquedas: minúsculas, sin acentos ni signos, espacios simples.
+# "José  Pérez-Núñez" -> "jose perez nunez"; el teléfono se reduce a dígitos.
+
+LONGITUD_MINIMA_LOCAL = 7
+LONGITUD_PREFIJO_NOMBRE = 4
+
+
+def normalizar(texto):
+    sin_acentos = ''.join(
+        c for c in unicodedata.normalize('NFKD', texto or '') if not unicodedata.combining(c)
+    )
+    return ' '.join(re.findall(r'[^\W_]+', sin_acentos.lower()))
+
+
+def solo_digitos(texto):
+    return re.sub(r'\D', '', texto or '')
+
+
+def telefono_canonico(texto):
+    """Forma canónica de un número para buscarlo por igualdad: solo dígitos, sin prefijo internacional
+    (00 o +), sin el código de país local (TELEFONO_CODIGO_PAIS) y sin el 0 de larga distancia.
+    "+591 (700) 12-345" -> "70012345"; un número de otro país conserva su código ("+54 11..." -> "5411...")."""
+    digitos = solo_digitos(texto)
+    if digitos.startswith('00'):
+        digitos = digitos[2:]
+    codigo = getattr(settings, 'TELEFONO_CODIGO_PAIS', '')
+    # Solo se quita el código si deja un número local completo (p.ej. "5912" es un interno, no "+591 2")
+    if codigo and digitos.startswith(codigo) and len(digitos) - len(codigo) >= LONGITUD_MINIMA_LOCAL:
+        digitos = digitos[len(codigo):]
+    return digitos.lstrip('0')
+
+
+def texto_busqueda(nombre, telefono, email):
+    """Contenido de Paciente.busqueda: nombre, teléfono (dígitos) y email normalizados."""
+    return ' '.join(p for p in (normalizar(nombre), solo_digitos(telefono), normalizar(email)) if p)
+
+
+def claves_bloqueo(nombre, fecha_nacimiento, telefono):
+    """Claves de bloqueo para la detección de duplicados (pacientes/duplicados.py): dos pacientes solo se
+    comparan si comparten alguna. Una por palabra del nombre (sus primeras letras + año de nacimiento,
+    tolera errores al final de la palabra), una por fecha de nacimiento y una por teléfono canónico."""
+    fecha = str(fecha_nacimiento or '')[:10]
+    claves = set()
+    for palabra in normalizar(nombre).split():
+        if len(palabra) >= 3 and fecha:
+            claves.add(f'nom:{palabra[:LONGITUD_PREFIJO_NOMBRE]}:{fecha[:4]}')
+    if fecha:
+        claves.add(f'nac:{fecha}')
+    canonico = telefono_canonico(telefono)
+    if len(canonico) >= LONGITUD_MINIMA_LOCAL:
+        claves.add(f'tel:{canonico}')
+    return sorted(claves)
@@ -4,7 +4,7 @@ from .models import Paciente, HistorialClinica, ArchivoClinico
 class PacienteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Paciente
-        fields = '__all__'
+        exclude = ['busqueda', 'telefono_normalizado']  # Columnas internas de búsqueda
 
 class HistorialClinicaSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,94 @@
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from backend.cache import invalidar
+from citas.models import Cita, Odontologo
+from .historial import invalidar_historial
+from .models import Paciente, HistorialClinica, ArchivoClinico
+
+# Invalidación del historial cacheado por paciente (ver pacientes/historial.py).
+# Las señales no cubren bulk_create/update(): esos caminos llaman a invalidar_historial explícitamente.
+
+
+@receiver(post_save, sender=Paciente)
+@receiver(post_delete, sender=Paciente)
+def invalidar_historial_por_paciente(sender, instance, **kwargs):
+    try:
+        invalidar_historial(instance.pk)
+    except Exception:
+        pass
+
+
+@receiver(post_save, sender=HistorialClinica)
+@receiver(post_delete, sender=HistorialClinica)
+@receiver(post_save, sender=ArchivoClinico)
+@receiver(post_delete, sender=ArchivoClinico)
+def invalidar_historial_por_registro(sender, instance, **kwargs):
+    try:
+        campo = 'id_paciente_id' if sender is HistorialClinica else 'paciente_id'
+        invalidar_historial(getattr(instance, campo))
+    except Exception:
+        pass
+
+
+# Una cita puede cambiar de paciente al editarse: se recuerda el paciente original.
+# Se lee de __dict__ para no disparar consultas con campos diferidos.
+@receiver(post_init, sender=Cita)
+def recordar_paciente_cita(sender, instance, **kwargs):
+    instance._historial_previo = instance.__dict__.get('id_paciente_id')
+
+
+@receiver(post_save, sender=Cita)
+@receiver(post_delete, sender=Cita)
+def invalidar_historial_por_cita(sender, instance, **kwargs):
+    try:
+        invalidar_historial(instance.id_paciente_id, getattr(instance, '_historial_previo', None))
+        instance._historial_previo = instance.id_paciente_id
+    except Exception:
+        pass
+
+
+@receiver(post_save, sender=Odontologo)
+def invalidar_historial_por_odontologo(sender, instance, created, **kwargs):
+    # El historial muestra el nombre del odontólogo de cada cita
+    if created:
+        return
+    try:
+        invalidar('historial')
+    except Exception:
+        pass
+
+
+# Borrar un odontólogo deja sus citas con id_odontologo NULL mediante un UPDATE (SET_NULL) que no emite
+# señales de Cita: se recuerdan los pacientes afectados antes del borrado y se invalida su historial después.
+@receiver(pre_delete, sender=Odontologo)
+def recordar_pacientes_del_odontologo(sender, instance, **kwargs):
+    try:
+        instance._pacientes_historial = set(
+            Cita.objects.filter(id_odontologo=instance).values_list('id_paciente_id', flat=True)
+        )
+    except Exception:
+        instance._pacientes_historial = set()
+
+
+@receiver(post_delete, sender=Odontologo)
+def invalidar_historial_por_baja_de_odontologo(sender, instance, **kwargs):
+    try:
+        invalidar_historial(*getattr(instance, '_pacientes_historial', ()))
+    except Exception:
+        pass
+
+
+# Claves de bloqueo para la detección de duplicados (ver pacientes/duplicados.py).
+# Solo se recalculan si cambió algún campo que las compone; bulk_create (importación) las crea aparte.
+CAMPOS_CLAVE = {'nombre', 'fecha_nacimiento', 'telefono'}
+
+
+@receiver(post_save, sender=Paciente)
+def actualizar_claves_de_paciente(sender, instance, created, update_fields=None, **kwargs):
+    if not created and update_fields is not None and not CAMPOS_CLAVE & set(update_fields):
+        return
+    try:
+        from .duplicados import actualizar_claves
+        actualizar_claves([instance])
+    except Exception:
+        pass
@@ -0,0 +1,90 @@
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+
+from citas.models import Cita, Odontologo
+from .models import Paciente
+from .normalizacion import telefono_canonico
+
+# Búsqueda por número entrante (identificador de llamadas en recepción).
+# - Paciente.telefono y Odontologo.telefono son texto libre; telefono_normalizado guarda la forma
+#   canónica (normalizacion.telefono_canonico), indexada, y se calcula en save().
+# - `buscar_por_telefono` resuelve el número en una sola consulta: igualdad sobre el índice
+#   paciente_telefono_norm y la próxima cita activa como subconsultas correlacionadas, que usan
+#   el índice parcial cita_paciente_intervalo (id_paciente, fecha) sin leer las canceladas.
+# - `normalizar_existentes` completa la columna de filas anteriores (comando normalizar_telefonos).
+
+MODELOS = {'pacientes': Paciente, 'odontologos': Odontologo}
+MAX_COINCIDENCIAS = 10
+
+
+def buscar_por_telefono(numero, ahora):
+    """Pacientes con ese número (varios si comparten teléfono, p.ej. una familia), cada uno con su
+    próxima cita pendiente/confirmada desde `ahora`. Devuelve (número canónico, lista de dicts)."""
+    canonico = telefono_canonico(numero)
+    if not canonico:
+        return canonico, []
+    proxima = (
+        Cita.objects
+        .filter(id_paciente=OuterRef('pk'), fecha__gte=ahora)
+        .filter(~Q(estado='cancelada'))
+        .order_by('fecha', 'id_cita')
+    )
+    filas = (
+        Paciente.objects
+        .filter(telefono_normalizado=canonico)
+        .annotate(
+            cita_id=Subquery(proxima.values('id_cita')[:1]),
+            cita_fecha=Subquery(proxima.values('fecha')[:1]),
+            cita_estado=Subquery(proxima.values('estado')[:1]),
+            cita_odontologo=Subquery(proxima.values('id_odontologo__nombre')[:1]),
+        )
+        .order_by('id_paciente')
+        .values(
+            'id_paciente', 'nombre', 'telefono', 'email', 'fecha_nacimiento',
+            'cita_id', 'cita_fecha', 'cita_estado', 'cita_odontologo',
+        )[:MAX_COINCIDENCIAS]
+    )
+    pacientes = []
+    for f in filas:
+        pacientes.append({
+            'id_paciente': f['id_paciente'],
+            'nombre': f['nombre'],
+            'telefono': f['telefono'],
+            'email': f['email'],
+            'fecha_nacimiento': f['fecha_nacimiento'],
+            'proxima_cita': None if f['cita_id'] is None else {
+                'id_cita': f['cita_id'],
+                'fecha': f['cita_fecha'],
+                'estado': f['cita_estado'],
+                'odontologo': f['cita_odontologo'],
+            },
+        })
+    return canonico, pacientes
+
+
+def normalizar_existentes(modelo, lote=1000, dry_run=False):
+    """Recalcula telefono_normalizado de `modelo` (Paciente u Odontologo) recorriendo la tabla por pk,
+    un lote por transacción y solo con las columnas necesarias. bulk_update no dispara señales
+    (historial, sincronización): la columna no forma parte de ningún dato cacheado.
+    Devuelve (filas revisadas, filas corregidas)."""
+    revisados = corregidos = 0
+    ultimo = 0
+    while True:
+        filas = list(
+            modelo.objects.filter(pk__gt=ultimo).order_by('pk').only('pk', 'telefono', 'telefono_normalizado')[:lote]
+        )
+        if not filas:
+            break
+        ultimo = filas[-1].pk
+        revisados += len(filas)
+        cambiados = []
+        for fila in filas:
+            canonico = telefono_canonico(fila.telefono)
+            if fila.telefono_normalizado != canonico:
+                fila.telefono_normalizado = canonico
+                cambiados.append(fila)
+        corregidos += len(cambiados)
+        if cambiados and not dry_run:
+            with transaction.atomic():
+                modelo.objects.bulk_update(cambiados, ['telefono_normalizado'])
+    return revisados, corregidos
@@ -1,3 +1,339 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from citas.agenda import agenda_del_dia
+from citas.models import Cita, Odontologo
+from . import busqueda, duplicados, importacion
+from .models import ArchivoClinico, ClaveBloqueo, HistorialClinica, Paciente
+
+CACHE_LOCAL = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'},
+    'versiones': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-versiones'},
+    'sesiones': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-sesiones'},
+}
+
+
+def crear_paciente(nombre, telefono='70000001', fecha_nacimiento=date(1990, 1, 1), email='p@x.com', **extra):
+    return Paciente.objects.create(
+        nombre=nombre, telefono=telefono, fecha_nacimiento=fecha_nacimiento, email=email, direccion='x', **extra,
+    )
+
+
+def crear_odontologo(nombre='Dra. Vega'):
+    return Odontologo.objects.create(nombre=nombre, especialidad='General', telefono='70000009', email='o@x.com')
+
+
+@override_settings(CACHES=CACHE_LOCAL, DISABLE_ROLE_PERMS=True)
+class HistorialCacheadoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.paciente = crear_paciente('Ana Ríos')
+        self.odontologo = crear_odontologo()
+        self.url = f'/pacientes/api/pacientes/{self.paciente.pk}/historial/'
+
+    def historial(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta
+
+    def test_etag_vigente_responde_304(self):
+        etiqueta = self.historial()['ETag']
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etiqueta)
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_cita_nueva_invalida_el_historial(self):
+        etiqueta = self.historial()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Cita.objects.create(
+                id_paciente=self.paciente, id_odontologo=self.odontologo, fecha=datetime(2026, 3, 2, 10), estado='pendiente',
+            )
+        respuesta = self.historial()
+        self.assertNotEqual(respuesta['ETag'], etiqueta)
+        self.assertEqual([c['odontologo'] for c in respuesta.json()['citas']], ['Dra. Vega'])
+
+    def test_historia_clinica_invalida_el_historial(self):
+        self.historial()
+        with self.captureOnCommitCallbacks(execute=True):
+            HistorialClinica.objects.create(
+                id_paciente=self.paciente, fecha_atencion=datetime(2026, 3, 2, 10), descripcion='Limpieza', diagnostico='-',
+            )
+        self.assertEqual(len(self.historial().json()['historiales']), 1)
+
+    def test_renombrar_odontologo_invalida_el_historial(self):
+        Cita.objects.create(
+            id_paciente=self.paciente, id_odontologo=self.odontologo, fecha=datetime(2026, 3, 2, 10), estado='pendiente',
+        )
+        self.historial()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.odontologo.nombre = 'Dra. Vega Ruiz'
+            self.odontologo.save()
+        self.assertEqual(self.historial().json()['citas'][0]['odontologo'], 'Dra. Vega Ruiz')
+
+    def test_borrar_odontologo_invalida_el_historial(self):
+        Cita.objects.create(
+            id_paciente=self.paciente, id_odontologo=self.odontologo, fecha=datetime(2026, 3, 2, 10), estado='pendiente',
+        )
+        etiqueta = self.historial()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Odontologo.objects.filter(pk=self.odontologo.pk).delete()
+        respuesta = self.historial()
+        self.assertNotEqual(respuesta['ETag'], etiqueta)
+        self.assertEqual(respuesta.json()['citas'][0]['odontologo'], None)
+
+
+@override_settings(CACHES=CACHE_LOCAL, DISABLE_ROLE_PERMS=True)
+class BusquedaTests(TestCase):
+    url = '/pacientes/api/pacientes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jose = crear_paciente('José Pérez', telefono='+591 700-12345', email='jose@correo.com')
+        cls.josefa = crear_paciente('Josefa Peralta', telefono='70055555')
+        cls.maria = crear_paciente('María Núñez', telefono='71111111', email='maria@x.com')
+
+    def buscar(self, texto, **params):
+        respuesta = self.client.get(self.url, {'buscar': texto, **params})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def nombres(self, texto, **params):
+        return [p['nombre'] for p in self.buscar(texto, **params)['results']]
+
+    def test_consulta_normalizada(self):
+        self.assertEqual(busqueda.consulta('  José PÉREZ-Núñez '), 'jose perez nunez')
+        self.assertEqual(busqueda.consulta('+591 (700) 12-345'), '59170012345')
+
+    def test_similitud(self):
+        self.assertEqual(busqueda.similitud('perez', 'jose perez'), 1.0)
+        self.assertGreaterEqual(busqueda.similitud('jose perz', 'jose perez'), busqueda.UMBRAL_SIMILITUD)
+        self.assertLess(busqueda.similitud('maria', 'jose perez'), busqueda.UMBRAL_SIMILITUD)
+
+    def test_sin_acentos_y_con_errores_de_tipeo(self):
+        self.assertEqual(self.nombres('maria nunez'), ['María Núñez'])
+        self.assertEqual(self.nombres('jose perz')[0], 'José Pérez')
+        self.assertNotIn('María Núñez', self.nombres('jose perz'))
+
+    def test_por_telefono_y_email(self):
+        self.assertEqual(self.nombres('700-12345'), ['José Pérez'])
+        self.assertEqual(self.nombres('jose@correo')[0], 'José Pérez')
+
+    def test_mas_parecido_primero(self):
+        self.assertEqual(self.nombres('jose perez'), ['José Pérez', 'Josefa Peralta'])
+        rangos = [p.rango for p in busqueda.buscar(Paciente.objects.all(), 'jose perez', con_rango=True)]
+        self.assertEqual(max(rangos), 1.0)
+
+    def test_orden_de_alta(self):
+        self.assertEqual(self.nombres('jose', orden='alta'), ['José Pérez', 'Josefa Peralta'])
+
+    def test_cursor_recorre_empates_sin_repetir(self):
+        ids = {crear_paciente('Ana Gómez', telefono=f'7200000{i}').pk for i in range(7)}
+        vistos, siguiente = [], None
+        pagina = self.buscar('ana gomez', page_size=3)
+        while True:
+            vistos += [p['id_paciente'] for p in pagina['results']]
+            siguiente = pagina['next']
+            if not siguiente:
+                break
+            pagina = self.client.get(siguiente).json()
+        self.assertEqual(len(vistos), 7)
+        self.assertEqual(set(vistos), ids)
+        # Igual relevancia: por pk descendente
+        self.assertEqual(vistos, sorted(vistos, reverse=True))
+
+    def test_cursor_invalido(self):
+        respuesta = self.client.get(self.url, {'buscar': 'jose', 'cursor': 'no-es-un-cursor'})
+        self.assertEqual(respuesta.status_code, 404)
+
+
+class ImportacionTests(TestCase):
+    ENCABEZADO = 'Nombre;Fecha de nacimiento;Género;Teléfono;Dirección;Email'
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        self.reporte = os.path.join(directorio, 'reporte.csv')
+
+    def importar(self, *lineas, nombre='pacientes.csv', **opciones):
+        contenido = '\ufeff' + '\n'.join((self.ENCABEZADO, *lineas)) + '\n'
+        return importacion.importar_archivo(
+            io.BytesIO(contenido.encode('utf-8')), nombre, ruta=self.reporte, **opciones,
+        )
+
+    def filas_reporte(self):
+        with open(self.reporte, encoding='utf-8-sig', newline='') as archivo:
+            return list(csv.DictReader(archivo))
+
+    def test_importa_con_encabezados_y_formatos_flexibles(self):
+        resumen = self.importar(
+            'José Pérez;05/03/1985;masculino;+591 700-12345;Calle 1;jose@x.com',
+            'Ana Ríos;1990-07-01;F;71111111;Calle 2;ana@x.com',
+        )
+        self.assertEqual(resumen, {'filas': 2, 'importados': 2, 'errores': 0, 'duplicados': 0, 'reporte': None})
+        jose = Paciente.objects.get(nombre='José Pérez')
+        self.assertEqual((jose.fecha_nacimiento, jose.genero), (date(1985, 3, 5), 'M'))
+        # bulk_create no llama a save(): columnas de búsqueda y claves de duplicados calculadas aparte
+        self.assertEqual((jose.busqueda, jose.telefono_normalizado), ('jose perez 59170012345 jose x com', '70012345'))
+        self.assertTrue(ClaveBloqueo.objects.filter(paciente=jose, clave='tel:70012345').exists())
+
+    def test_filas_con_errores_van_al_reporte(self):
+        resumen = self.importar(
+            'José Pérez;05/03/1985;M;70012345;Calle 1;jose@x.com',
+            'Sin Fecha;31/02/1990;M;70000002;Calle 2;s@x.com',
+            'Mal Correo;1990-01-01;M;70000003;Calle 3;no-es-correo',
+            ';;;;;',
+        )
+        self.assertEqual((resumen['importados'], resumen['errores'], resumen['reporte']), (1, 2, self.reporte))
+        filas = self.filas_reporte()
+        self.assertEqual([f['fila'] for f in filas], ['3', '4'])
+        self.assertIn('fecha_nacimiento', filas[0]['errores'])
+        self.assertIn('email', filas[1]['errores'])
+        self.assertEqual(filas[1]['nombre'], 'Mal Correo')
+
+    def test_duplicados_del_archivo_y_de_la_base(self):
+        crear_paciente('Ana Ríos', telefono='71111111', fecha_nacimiento=date(1990, 7, 1))
+        resumen = self.importar(
+            'José Pérez;05/03/1985;M;70012345;Calle 1;jose@x.com',
+            'Jose Perez;05/03/1985;M;700-12345;Calle 9;jose@x.com',
+            'Ana Rios;1990-07-01;F;71111111;Calle 2;ana@x.com',
+            lote=2,
+        )
+        self.assertEqual((resumen['importados'], resumen['duplicados']), (1, 2))
+        motivos = {f['nombre']: f['errores'] for f in self.filas_reporte()}
+        self.assertIn('parecido a la fila 2 del archivo', motivos['Jose Perez'])
+        self.assertIn('parecido al paciente #', motivos['Ana Rios'])
+
+    def test_duplicado_entre_lotes(self):
+        resumen = self.importar(
+            'José Pérez;05/03/1985;M;70012345;Calle 1;jose@x.com',
+            'Ana Ríos;1990-07-01;F;71111111;Calle 2;ana@x.com',
+            'Jose Perez;05/03/1985;M;70012345;Calle 1;jose@x.com',
+            lote=2,
+        )
+        self.assertEqual((resumen['importados'], resumen['duplicados']), (2, 1))
+
+    def test_ignorar_duplicados(self):
+        resumen = self.importar(
+            'José Pérez;05/03/1985;M;70012345;Calle 1;jose@x.com',
+            'Jose Perez;05/03/1985;M;70012345;Calle 1;jose@x.com',
+            ignorar_duplicados=True,
+        )
+        self.assertEqual((resumen['importados'], resumen['duplicados']), (2, 0))
+
+    def test_dry_run_no_inserta(self):
+        resumen = self.importar('José Pérez;05/03/1985;M;70012345;Calle 1;jose@x.com', dry_run=True)
+        self.assertEqual(resumen['importados'], 1)
+        self.assertFalse(Paciente.objects.exists())
+
+    def test_archivo_invalido(self):
+        with self.assertRaisesMessage(importacion.ErrorImportacion, 'Faltan columnas: email'):
+            importacion.importar_archivo(io.BytesIO(b'nombre,fecha_nacimiento,telefono,direccion\n'), 'p.csv')
+        with self.assertRaisesMessage(importacion.ErrorImportacion, 'Formato no soportado'):
+            importacion.importar_archivo(io.BytesIO(b''), 'p.txt')
+
+    @unittest.skipIf(importacion.openpyxl is None, 'openpyxl no instalado')
+    def test_xlsx(self):
+        libro = importacion.openpyxl.Workbook()
+        hoja = libro.active
+        hoja.append(['nombre', 'fecha_nacimiento', 'genero', 'telefono', 'direccion', 'email'])
+        hoja.append(['José Pérez', datetime(1985, 3, 5), 'M', 70012345.0, 'Calle 1', 'jose@x.com'])
+        contenido = io.BytesIO()
+        libro.save(contenido)
+        contenido.seek(0)
+        resumen = importacion.importar_archivo(contenido, 'pacientes.xlsx', ruta=self.reporte)
+        self.assertEqual(resumen['importados'], 1)
+        self.assertEqual(Paciente.objects.get().telefono, '70012345')
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class FusionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.odontologo = crear_odontologo()
+        self.principal = crear_paciente('José Pérez', telefono='70012345')
+        self.copia = crear_paciente('Jose Perez', telefono='700-12345')
+
+    def cita(self, paciente, hora, odontologo=None):
+        return Cita.objects.create(
+            id_paciente=paciente, id_odontologo=odontologo or self.odontologo, fecha=datetime(2026, 3, 2, hora), estado='pendiente',
+        )
+
+    def test_mueve_citas_historias_y_archivos(self):
+        cita = self.cita(self.copia, 10)
+        HistorialClinica.objects.create(
+            id_paciente=self.copia, fecha_atencion=datetime(2026, 3, 2, 10), descripcion='Limpieza', diagnostico='-',
+        )
+        ArchivoClinico.objects.create(paciente=self.copia, nombreArchivo='rx.png')
+        resumen = duplicados.fusionar(self.principal, [self.copia.pk])
+        self.assertEqual(resumen, {'fusionados': [self.copia.pk], 'citas': 1, 'historiales': 1, 'archivos': 1})
+        self.assertFalse(Paciente.objects.filter(pk=self.copia.pk).exists())
+        self.assertEqual(Cita.objects.get(pk=cita.pk).id_paciente_id, self.principal.pk)
+        self.assertEqual(HistorialClinica.objects.get().id_paciente_id, self.principal.pk)
+        self.assertEqual(ArchivoClinico.objects.get().paciente_id, self.principal.pk)
+
+    def test_citas_solapadas_no_cambian_nada(self):
+        self.cita(self.principal, 10)
+        self.cita(self.copia, 10, crear_odontologo('Dr. Soto'))
+        ArchivoClinico.objects.create(paciente=self.copia, nombreArchivo='rx.png')
+        with self.assertRaises(duplicados.FusionInvalida):
+            duplicados.fusionar(self.principal, [self.copia.pk])
+        self.assertTrue(Paciente.objects.filter(pk=self.copia.pk).exists())
+        self.assertEqual(Cita.objects.filter(id_paciente=self.copia).count(), 1)
+        self.assertEqual(ArchivoClinico.objects.get().paciente_id, self.copia.pk)
+
+    def test_ids_invalidos(self):
+        with self.assertRaisesMessage(duplicados.FusionInvalida, 'Pacientes inexistentes: [999999]'):
+            duplicados.fusionar(self.principal, [self.copia.pk, 999999])
+        with self.assertRaisesMessage(duplicados.FusionInvalida, 'Indique al menos un duplicado.'):
+            duplicados.fusionar(self.principal, [self.principal.pk])
+        self.assertTrue(Paciente.objects.filter(pk=self.copia.pk).exists())
+
+    def test_invalida_agenda_e_historial(self):
+        self.cita(self.copia, 10)
+        url = f'/pacientes/api/pacientes/{self.principal.pk}/historial/'
+        with override_settings(DISABLE_ROLE_PERMS=True):
+            self.assertEqual(self.client.get(url).json()['citas'], [])
+        self.assertEqual(agenda_del_dia(self.odontologo.pk, date(2026, 3, 2), lambda filas: [])['citas'][0]['paciente'], 'Jose Perez')
+        with self.captureOnCommitCallbacks(execute=True):
+            duplicados.fusionar(self.principal, [self.copia.pk])
+        with override_settings(DISABLE_ROLE_PERMS=True):
+            self.assertEqual(len(self.client.get(url).json()['citas']), 1)
+        self.assertEqual(agenda_del_dia(self.odontologo.pk, date(2026, 3, 2), lambda filas: [])['citas'][0]['paciente'], 'José Pérez')
+
+
+class DeteccionTests(TestCase):
+    def test_cada_par_se_compara_una_vez(self):
+        # Comparten nombre, fecha y teléfono: cuatro claves en común, una sola comparación
+        a = crear_paciente('José Pérez', telefono='70012345')
+        b = crear_paciente('Jose Perez', telefono='700-12345')
+        crear_paciente('Ana Ríos', telefono='71111111', fecha_nacimiento=date(1975, 6, 1))
+        estadisticas = {}
+        pares = list(duplicados.detectar(estadisticas=estadisticas))
+        self.assertEqual([(x, y) for x, y, _, _ in pares], [(a.pk, b.pk)])
+        self.assertEqual(estadisticas['comparaciones'], 1)
+        self.assertGreater(estadisticas['bloques'], 1)
+
+    def test_bloques_grandes_se_omiten(self):
+        # Solo comparten la fecha de nacimiento: ese bloque supera max_bloque y no se compara
+        for i, nombre in enumerate(('Ana Ríos', 'Beto Luna', 'Carla Soto')):
+            crear_paciente(nombre, telefono=f'7000000{i}')
+        estadisticas = {}
+        self.assertEqual(list(duplicados.detectar(umbral=0.0, max_bloque=2, estadisticas=estadisticas)), [])
+        self.assertEqual((estadisticas['bloques_omitidos'], estadisticas['comparaciones']), (1, 0))
+        self.assertEqual(len(list(duplicados.detectar(umbral=0.0))), 3)
+
+    def test_par_omitido_en_un_bloque_se_compara_en_otro(self):
+        a = crear_paciente('José Pérez', telefono='70012345')
+        b = crear_paciente('Jose Perez', telefono='70012345')
+        crear_paciente('Ana Ríos', telefono='71111111')
+        estadisticas = {}
+        pares = list(duplicados.detectar(max_bloque=2, estadisticas=estadisticas))
+        self.assertEqual([(x, y) for x, y, _, _ in pares], [(a.pk, b.pk)])
+        self.assertEqual((estadisticas['bloques_omitidos'], estadisticas['comparaciones']), (1, 1))
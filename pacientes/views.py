@@ -1,8 +1,12 @@
 from django.shortcuts import render, redirect, get_object_or_404  # Helpers de vistas
 from django.contrib import messages  # Mensajes flash
+from django.http import FileResponse
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from .models import Paciente  # Modelo Paciente
 from .forms import PacienteForm  # Formulario Paciente
-from rest_framework import viewsets
+from rest_framework import viewsets, status
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 try:
@@ -13,8 +17,13 @@ from .models import HistorialClinica, ArchivoClinico  # Modelos HistorialClinica
 from .serializers import PacienteSerializer, HistorialClinicaSerializer, ArchivoClinicoSerializer
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from citas.models import Cita
 from seguridad_y_personal.permissions import RolesPermission
+from backend.cache import etag, obtener_por_clave
+from backend import exportacion
+from backend.pagination import PaginacionPorRelevancia
+from seguridad_y_personal.auditoria import actor_id, registrar
+from . import busqueda, duplicados, importacion, telefonos
+from .historial import clave_historial, componer_historial
 
 # Vistas HTML clásicas (templates) y ViewSets DRF.
 # - Las vistas HTML permiten uso tradicional de Django (render/redirect/forms).
@@ -67,40 +76,154 @@ class PacienteViewSet(viewsets.ModelViewSet):
         'destroy': ['recepcionista'],
         # CU6: historial del paciente, exclusivo para odontólogo
         'historial': ['odontologo'],
+        # Identificación de llamadas entrantes en recepción
+        'por_telefono': ['recepcionista'],
+        # Carga masiva de pacientes (CSV/XLSX) y su reporte de errores
+        'importar': ['recepcionista'],
+        'reporte_importacion': ['recepcionista'],
+        'exportar': ['recepcionista'],
+        # Posibles duplicados de un paciente y fusión de registros duplicados
+        'duplicados': ['recepcionista'],
+        'fusionar': ['recepcionista'],
     }
 
+    def _por_relevancia(self):
+        """Un listado con texto buscado se ordena por parecido, salvo ?orden=alta."""
+        params = self.request.query_params
+        return (
+            getattr(self, 'action', None) == 'list'
+            and bool((params.get('buscar') or '').strip())
+            and params.get('orden', 'relevancia') != 'alta'
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = PaginacionPorRelevancia() if self._por_relevancia() else super().paginator
+        return self._paginator
+
+    def get_queryset(self):
+        """
+        Filtros por query params (opcionales):
+        - buscar: nombre, teléfono o email, sin acentos y tolerante a errores de tipeo (pacientes/busqueda.py);
+          resultados por parecido, o por orden de alta con orden=alta (la exportación siempre por orden de alta)
+        """
+        qs = super().get_queryset().defer('busqueda')
+        texto = (self.request.query_params.get('buscar') or '').strip()
+        if texto and getattr(self, 'action', None) in ('list', 'exportar'):
+            qs = busqueda.buscar(qs, texto, con_rango=self._por_relevancia())
+        return qs
+
+    def perform_create(self, serializer):
+        """
+        Antes de crear se buscan pacientes muy parecidos (pacientes/duplicados.py). Si los hay se responde
+        409 con los candidatos; para crearlo igual se reenvía con ignorar_duplicados=true.
+        """
+        forzar = str(self.request.data.get('ignorar_duplicados', '')).lower() in ('1', 'true', 'si', 'sí')
+        if not forzar:
+            similares = duplicados.candidatos(Paciente(**serializer.validated_data))
+            if similares:
+                raise duplicados.PosibleDuplicado(similares)
+        serializer.save()
+
     # Acción adicional (CU6) que compone información del paciente,
-    # sus citas y sus archivos clínicos en una sola respuesta.
+    # sus citas, historias clínicas y archivos clínicos en una sola respuesta.
     @action(detail=True, methods=['get'])
     def historial(self, request, pk=None):
         """
         CU6: Consultar historial del paciente
         - Devuelve información básica del paciente
-        - Lista de citas (citas.Cita) asociadas
-        - Lista de archivos clínicos (pacientes.ArchivoClinico) asociados
+        - Lista de citas (citas.Cita) asociadas, con el nombre del odontólogo
+        - Historias clínicas (pacientes.HistorialClinica) y archivos clínicos (pacientes.ArchivoClinico)
+        Respuesta cacheada por paciente (pacientes/historial.py) con ETag: si el cliente envía
+        If-None-Match con el ETag vigente se responde 304 sin recomponer ni leer la caché.
         """
         paciente = self.get_object()
-        # Serializa el paciente
-        paciente_data = PacienteSerializer(paciente).data
-        # Obtiene y serializa citas del paciente
-        citas = Cita.objects.filter(id_paciente=paciente)
-        citas_data = [
-            {
-                'id_cita': c.id_cita,
-                'fecha': c.fecha,
-                'estado': c.estado,
-                'odontologo': c.id_odontologo.nombre if c.id_odontologo else None,
-            }
-            for c in citas
-        ]
-        # Obtiene y serializa archivos clínicos del paciente
-        archivos = ArchivoClinico.objects.filter(paciente=paciente)
-        archivos_data = ArchivoClinicoSerializer(archivos, many=True).data
-        return Response({
-            'paciente': paciente_data,
-            'citas': citas_data,
-            'archivos': archivos_data,
-        })
+        clave = clave_historial(paciente.pk)
+        etiqueta = etag(clave)
+        if etiqueta in request.headers.get('If-None-Match', ''):
+            respuesta = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            respuesta = Response(obtener_por_clave(clave, lambda: componer_historial(paciente)))
+        respuesta['ETag'] = etiqueta
+        # El navegador guarda la respuesta pero revalida siempre (datos clínicos: solo caché privada)
+        respuesta['Cache-Control'] = 'private, no-cache'
+        return respuesta
+
+    @action(detail=False, methods=['get'])
+    def por_telefono(self, request):
+        """
+        Búsqueda exacta por número entrante: ?numero=+591 700-12345 (cualquier formato).
+        Devuelve los pacientes con ese teléfono y la próxima cita activa de cada uno, resueltos
+        en una sola consulta sobre el teléfono normalizado (pacientes/telefonos.py).
+        """
+        numero = (request.query_params.get('numero') or '').strip()
+        if not numero:
+            return Response({'detail': 'Indique el número en ?numero='}, status=status.HTTP_400_BAD_REQUEST)
+        canonico, pacientes = telefonos.buscar_por_telefono(numero, timezone.now())
+        return Response({'numero': canonico, 'pacientes': pacientes})
+
+    @action(detail=True, methods=['get'])
+    def duplicados(self, request, pk=None):
+        """Posibles duplicados del paciente, del más al menos parecido (puntaje 0..1 y campos que coinciden)."""
+        return Response(duplicados.candidatos(self.get_object()))
+
+    @action(detail=True, methods=['post'])
+    def fusionar(self, request, pk=None):
+        """
+        Fusiona pacientes duplicados en este: {"duplicados": [ids]}. Sus citas, historias clínicas y archivos
+        pasan a este paciente y los duplicados se eliminan, todo o nada (409 si las citas se solapan).
+        """
+        principal = self.get_object()
+        ids = request.data.get('duplicados')
+        if not isinstance(ids, list) or not all(str(i).isdigit() for i in ids):
+            return Response({'detail': 'Indique "duplicados": lista de ids de pacientes.'}, status=status.HTTP_400_BAD_REQUEST)
+        resultado = duplicados.fusionar(principal, ids)
+        registrar(actor_id(request), f'Fusión de pacientes en: {principal.nombre}', 'edicion', principal, resultado)
+        return Response(resultado)
+
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """Todos los pacientes (con el filtro ?buscar= si se indica) en ?formato=csv|ndjson, en streaming."""
+        qs = self.filter_queryset(self.get_queryset()).order_by('id_paciente')
+        return exportacion.exportar(
+            request, qs, ['id_paciente', 'nombre', 'fecha_nacimiento', 'genero', 'telefono', 'direccion', 'email'],
+            'pacientes',
+        )
+
+    @action(detail=False, methods=['post'])
+    def importar(self, request):
+        """
+        Importación masiva: multipart con `archivo` (.csv o .xlsx), `dry_run` opcional (solo valida) e
+        `ignorar_duplicados` opcional (importa también las filas muy parecidas a pacientes existentes).
+        Valida e inserta por lotes (pacientes/importacion.py). Si hay filas rechazadas, `reporte`
+        es la URL del CSV con la fila, los errores y los valores originales.
+        """
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            return Response({'detail': 'Adjunte el archivo en el campo "archivo".'}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'si', 'sí')
+        forzar = str(request.data.get('ignorar_duplicados', '')).lower() in ('1', 'true', 'si', 'sí')
+        try:
+            resumen = importacion.importar_archivo(archivo, archivo.name, dry_run=dry_run, ignorar_duplicados=forzar)
+        except importacion.ErrorImportacion as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if resumen['reporte']:
+            url = self.reverse_action('reporte-importacion') + f'?id={resumen["reporte"]}'
+            resumen['reporte'] = request.build_absolute_uri(url)
+        resumen['dry_run'] = dry_run
+        return Response(resumen, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'])
+    def reporte_importacion(self, request):
+        """Descarga el CSV de errores de una importación (?id= devuelto por `importar`)."""
+        ruta = importacion.ruta_reporte(request.query_params.get('id'))
+        if ruta is None:
+            return Response({'detail': 'Identificador de reporte inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return FileResponse(open(ruta, 'rb'), as_attachment=True, filename='errores_importacion.csv', content_type='text/csv')
+        except FileNotFoundError:
+            return Response({'detail': 'Reporte no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
 
 class HistorialClinicaViewSet(viewsets.ModelViewSet):
     queryset = HistorialClinica.objects.all()
@@ -110,6 +233,27 @@ class HistorialClinicaViewSet(viewsets.ModelViewSet):
         # No se especifica acceso general; por defecto permitido si no mapeado.
         # Si quieres restringir lectura/edición, define aquí las reglas.
     }
+    # Paginación por cursor: atenciones más recientes primero
+    orden_cursor = ('-fecha_atencion', '-id_historial')
+
+    def get_queryset(self):
+        """
+        Filtros por query params (opcionales):
+        - id_paciente
+        - desde, hasta (YYYY-MM-DD): rango inclusivo por fecha_atencion
+        """
+        qs = super().get_queryset()
+        params = self.request.query_params
+        if params.get('id_paciente'):
+            qs = qs.filter(id_paciente_id=params['id_paciente'])
+        desde = parse_date(params.get('desde') or '')
+        hasta = parse_date(params.get('hasta') or '')
+        # Comparación directa contra la columna (sin __date) para poder usar el índice
+        if desde:
+            qs = qs.filter(fecha_atencion__gte=datetime.combine(desde, time.min))
+        if hasta:
+            qs = qs.filter(fecha_atencion__lt=datetime.combine(hasta + timedelta(days=1), time.min))
+        return qs
 
 class ArchivoClinicoViewSet(viewsets.ModelViewSet):
     queryset = ArchivoClinico.objects.all()   # pylint: disable=no-member
@@ -118,7 +262,7 @@ class ArchivoClinicoViewSet(viewsets.ModelViewSet):
     filterset_fields = ["paciente"]
     search_fields = ["nombreArchivo", "descripcion"]
     ordering_fields = ["fechaAdjunto"]
-    ordering = ["-fechaAdjunto"]
+    ordering = ["-fechaAdjunto", "-id"]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
     permission_classes = [RolesPermission]
     roles_per_action = {
@@ -134,6 +278,14 @@ class ArchivoClinicoViewSet(viewsets.ModelViewSet):
     # Este ViewSet soporta subida de archivos (multipart/form-data)
     # para adjuntos clínicos, además de filtros/búsquedas básicas.
 
+    def get_queryset(self):
+        qs = super().get_queryset()
+        # Sin django-filter, ?paciente=<id> se aplica aquí (mismo filtro que filterset_fields)
+        paciente_id = self.request.query_params.get('paciente')
+        if DjangoFilterBackend is None and paciente_id:
+            qs = qs.filter(paciente_id=paciente_id)
+        return qs
+
     # Nota CU7: Para adjuntar documentos clínicos, hacer POST multipart a /pacientes/api/archivos/
     # con los campos: paciente, nombreArchivo (opcional), tipoDocumento (opcional), descripcion (opcional) y rutaArchivo (el file).
     # Este ViewSet ya acepta multipart y filtra por paciente.
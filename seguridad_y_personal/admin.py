@@ -1,12 +1,13 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import Rol, Usuario, UsuarioRol, Bitacora, UserProfile
+from .models import Rol, Usuario, UsuarioRol, Bitacora, UserProfile, EventoSincronizacion
 
 admin.site.register(Rol)
 admin.site.register(Usuario)
 admin.site.register(UsuarioRol)
 admin.site.register(Bitacora)
+admin.site.register(EventoSincronizacion)
 
 # Personalizar el admin de Django User para mostrar solo el username
 try:
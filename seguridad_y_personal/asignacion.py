@@ -0,0 +1,42 @@
+from django.db import transaction
+
+from .models import Usuario, UsuarioRol
+from .roles import invalidar_elegibles, invalidar_roles_usuario
+from .signals import en_lote
+from .sincronizacion import ajustar_odontologos_por_rol
+
+# Asignación y revocación de roles por lotes (UsuarioRolViewSet.lote).
+# - Una transacción para todo el lote: bloquea los usuarios involucrados, lee sus asignaciones con una
+#   consulta, inserta las nuevas con bulk_create y borra las revocadas con un DELETE por pk.
+# - Las señales de UsuarioRol quedan suspendidas (signals.en_lote): en vez de una cascada por fila
+#   (caché de roles, elegibles, evento de Odontologo), los efectos se aplican una vez para todos los
+#   usuarios afectados; los Odontologo se crean/eliminan por lotes (ajustar_odontologos_por_rol).
+
+
+def aplicar_asignaciones(asignar, revocar):
+    """`asignar` y `revocar`: pares (id_usuario, id_rol) ya validados.
+    Devuelve (asignados, revocados, odontologos_creados, odontologos_eliminados); los dos primeros son
+    los pares que efectivamente cambiaron (sin los que ya estaban asignados o no existían)."""
+    asignar, revocar = set(asignar), set(revocar)
+    usuarios = {u for u, _ in asignar | revocar}
+    if not usuarios:
+        return [], [], 0, 0
+    with transaction.atomic(), en_lote():
+        # Bloqueo por usuario: dos lotes concurrentes no duplican la misma asignación
+        list(Usuario.objects.select_for_update().filter(pk__in=usuarios).order_by('pk').values_list('pk', flat=True))
+        actuales = {}
+        for pk, u, r in UsuarioRol.objects.filter(id_usuario_id__in=usuarios).values_list('pk', 'id_usuario_id', 'id_rol_id'):
+            actuales.setdefault((u, r), []).append(pk)
+
+        asignados = sorted(asignar - actuales.keys())
+        UsuarioRol.objects.bulk_create([UsuarioRol(id_usuario_id=u, id_rol_id=r) for u, r in asignados])
+        revocados = sorted(revocar & actuales.keys())
+        if revocados:
+            UsuarioRol.objects.filter(pk__in=[pk for par in revocados for pk in actuales[par]]).delete()
+
+        afectados = {u for u, _ in asignados + revocados}
+        creados, eliminados = ajustar_odontologos_por_rol(afectados)
+        if afectados:
+            invalidar_roles_usuario(*afectados)
+            invalidar_elegibles()
+    return asignados, revocados, creados, eliminados
@@ -0,0 +1,242 @@
+import atexit
+import logging
+import os
+import threading
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, connection, models, transaction
+from django.utils import timezone
+
+from . import contexto
+from .models import Bitacora, Usuario
+
+# Escritura de la bitácora en lotes.
+# - Los handlers encolan eventos en memoria con `registrar(...)`; no esperan ningún INSERT
+#   ni buscan el Usuario actor (se guarda solo su id).
+# - Un hilo del worker vacía la cola con bulk_create cuando llega a AUDITORIA_LOTE eventos o
+#   cada AUDITORIA_INTERVALO segundos, y también al terminar el proceso (atexit).
+# - `sincrono=True` (o AUDITORIA_MODO='sincrono') escribe en el momento, dentro de la transacción
+#   en curso: para eventos de cumplimiento (credenciales, usuarios, roles) que no pueden perderse
+#   si el proceso muere antes del siguiente vaciado.
+# - Dentro de transaction.atomic() el evento se encola al hacer commit: si la operación se revierte,
+#   no queda registrada (igual que con el INSERT directo).
+# - Además del texto, cada evento guarda tipo_accion, la entidad afectada (entidad_tipo, entidad_id)
+#   y opcionalmente `datos` (p.ej. el diff de una edición): filtros y reportes por columnas indexadas.
+
+logger = logging.getLogger(__name__)
+
+
+def _config(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+# Campos que nunca se copian a `datos` (solo se indica que cambiaron)
+CAMPOS_SENSIBLES = {'contrasena', 'password'}
+
+
+class BufferBitacora:
+    """Cola en memoria de eventos de bitácora (dicts con los campos de Bitacora) por proceso."""
+
+    def __init__(self):
+        self._reiniciar()
+
+    def _reiniciar(self):
+        # También se llama tras un fork (gunicorn --preload): el hilo y el lock no se heredan
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._eventos = []
+        self._despertar = threading.Event()
+        self._hilo = None
+
+    def _asegurar_hilo(self):
+        if self._pid != os.getpid():
+            self._reiniciar()
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._bucle, name='bitacora-flusher', daemon=True)
+            self._hilo.start()
+
+    def agregar(self, eventos):
+        self._asegurar_hilo()
+        with self._lock:
+            self._eventos.extend(eventos)
+            lleno = len(self._eventos) >= _config('AUDITORIA_LOTE', 50)
+        if lleno:
+            self._despertar.set()
+
+    def pendientes(self):
+        with self._lock:
+            return len(self._eventos)
+
+    def _bucle(self):
+        while True:
+            self._despertar.wait(_config('AUDITORIA_INTERVALO', 2.0))
+            self._despertar.clear()
+            try:
+                self.vaciar()
+            finally:
+                # El hilo usa su propia conexión: liberarla entre vaciados
+                close_old_connections()
+
+    def vaciar(self):
+        """Escribe todos los eventos pendientes con un bulk_create. Devuelve cuántos se escribieron.
+        Si el lote falla se reintenta (AUDITORIA_REINTENTOS, p.ej. conexión caída) y, si sigue fallando,
+        se escribe fila por fila: solo se pierden (y se registran en el log) las filas que fallan solas."""
+        with self._lock:
+            eventos, self._eventos = self._eventos, []
+        if not eventos:
+            return 0
+        for intento in range(1, _config('AUDITORIA_REINTENTOS', 2) + 1):
+            try:
+                with transaction.atomic():
+                    return self._escribir(eventos)
+            except Exception:
+                logger.warning(
+                    'Falló la escritura de un lote de %d eventos de bitácora (intento %d)',
+                    len(eventos), intento, exc_info=True,
+                )
+                self._renovar_conexion()
+        escritos = 0
+        for e in eventos:
+            try:
+                with transaction.atomic():
+                    escritos += self._escribir([e])
+            except Exception:
+                logger.exception('Evento de bitácora descartado: %r', e)
+                self._renovar_conexion()
+        return escritos
+
+    @staticmethod
+    def _escribir(eventos):
+        # Descarta eventos de usuarios inexistentes (ids enviados por el cliente o usuarios
+        # borrados entre medio) para que una fila inválida no haga fallar todo el lote.
+        validos = set(Usuario.objects.filter(
+            pk__in={e['id_usuario_id'] for e in eventos}
+        ).values_list('pk', flat=True))
+        filas = [Bitacora(**e) for e in eventos if e['id_usuario_id'] in validos]
+        Bitacora.objects.bulk_create(filas)
+        return len(filas)
+
+    @staticmethod
+    def _renovar_conexion():
+        # Tras un error de conexión, el siguiente intento abre una nueva (fuera de una transacción en curso)
+        if not connection.in_atomic_block:
+            connection.close_if_unusable_or_obsolete()
+
+
+buffer = BufferBitacora()
+
+
+def _vaciar_al_salir():
+    try:
+        buffer.vaciar()
+    except Exception:
+        pass
+    finally:
+        connection.close()
+
+
+atexit.register(_vaciar_al_salir)
+
+
+def _modo_sincrono():
+    return _config('AUDITORIA_MODO', 'buffer') == 'sincrono'
+
+
+def _valor_json(valor):
+    if isinstance(valor, models.Model):
+        return valor.pk
+    if isinstance(valor, (date, datetime, time)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if valor is None or isinstance(valor, (str, int, float, bool)):
+        return valor
+    return str(valor)
+
+
+def diferencias(instancia, cambios):
+    """{campo: [antes, después]} de los campos de `cambios` (p.ej. serializer.validated_data)
+    cuyo valor difiere del de `instancia`. Llamar antes de guardar. Los campos sensibles
+    se registran como '***'."""
+    diff = {}
+    for campo, nuevo in cambios.items():
+        try:
+            field = instancia._meta.get_field(campo)
+        except Exception:
+            continue
+        if field.many_to_many or not field.concrete:
+            continue
+        anterior = getattr(instancia, campo, None)
+        if _valor_json(anterior) == _valor_json(nuevo):
+            continue
+        diff[campo] = '***' if campo in CAMPOS_SENSIBLES else [_valor_json(anterior), _valor_json(nuevo)]
+    return diff
+
+
+def diferencias_formulario(form):
+    """Como `diferencias`, para un ModelForm ya validado (form.initial contra form.cleaned_data)."""
+    return {
+        campo: '***' if campo in CAMPOS_SENSIBLES
+        else [_valor_json(form.initial.get(campo)), _valor_json(form.cleaned_data.get(campo))]
+        for campo in form.changed_data
+    }
+
+
+def evento(accion, tipo='otro', entidad=None, datos=None):
+    """Describe un evento de bitácora.
+    `entidad` es la instancia afectada o una tupla (entidad_tipo, entidad_id), útil si ya fue eliminada."""
+    if entidad is None:
+        entidad_tipo, entidad_id = '', None
+    elif isinstance(entidad, tuple):
+        entidad_tipo, entidad_id = entidad
+    else:
+        entidad_tipo, entidad_id = entidad._meta.model_name, entidad.pk
+    return {
+        'accion': accion,
+        'tipo_accion': tipo,
+        'entidad_tipo': entidad_tipo,
+        'entidad_id': entidad_id,
+        'datos': datos or None,
+    }
+
+
+def registrar_varios(usuario_id, eventos, sincrono=False):
+    """Registra varios eventos (ver `evento`) del mismo usuario, p.ej. uno por cita creada en un lote.
+    `usuario_id` puede ser el Usuario ya cargado (p.ej. contexto.actor(request)): así no se vuelve a
+    comprobar que exista antes del INSERT síncrono."""
+    if not usuario_id:
+        return
+    try:
+        cargado = isinstance(usuario_id, Usuario)
+        uid = usuario_id.pk if cargado else int(usuario_id)
+        ahora = timezone.now()
+        eventos = [dict(e, id_usuario_id=uid, fecha_accion=ahora) for e in eventos]
+        if not eventos:
+            return
+        if sincrono or _modo_sincrono():
+            if cargado or Usuario.objects.filter(pk=uid).exists():
+                Bitacora.objects.bulk_create([Bitacora(**e) for e in eventos])
+            return
+        transaction.on_commit(lambda: buffer.agregar(eventos))
+    except Exception:
+        # La bitácora nunca debe romper la operación principal
+        logger.exception('No se pudo registrar en bitácora')
+
+
+def registrar(usuario_id, accion, tipo='otro', entidad=None, datos=None, sincrono=False):
+    """Registra una acción en la bitácora. `usuario_id` (actor) puede ser None (no se registra nada).
+    `tipo` es uno de Bitacora.TIPOS_ACCION; `entidad` y `datos` como en `evento`."""
+    registrar_varios(usuario_id, [evento(accion, tipo, entidad, datos)], sincrono=sincrono)
+
+
+def actor_id(request):
+    """Id del Usuario en sesión (sin consultar la base), o None."""
+    return contexto.actor_id(request)
+
+
+def actor(request):
+    """Usuario en sesión desde el contexto del request (cargado una vez y compartido con las vistas),
+    o None. Para eventos síncronos: `registrar` no necesita comprobar aparte que exista."""
+    return contexto.actor(request)
@@ -0,0 +1,92 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from .models import Bitacora
+
+# Búsqueda de texto completo sobre Bitacora.accion (migración 0009).
+# - PostgreSQL: índice GIN sobre to_tsvector('spanish', accion); relevancia con ts_rank.
+# - SQLite: tabla FTS5 de contenido externo (<tabla>_fts) mantenida por triggers; relevancia con bm25.
+# - Cada palabra buscada se trata como prefijo y todas deben aparecer ("cita canc" encuentra
+#   "Canceló la cita 12"). Sin índice disponible se vuelve al icontains anterior.
+# - Los resultados se anotan con `rango` (mayor = más relevante) para ordenarlos y paginarlos
+#   por (rango, pk) con backend.pagination.PaginacionPorRelevancia.
+
+TABLA = Bitacora._meta.db_table
+TABLA_FTS = f'{TABLA}_fts'
+CONFIG_PG = 'spanish'
+MAX_TERMINOS = 8
+
+
+def terminos(texto):
+    """Palabras (letras/dígitos) del texto buscado, en minúsculas y sin repetir."""
+    vistos = []
+    for t in re.findall(r'[^\W_]+', (texto or '').lower()):
+        if t not in vistos:
+            vistos.append(t)
+    return vistos[:MAX_TERMINOS]
+
+
+def vector_pg():
+    # Debe coincidir exactamente con la expresión del índice bitacora_accion_fts
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector('accion', config=CONFIG_PG)
+
+
+_fts_sqlite = False
+
+
+def _fts_sqlite_disponible():
+    # Solo se recuerda el resultado positivo: la tabla puede crearse (migrate) con el proceso ya en marcha
+    global _fts_sqlite
+    if not _fts_sqlite:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLA_FTS])
+            _fts_sqlite = cursor.fetchone() is not None
+    return _fts_sqlite
+
+
+def buscar(qs, texto, con_rango=False):
+    """Filtra `qs` (de Bitacora) por las acciones que contienen todas las palabras de `texto`.
+    Con `con_rango`, anota `rango` para ordenar por relevancia."""
+    texto = (texto or '').strip()
+    if not texto:
+        return qs
+    palabras = terminos(texto)
+
+    if palabras and connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        # Consulta "raw" armada solo con letras/dígitos: no hay sintaxis de tsquery que escapar
+        consulta = SearchQuery(
+            ' & '.join(f'{p}:*' for p in palabras), config=CONFIG_PG, search_type='raw',
+        )
+        qs = qs.annotate(documento=vector_pg()).filter(documento=consulta)
+        if con_rango:
+            # ts_rank es real (float4): se pasa a double precision para que el valor que guarda el cursor
+            # de PaginacionPorRelevancia sea exactamente el de la columna al compararlo en la página siguiente
+            qs = qs.annotate(rango=Cast(SearchRank(vector_pg(), consulta), FloatField()))
+        return qs
+
+    if palabras and connection.vendor == 'sqlite' and _fts_sqlite_disponible():
+        expresion = ' '.join(f'"{p}"*' for p in palabras)
+        qs = qs.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM "{TABLA_FTS}" WHERE "{TABLA_FTS}" MATCH %s', [expresion],
+        ))
+        if con_rango:
+            # bm25 es menor cuanto más relevante: se invierte el signo para ordenar igual que ts_rank
+            qs = qs.annotate(rango=RawSQL(
+                f'SELECT -bm25("{TABLA_FTS}") FROM "{TABLA_FTS}" '
+                f'WHERE "{TABLA_FTS}" MATCH %s AND "{TABLA_FTS}".rowid = "{TABLA}"."id_bitacora"',
+                [expresion], output_field=FloatField(),
+            ))
+        return qs
+
+    # Sin índice, o texto sin palabras que indexar (p.ej. "#"): búsqueda parcial como antes
+    for p in palabras or [texto]:
+        qs = qs.filter(accion__icontains=p)
+    if con_rango:
+        qs = qs.annotate(rango=Value(0.0, output_field=FloatField()))
+    return qs
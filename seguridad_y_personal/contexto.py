@@ -0,0 +1,56 @@
+from .models import Usuario
+from .roles import roles_de_usuario
+
+# Contexto del actor (Usuario en sesión) por request.
+# - El Usuario y sus roles se cargan de forma perezosa y como mucho una vez por request; vistas,
+#   RolesPermission y la bitácora leen el mismo contexto (ver middleware.ContextoActorMiddleware,
+#   que además los expone como request.actor / request.roles).
+# - Se guarda en el HttpRequest subyacente, así que el Request de DRF y la vista Django comparten la carga.
+# - Va ligado al usuario_id de la sesión: si cambia dentro del request (login/logout), se vuelve a calcular.
+
+
+def _http(request):
+    # rest_framework.request.Request envuelve al HttpRequest en _request
+    return getattr(request, '_request', request)
+
+
+def actor_id(request):
+    """Id del Usuario en sesión (sin consultar la base), o None."""
+    try:
+        valor = _http(request).session.get('usuario_id')
+        return int(valor) if valor else None
+    except Exception:
+        return None
+
+
+def _contexto(request):
+    http = _http(request)
+    uid = actor_id(request)
+    ctx = getattr(http, '_contexto_actor', None)
+    if ctx is None or ctx['id'] != uid:
+        ctx = {'id': uid}
+        http._contexto_actor = ctx
+    return ctx
+
+
+def actor(request):
+    """Usuario en sesión (una consulta por request como máximo), o None si no hay sesión o ya no existe."""
+    ctx = _contexto(request)
+    if 'actor' not in ctx:
+        ctx['actor'] = Usuario.objects.filter(pk=ctx['id']).first() if ctx['id'] else None
+    return ctx['actor']
+
+
+def roles(request):
+    """Roles (frozenset, en minúsculas) del Usuario en sesión; vacío sin sesión."""
+    ctx = _contexto(request)
+    if 'roles' not in ctx:
+        ctx['roles'] = roles_de_usuario(ctx['id']) if ctx['id'] else frozenset()
+    return ctx['roles']
+
+
+def recordar_actor(request, usuario):
+    """Fija el actor ya cargado (p.ej. tras el login) para que el resto del request no lo vuelva a buscar."""
+    ctx = _contexto(request)
+    if usuario is not None and ctx['id'] == usuario.pk:
+        ctx['actor'] = usuario
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from seguridad_y_personal import particiones
+
+
+class Command(BaseCommand):
+    help = (
+        'Crea las particiones mensuales próximas de la bitácora y archiva (exporta a .jsonl.gz y elimina '
+        'de la base) los meses fuera de la retención. Pensado para correr a diario (cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retencion-meses', type=int, default=settings.BITACORA_RETENCION_MESES,
+            help='Meses completos que se conservan en la base además del mes en curso.',
+        )
+        parser.add_argument(
+            '--meses-adelante', type=int, default=3,
+            help='Particiones futuras a mantener creadas (solo PostgreSQL).',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Solo muestra qué meses se archivarían.')
+
+    def handle(self, *args, **opciones):
+        retencion = opciones['retencion_meses']
+        if retencion < 0:
+            self.stderr.write('--retencion-meses no puede ser negativo')
+            return
+        meses = particiones.meses_a_archivar(retencion)
+        if opciones['dry_run']:
+            for mes in meses:
+                self.stdout.write(f'Se archivaría {mes:%Y-%m} en {particiones.ruta_archivo(mes)}')
+            if not meses:
+                self.stdout.write('No hay meses fuera de la retención.')
+            return
+
+        creadas = particiones.asegurar_particiones(opciones['meses_adelante'])
+        for mes in creadas:
+            self.stdout.write(f'Partición creada: {particiones.nombre_particion(mes)}')
+        for mes in meses:
+            total = particiones.archivar_mes(mes)
+            self.stdout.write(f'{mes:%Y-%m}: {total} registros archivados en {particiones.ruta_archivo(mes)}')
+        self.stdout.write(self.style.SUCCESS(f'Listo: {len(meses)} mes(es) archivado(s).'))
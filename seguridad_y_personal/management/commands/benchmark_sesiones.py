@@ -0,0 +1,79 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from seguridad_y_personal.models import Usuario
+
+TABLA_SESIONES = 'django_session'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara los motores de sesión (db, cached_db, cache): consultas a la base y tiempo por request '
+        'autenticado. Usa un Usuario temporal dentro de una transacción que se revierte al final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=50, help='Requests autenticados por modo.')
+        parser.add_argument(
+            '--modos', nargs='+', default=list(settings.MOTORES_SESION), choices=list(settings.MOTORES_SESION),
+            help='Modos a comparar (SESION_MODO).',
+        )
+        parser.add_argument('--ruta', default='/seguridad/api/usuarios/me/', help='Endpoint GET a medir.')
+
+    def handle(self, *args, **opciones):
+        if opciones['peticiones'] <= 0:
+            self.stderr.write('--peticiones debe ser positivo')
+            return
+        self.stdout.write(
+            f"{'modo':<10} {'login q':>8} {'login ses':>9} {'req q':>7} {'req ses':>8} {'ms/req':>8}"
+        )
+        for modo in opciones['modos']:
+            fila = self._medir(modo, opciones['peticiones'], opciones['ruta'])
+            self.stdout.write(
+                f"{modo:<10} {fila['login']:>8} {fila['login_sesion']:>9} {fila['consultas']:>7.1f} "
+                f"{fila['sesion']:>8.1f} {fila['ms']:>8.2f}"
+            )
+        self.stdout.write(
+            'q = consultas a la base; ses = de ellas, a la tabla de sesiones (por request, promedio).'
+        )
+
+    def _medir(self, modo, peticiones, ruta):
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        with override_settings(SESSION_ENGINE=settings.MOTORES_SESION[modo], ALLOWED_HOSTS=hosts), transaction.atomic():
+            marca = uuid.uuid4().hex[:12]
+            Usuario.objects.create(
+                username=f'bench_{marca}', nombre='Benchmark', correo=f'bench_{marca}@example.invalid',
+                contrasena=marca, estado='activo',
+            )
+            cliente = Client()
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = cliente.post(
+                    '/seguridad/api/usuarios/login/',
+                    {'correo': f'bench_{marca}@example.invalid', 'contrasena': marca},
+                    content_type='application/json',
+                )
+            if respuesta.status_code != 200:
+                raise RuntimeError(f'Login de prueba falló ({respuesta.status_code})')
+            login = len(consultas)
+            login_sesion = sum(TABLA_SESIONES in q['sql'] for q in consultas)
+
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                for _ in range(peticiones):
+                    cliente.get(ruta)
+                transcurrido = time.perf_counter() - inicio
+            cliente.logout()  # borra la sesión también de la caché
+            transaction.set_rollback(True)
+        return {
+            'login': login,
+            'login_sesion': login_sesion,
+            'consultas': len(consultas) / peticiones,
+            'sesion': sum(TABLA_SESIONES in q['sql'] for q in consultas) / peticiones,
+            'ms': transcurrido * 1000 / peticiones,
+        }
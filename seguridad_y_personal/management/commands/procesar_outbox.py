@@ -0,0 +1,47 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from seguridad_y_personal import sincronizacion
+
+
+class Command(BaseCommand):
+    help = (
+        'Aplica los eventos pendientes del outbox de sincronización (auth.User y Odontologo). '
+        'Con --continuo queda corriendo como worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=settings.SINCRONIZACION_LOTE, help='Eventos por transacción.')
+        parser.add_argument('--continuo', action='store_true', help='No termina: vuelve a consultar cada --intervalo segundos.')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Espera entre consultas sin eventos (modo continuo).')
+        parser.add_argument(
+            '--purgar-dias', type=int, default=None,
+            help='Elimina los eventos procesados con más de N días antes de empezar.',
+        )
+
+    def handle(self, *args, **opciones):
+        if opciones['lote'] <= 0:
+            self.stderr.write('--lote debe ser positivo')
+            return
+        if opciones['purgar_dias'] is not None:
+            borrados = sincronizacion.purgar_procesados(opciones['purgar_dias'])
+            self.stdout.write(f'{borrados} evento(s) procesados eliminados.')
+
+        total = fallidos = 0
+        try:
+            while True:
+                procesados, errores = sincronizacion.procesar_pendientes(limite=opciones['lote'])
+                total += procesados
+                fallidos += errores
+                if procesados or errores:
+                    self.stdout.write(f'Lote: {procesados} procesado(s), {errores} con error.')
+                if procesados + errores >= opciones['lote']:
+                    continue  # puede haber más: seguir sin esperar
+                if not opciones['continuo']:
+                    break
+                time.sleep(opciones['intervalo'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Listo: {total} evento(s) procesado(s), {fallidos} con error.'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from seguridad_y_personal import sincronizacion
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara Usuario/UsuarioRol con citas.Odontologo y auth.User y corrige las diferencias en bloque '
+        '(red de seguridad del outbox de sincronización).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo informa las diferencias.')
+        parser.add_argument('--eliminar', action='store_true', help='Elimina los Odontologo vinculados a usuarios sin el rol.')
+        parser.add_argument('--contrasenas', action='store_true', help='Verifica también las contraseñas (lento).')
+
+    def handle(self, *args, **opciones):
+        resultado = sincronizacion.reconciliar(
+            dry_run=opciones['dry_run'], eliminar=opciones['eliminar'], contrasenas=opciones['contrasenas'],
+        )
+        for problema, cantidad in resultado.items():
+            self.stdout.write(f'{problema}: {cantidad}')
+        if opciones['dry_run']:
+            self.stdout.write('Sin cambios (--dry-run).')
+        elif resultado['odontologos_sin_rol'] and not opciones['eliminar']:
+            self.stdout.write('Los odontólogos sin rol no se eliminaron (usar --eliminar).')
+        self.stdout.write(self.style.SUCCESS('Reconciliación terminada.'))
@@ -0,0 +1,18 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import contexto
+
+
+class ContextoActorMiddleware:
+    """Expone request.actor (Usuario en sesión o None) y request.roles (frozenset de roles), perezosos:
+    no consultan nada hasta que alguien los usa y se calculan una sola vez por request (ver contexto.py).
+    Va después de SessionMiddleware. request.actor es un proxy: compararlo con `if request.actor:`;
+    contexto.actor(request) devuelve el Usuario (o None) sin envolver."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.actor = SimpleLazyObject(lambda: contexto.actor(request))
+        request.roles = SimpleLazyObject(lambda: contexto.roles(request))
+        return self.get_response(request)
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seguridad_y_personal', '0005_userprofile'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bitacora',
+            index=models.Index(fields=['fecha_accion', 'id_bitacora'], name='bitacora_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='bitacora',
+            index=models.Index(fields=['id_usuario', 'fecha_accion'], name='bitacora_usuario_fecha'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seguridad_y_personal', '0006_bitacora_bitacora_fecha_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bitacora',
+            name='fecha_accion',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,145 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:02
+
+from datetime import date
+
+from django.db import migrations
+
+
+# Bitácora particionada por mes (rango de fecha_accion).
+# - PostgreSQL: la tabla se recrea como tabla particionada, con una partición por mes desde el primer
+#   dato hasta 3 meses adelante más una partición DEFAULT de respaldo. La PK pasa a ser
+#   (id_bitacora, fecha_accion) porque toda restricción única debe incluir la clave de partición;
+#   id_bitacora sigue saliendo de una secuencia, así que no se repite.
+#   Los índices y FKs de la tabla original se recrean con el mismo nombre sobre la tabla padre.
+#   Las particiones siguientes las crea `manage.py archivar_bitacora` (ver particiones.py).
+# - SQLite no tiene particiones: sin cambios (la tabla única queda acotada por el índice bitacora_fecha).
+
+TABLA = 'seguridad_y_personal_bitacora'
+SECUENCIA = 'seguridad_y_personal_bitacora_id_seq'
+MESES_ADELANTE = 3
+
+
+def _mes_siguiente(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def _indices_y_fks(cursor, tabla):
+    cursor.execute(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT LIKE %s",
+        [tabla, '%_pkey'],
+    )
+    indices = cursor.fetchall()
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'", [tabla]
+    )
+    return indices, cursor.fetchall()
+
+
+def _liberar_nombres(cursor, tabla, indices, fks):
+    """Tras renombrar `tabla`, quita los índices, FKs y PK que ocupan los nombres que usará la tabla nueva."""
+    for nombre, _ in indices:
+        cursor.execute(f'DROP INDEX "{nombre}"')
+    for nombre, _ in fks:
+        cursor.execute(f'ALTER TABLE "{tabla}" DROP CONSTRAINT "{nombre}"')
+    cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [tabla])
+    for (nombre,) in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE "{tabla}" DROP CONSTRAINT "{nombre}"')
+
+
+def _recrear_indices_y_fks(cursor, indices, fks, deferrable):
+    for _, definicion in indices:
+        cursor.execute(definicion)
+    for nombre, definicion in fks:
+        if deferrable and 'DEFERRABLE' not in definicion:
+            definicion += ' DEFERRABLE INITIALLY DEFERRED'
+        cursor.execute(f'ALTER TABLE "{TABLA}" ADD CONSTRAINT "{nombre}" {definicion}')
+
+
+def particionar(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        indices, fks = _indices_y_fks(cursor, TABLA)
+        cursor.execute(f'ALTER TABLE "{TABLA}" RENAME TO "{TABLA}_old"')
+        # Índices y restricciones conservan el nombre al renombrar la tabla
+        _liberar_nombres(cursor, f'{TABLA}_old', indices, fks)
+
+        cursor.execute(f'CREATE SEQUENCE "{SECUENCIA}"')
+        cursor.execute(
+            f"SELECT setval('{SECUENCIA}', COALESCE((SELECT MAX(id_bitacora) FROM \"{TABLA}_old\"), 0) + 1, false)"
+        )
+        cursor.execute(f'''
+            CREATE TABLE "{TABLA}" (
+                id_bitacora integer NOT NULL DEFAULT nextval('{SECUENCIA}'),
+                id_usuario_id integer NOT NULL,
+                accion text NOT NULL,
+                fecha_accion timestamp with time zone NOT NULL,
+                PRIMARY KEY (id_bitacora, fecha_accion)
+            ) PARTITION BY RANGE (fecha_accion)
+        ''')
+        cursor.execute(f'CREATE TABLE "{TABLA}_default" PARTITION OF "{TABLA}" DEFAULT')
+
+        cursor.execute(f'SELECT MIN(fecha_accion) FROM "{TABLA}_old"')
+        primera = cursor.fetchone()[0]
+        hoy = date.today()
+        actual = date(hoy.year, hoy.month, 1)
+        mes = date(primera.year, primera.month, 1) if primera else actual
+        mes = min(mes, actual)
+        ultimo = actual
+        for _ in range(MESES_ADELANTE):
+            ultimo = _mes_siguiente(ultimo)
+        while mes <= ultimo:
+            siguiente = _mes_siguiente(mes)
+            cursor.execute(
+                f'CREATE TABLE "{TABLA}_p{mes.year:04d}_{mes.month:02d}" PARTITION OF "{TABLA}" '
+                f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{siguiente.isoformat()}')"
+            )
+            mes = siguiente
+
+        cursor.execute(
+            f'INSERT INTO "{TABLA}" (id_bitacora, id_usuario_id, accion, fecha_accion) '
+            f'SELECT id_bitacora, id_usuario_id, accion, fecha_accion FROM "{TABLA}_old"'
+        )
+        cursor.execute(f'DROP TABLE "{TABLA}_old"')
+        _recrear_indices_y_fks(cursor, indices, fks, deferrable=True)
+        cursor.execute(f'ALTER SEQUENCE "{SECUENCIA}" OWNED BY "{TABLA}".id_bitacora')
+
+
+def desparticionar(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        indices, fks = _indices_y_fks(cursor, TABLA)
+        cursor.execute(f'ALTER TABLE "{TABLA}" RENAME TO "{TABLA}_part"')
+        _liberar_nombres(cursor, f'{TABLA}_part', indices, fks)
+        cursor.execute(f'''
+            CREATE TABLE "{TABLA}" (
+                id_bitacora integer NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+                id_usuario_id integer NOT NULL,
+                accion text NOT NULL,
+                fecha_accion timestamp with time zone NOT NULL
+            )
+        ''')
+        cursor.execute(
+            f'INSERT INTO "{TABLA}" (id_bitacora, id_usuario_id, accion, fecha_accion) '
+            f'SELECT id_bitacora, id_usuario_id, accion, fecha_accion FROM "{TABLA}_part"'
+        )
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{TABLA}', 'id_bitacora'), "
+            f"COALESCE((SELECT MAX(id_bitacora) FROM \"{TABLA}\"), 0) + 1, false)"
+        )
+        # Elimina la tabla particionada con todas sus particiones y la secuencia propia
+        cursor.execute(f'DROP TABLE "{TABLA}_part"')
+        _recrear_indices_y_fks(cursor, indices, fks, deferrable=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seguridad_y_personal', '0007_alter_bitacora_fecha_accion'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar, desparticionar),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:40
+
+from django.db import migrations
+
+
+# Índice de texto completo sobre Bitacora.accion (ver seguridad_y_personal/busqueda.py).
+# - PostgreSQL: índice GIN de expresión to_tsvector('spanish', accion). Se crea con la misma
+#   SearchVector que usan las consultas para que el planificador reconozca la expresión.
+#   Sobre la tabla particionada (0008) el índice se propaga a cada partición.
+# - SQLite: tabla virtual FTS5 de contenido externo (no duplica el texto) sincronizada con triggers.
+#   Si SQLite no tiene FTS5, no se crea nada y la búsqueda vuelve a icontains.
+
+TABLA = 'seguridad_y_personal_bitacora'
+TABLA_FTS = f'{TABLA}_fts'
+INDICE_PG = 'bitacora_accion_fts'
+
+SQLITE_FORWARD = [
+    f"""CREATE VIRTUAL TABLE "{TABLA_FTS}" USING fts5(
+        accion, content='{TABLA}', content_rowid='id_bitacora', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER "{TABLA_FTS}_ai" AFTER INSERT ON "{TABLA}" BEGIN
+        INSERT INTO "{TABLA_FTS}"(rowid, accion) VALUES (NEW.id_bitacora, NEW.accion);
+    END""",
+    f"""CREATE TRIGGER "{TABLA_FTS}_ad" AFTER DELETE ON "{TABLA}" BEGIN
+        INSERT INTO "{TABLA_FTS}"("{TABLA_FTS}", rowid, accion) VALUES ('delete', OLD.id_bitacora, OLD.accion);
+    END""",
+    f"""CREATE TRIGGER "{TABLA_FTS}_au" AFTER UPDATE OF accion ON "{TABLA}" BEGIN
+        INSERT INTO "{TABLA_FTS}"("{TABLA_FTS}", rowid, accion) VALUES ('delete', OLD.id_bitacora, OLD.accion);
+        INSERT INTO "{TABLA_FTS}"(rowid, accion) VALUES (NEW.id_bitacora, NEW.accion);
+    END""",
+    # Indexa las filas existentes
+    f"""INSERT INTO "{TABLA_FTS}"("{TABLA_FTS}") VALUES ('rebuild')""",
+]
+
+SQLITE_REVERSE = [
+    f'DROP TRIGGER IF EXISTS "{TABLA_FTS}_ai"',
+    f'DROP TRIGGER IF EXISTS "{TABLA_FTS}_ad"',
+    f'DROP TRIGGER IF EXISTS "{TABLA_FTS}_au"',
+    f'DROP TABLE IF EXISTS "{TABLA_FTS}"',
+]
+
+
+def _indice_pg():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+    return GinIndex(SearchVector('accion', config='spanish'), name=INDICE_PG)
+
+
+def _fts5_disponible(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def crear_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('seguridad_y_personal', 'Bitacora'), _indice_pg())
+    elif vendor == 'sqlite' and _fts5_disponible(schema_editor):
+        for sql in SQLITE_FORWARD:
+            schema_editor.execute(sql)
+
+
+def eliminar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('seguridad_y_personal', 'Bitacora'), _indice_pg())
+    elif vendor == 'sqlite':
+        for sql in SQLITE_REVERSE:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seguridad_y_personal', '0008_bitacora_particionada'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
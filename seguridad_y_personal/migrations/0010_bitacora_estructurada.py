@@ -0,0 +1,113 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:05
+
+import re
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+# Columnas estructuradas de la bitácora y relleno de las filas existentes a partir del texto.
+# En SQLite, AddField de columnas NOT NULL recrea la tabla y se pierden los triggers FTS de 0009:
+# se vuelven a crear al final (la tabla FTS conserva el índice: los rowid no cambian).
+
+# (prefijo del texto, tipo_accion, entidad_tipo, actor = entidad)
+PATRONES = [
+    ('Inicio de sesión', 'inicio_sesion', 'usuario', True),
+    ('Cierre de sesión', 'cierre_sesion', 'usuario', True),
+    ('Cambio de contraseña', 'cambio_contrasena', 'usuario', True),
+    ('Creación de usuario', 'creacion', 'usuario', False),
+    ('Creación de recepcionista', 'creacion', 'usuario', False),
+    ('Edición de usuario', 'edicion', 'usuario', False),
+    ('Eliminación de usuario', 'eliminacion', 'usuario', False),
+    ('Edición de rol', 'edicion', 'rol', False),
+    ('Eliminación de rol', 'eliminacion', 'rol', False),
+    ('Creación de odontólogo', 'creacion', 'odontologo', False),
+    ('Edición de odontólogo', 'edicion', 'odontologo', False),
+    ('Eliminación de odontólogo', 'eliminacion', 'odontologo', False),
+    ('Solicitud de cita creada', 'creacion', 'cita', False),
+]
+ID_EN_TEXTO = re.compile(r'\((?:cita_)?id=(\d+)\)')
+LOTE = 1000
+
+
+def recrear_triggers_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from importlib import import_module
+    previa = import_module('seguridad_y_personal.migrations.0009_bitacora_busqueda_texto')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [previa.TABLA_FTS])
+        if cursor.fetchone() is None:
+            return
+    for sufijo in ('ai', 'ad', 'au'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS "{previa.TABLA_FTS}_{sufijo}"')
+    # Los triggers son las sentencias 2 a 4 de 0009 (la 1 crea la tabla FTS, la 5 la reconstruye)
+    for sql in previa.SQLITE_FORWARD[1:4]:
+        schema_editor.execute(sql)
+
+
+def rellenar_estructura(apps, schema_editor):
+    Bitacora = apps.get_model('seguridad_y_personal', 'Bitacora')
+    for prefijo, tipo, entidad, es_actor in PATRONES:
+        cambios = {'tipo_accion': tipo, 'entidad_tipo': entidad}
+        if es_actor:
+            cambios['entidad_id'] = F('id_usuario_id')
+        Bitacora.objects.filter(tipo_accion='otro', accion__startswith=prefijo).update(**cambios)
+
+    # Ids de odontólogos y citas que figuran en el texto: "(id=5)", "(cita_id=12)"
+    # (por lotes de pk: no se escribe sobre un cursor abierto de la misma tabla)
+    pendientes = Bitacora.objects.filter(entidad_tipo__in=['odontologo', 'cita'], entidad_id__isnull=True)
+    ultimo = 0
+    while True:
+        filas = list(pendientes.filter(pk__gt=ultimo).order_by('pk').values_list('pk', 'accion')[:LOTE])
+        if not filas:
+            break
+        ultimo = filas[-1][0]
+        lote = []
+        for pk, accion in filas:
+            encontrado = ID_EN_TEXTO.search(accion)
+            if encontrado:
+                lote.append(Bitacora(pk=pk, entidad_id=int(encontrado.group(1))))
+        Bitacora.objects.bulk_update(lote, ['entidad_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seguridad_y_personal', '0009_bitacora_busqueda_texto'),
+    ]
+
+    operations = [
+        # Al revertir, RemoveField también recrea la tabla: restaurar los triggers al final
+        migrations.RunPython(migrations.RunPython.noop, recrear_triggers_fts),
+        migrations.AddField(
+            model_name='bitacora',
+            name='datos',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bitacora',
+            name='entidad_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bitacora',
+            name='entidad_tipo',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='bitacora',
+            name='tipo_accion',
+            field=models.CharField(choices=[('inicio_sesion', 'Inicio de sesión'), ('cierre_sesion', 'Cierre de sesión'), ('creacion', 'Creación'), ('edicion', 'Edición'), ('eliminacion', 'Eliminación'), ('cambio_contrasena', 'Cambio de contraseña'), ('otro', 'Otro')], default='otro', max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='bitacora',
+            index=models.Index(fields=['entidad_tipo', 'entidad_id', 'fecha_accion'], name='bitacora_entidad_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='bitacora',
+            index=models.Index(fields=['tipo_accion', 'fecha_accion'], name='bitacora_tipo_fecha'),
+        ),
+        migrations.RunPython(recrear_triggers_fts, migrations.RunPython.noop),
+        migrations.RunPython(rellenar_estructura, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seguridad_y_personal', '0010_bitacora_estructurada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoSincronizacion',
+            fields=[
+                ('id_evento', models.BigAutoField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(max_length=50)),
+                ('clave', models.CharField(max_length=100)),
+                ('datos', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesado', 'Procesado'), ('fallido', 'Fallido')], default='pendiente', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('ultimo_error', models.TextField(blank=True, default='')),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now)),
+                ('procesado_en', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('estado', 'pendiente')), fields=['disponible_desde', 'id_evento'], name='outbox_pendientes'), models.Index(fields=['estado', 'creado'], name='outbox_estado_creado')],
+            },
+        ),
+    ]
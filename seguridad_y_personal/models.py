@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 # Create your models here.
@@ -37,15 +38,74 @@ class UsuarioRol(models.Model):
 
 # Clase para las bitácoras de acciones
 class Bitacora(models.Model):
+    TIPOS_ACCION = [
+        ('inicio_sesion', 'Inicio de sesión'),
+        ('cierre_sesion', 'Cierre de sesión'),
+        ('creacion', 'Creación'),
+        ('edicion', 'Edición'),
+        ('eliminacion', 'Eliminación'),
+        ('cambio_contrasena', 'Cambio de contraseña'),
+        ('otro', 'Otro'),
+    ]
     id_bitacora = models.AutoField(primary_key=True)  # ID único de la bitácora
     id_usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)  # ID del usuario que realizó la acción (FK)
     accion = models.TextField()  # Descripción de la acción realizada
-    fecha_accion = models.DateTimeField(auto_now_add=True)  # Fecha y hora en que se realizó la acción
+    # Fecha y hora en que se realizó la acción. Default (no auto_now_add) para conservar la hora
+    # del evento cuando se escribe más tarde en lote (ver auditoria.py).
+    fecha_accion = models.DateTimeField(default=timezone.now, editable=False)
+    # Datos estructurados del evento (los completa auditoria.registrar)
+    tipo_accion = models.CharField(max_length=30, choices=TIPOS_ACCION, default='otro')  # Tipo de acción
+    entidad_tipo = models.CharField(max_length=50, blank=True, default='')  # Modelo afectado (p.ej. 'odontologo')
+    entidad_id = models.IntegerField(null=True, blank=True)  # Id del registro afectado
+    datos = models.JSONField(null=True, blank=True)  # Detalle opcional (p.ej. {campo: [antes, después]})
+
+    class Meta:
+        # Listado paginado por fecha, filtros por usuario + rango de fechas, por entidad y por tipo de acción
+        indexes = [
+            models.Index(fields=['fecha_accion', 'id_bitacora'], name='bitacora_fecha'),
+            models.Index(fields=['id_usuario', 'fecha_accion'], name='bitacora_usuario_fecha'),
+            models.Index(fields=['entidad_tipo', 'entidad_id', 'fecha_accion'], name='bitacora_entidad_fecha'),
+            models.Index(fields=['tipo_accion', 'fecha_accion'], name='bitacora_tipo_fecha'),
+        ]
 
     def __str__(self):
         return f"Bitácora de {self.id_usuario.nombre} - {self.fecha_accion}"
 
 
+# Outbox de sincronización entre Usuario, auth.User y citas.Odontologo (ver sincronizacion.py).
+# Las señales registran aquí el efecto pendiente dentro de la misma transacción; `manage.py procesar_outbox`
+# lo aplica en lotes, con reintentos, y deja a la vista los que fallan.
+class EventoSincronizacion(models.Model):
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('procesado', 'Procesado'),
+        ('fallido', 'Fallido'),  # agotó los reintentos: requiere revisión
+    ]
+    id_evento = models.BigAutoField(primary_key=True)
+    tipo = models.CharField(max_length=50)  # Efecto a aplicar (ver sincronizacion.MANEJADORES)
+    clave = models.CharField(max_length=100)  # Registro afectado, p.ej. 'usuario:5'
+    datos = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    ultimo_error = models.TextField(blank=True, default='')
+    creado = models.DateTimeField(default=timezone.now)
+    disponible_desde = models.DateTimeField(default=timezone.now)  # Próximo intento (espera creciente tras un fallo)
+    procesado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Cola de trabajo: solo las filas pendientes, en orden
+            models.Index(
+                fields=['disponible_desde', 'id_evento'], name='outbox_pendientes',
+                condition=models.Q(estado='pendiente'),
+            ),
+            models.Index(fields=['estado', 'creado'], name='outbox_estado_creado'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} {self.clave} ({self.estado})"
+
+
 # Perfil para usuarios de autenticación nativa (auth.User) para almacenar teléfono
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='perfil')
@@ -0,0 +1,273 @@
+import gzip
+import json
+import os
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import Bitacora
+
+# Bitácora particionada por mes, con retención y archivo comprimido.
+# - PostgreSQL: seguridad_y_personal_bitacora es una tabla particionada por rango de fecha_accion
+#   (migración 0008), una partición por mes (<tabla>_pAAAA_MM) más una DEFAULT de respaldo.
+#   Los filtros por rango de fecha_accion solo leen las particiones de esos meses.
+# - SQLite no tiene particiones: la tabla sigue siendo única y el índice (fecha_accion, id_bitacora)
+#   acota las búsquedas por rango; la retención se aplica igual, mes a mes.
+# - Los meses fuera de la retención se exportan a BITACORA_ARCHIVO_DIR/bitacora-AAAA-MM.jsonl.gz
+#   (una fila JSON por línea) y se eliminan de la base; `consultar_archivo` los lee abriendo
+#   solo los archivos de los meses pedidos.
+
+TABLA = Bitacora._meta.db_table
+COLUMNAS = (
+    'id_bitacora', 'id_usuario_id', 'accion', 'fecha_accion', 'tipo_accion', 'entidad_tipo', 'entidad_id', 'datos',
+)
+
+
+def inicio_mes(valor):
+    return date(valor.year, valor.month, 1)
+
+
+def sumar_meses(mes, n):
+    total = mes.year * 12 + (mes.month - 1) + n
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def meses_entre(desde, hasta):
+    """Primeros días de cada mes que toca [desde, hasta)."""
+    mes = inicio_mes(desde)
+    while datetime.combine(mes, time.min) < hasta:
+        yield mes
+        mes = sumar_meses(mes, 1)
+
+
+def nombre_particion(mes):
+    return f'{TABLA}_p{mes.year:04d}_{mes.month:02d}'
+
+
+def esta_particionada():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLA])
+        return cursor.fetchone() is not None
+
+
+def particiones_existentes():
+    """Meses (date) con partición propia en PostgreSQL."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass", [TABLA]
+        )
+        nombres = [r[0] for r in cursor.fetchall()]
+    meses = set()
+    prefijo = f'{TABLA}_p'
+    for nombre in nombres:
+        if nombre.startswith(prefijo):
+            anio, mes = nombre[len(prefijo):].split('_')
+            meses.add(date(int(anio), int(mes), 1))
+    return meses
+
+
+def crear_particion(mes):
+    """Crea la partición del mes. Si la DEFAULT ya tiene filas de ese mes, las mueve a la nueva
+    partición (PostgreSQL no permite adjuntar el rango mientras la DEFAULT lo contenga)."""
+    nombre = nombre_particion(mes)
+    desde, hasta = mes.isoformat(), sumar_meses(mes, 1).isoformat()
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Sin este bloqueo, una fila del mes insertada en la DEFAULT entre el traslado y el ATTACH haría
+        # fallar el ATTACH. SHARE ROW EXCLUSIVE frena solo las escrituras (las lecturas siguen) y a otro
+        # crear_particion simultáneo, hasta el commit.
+        cursor.execute(f'LOCK TABLE "{TABLA}" IN SHARE ROW EXCLUSIVE MODE')
+        cursor.execute(f'CREATE TABLE "{nombre}" (LIKE "{TABLA}" INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH movidas AS (DELETE FROM "{TABLA}_default" WHERE fecha_accion >= %s AND fecha_accion < %s RETURNING *) '
+            f'INSERT INTO "{nombre}" SELECT * FROM movidas', [desde, hasta]
+        )
+        # DDL sin parámetros: los límites son fechas generadas aquí (AAAA-MM-DD)
+        cursor.execute(f'ALTER TABLE "{TABLA}" ATTACH PARTITION "{nombre}" FOR VALUES FROM (\'{desde}\') TO (\'{hasta}\')')
+
+
+def asegurar_particiones(meses_adelante=3, hoy=None):
+    """Crea las particiones del mes actual y de los `meses_adelante` siguientes que falten."""
+    if not esta_particionada():
+        return []
+    actual = inicio_mes(hoy or date.today())
+    existentes = particiones_existentes()
+    creadas = []
+    for i in range(meses_adelante + 1):
+        mes = sumar_meses(actual, i)
+        if mes not in existentes:
+            crear_particion(mes)
+            creadas.append(mes)
+    return creadas
+
+
+def directorio_archivo():
+    return getattr(settings, 'BITACORA_ARCHIVO_DIR', os.path.join(settings.BASE_DIR, 'archivo_bitacora'))
+
+
+def ruta_archivo(mes):
+    return os.path.join(directorio_archivo(), f'bitacora-{mes.year:04d}-{mes.month:02d}.jsonl.gz')
+
+
+def particiones_desadjuntadas():
+    """Meses cuya partición quedó desadjuntada sin eliminar (archivar_mes interrumpido tras el DETACH)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition "
+            "AND pg_table_is_visible(oid) AND relname LIKE %s", [f'{TABLA}_p%']
+        )
+        nombres = [r[0] for r in cursor.fetchall()]
+    prefijo = f'{TABLA}_p'
+    meses = set()
+    for nombre in nombres:
+        try:
+            anio, mes = nombre[len(prefijo):].split('_')
+            meses.add(date(int(anio), int(mes), 1))
+        except ValueError:
+            continue
+    return meses
+
+
+def _filas_tabla(nombre):
+    """Filas (en el orden de COLUMNAS) de una partición ya desadjuntada, leídas con un cursor del servidor
+    (como .iterator() en el camino del ORM)."""
+    columnas = ', '.join(f'"{c}"' for c in COLUMNAS)
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(f'SELECT {columnas} FROM "{nombre}" ORDER BY fecha_accion, id_bitacora')
+        while True:
+            bloque = cursor.fetchmany(2000)
+            if not bloque:
+                return
+            # Django deja jsonb sin decodificar en los cursores crudos (lo hace el JSONField): texto -> valor
+            posicion = COLUMNAS.index('datos')
+            for fila in bloque:
+                datos = fila[posicion]
+                yield (*fila[:posicion], json.loads(datos) if isinstance(datos, str) else datos, *fila[posicion + 1:])
+
+
+def _escribir_archivo(mes, filas):
+    """Escribe las filas del mes en su .jsonl.gz (añadiendo a lo ya archivado) y devuelve cuántas escribió.
+    Se escribe en un temporal que reemplaza al archivo solo al terminar."""
+    os.makedirs(directorio_archivo(), exist_ok=True)
+    ruta = ruta_archivo(mes)
+    temporal = ruta + '.tmp'
+    total = 0
+    with gzip.open(temporal, 'wt', encoding='utf-8') as salida:
+        # Un mes ya archivado que recibió filas tardías: se conserva lo anterior
+        if os.path.exists(ruta):
+            with gzip.open(ruta, 'rt', encoding='utf-8') as previo:
+                for linea in previo:
+                    salida.write(linea)
+        for fila in filas:
+            registro = dict(zip(COLUMNAS, fila))
+            registro['fecha_accion'] = registro['fecha_accion'].isoformat()
+            salida.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            total += 1
+    if total or os.path.exists(ruta):
+        os.replace(temporal, ruta)
+    else:
+        os.remove(temporal)  # mes vacío (p.ej. partición sin filas): no se crea archivo
+    return total
+
+
+def _instantanea_fija():
+    """Dentro de un atomic recién abierto: en PostgreSQL la transacción lee una única instantánea
+    (REPEATABLE READ), así el DELETE posterior solo ve las filas que ya se exportaron."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+
+
+def archivar_mes(mes):
+    """Exporta el mes a su archivo comprimido y lo elimina de la base (partición completa en PostgreSQL).
+    Ninguna fila se elimina sin haberse escrito antes en el archivo:
+    - Partición propia: primero se desadjunta (las filas tardías de ese mes van a la DEFAULT y se archivan
+      en una corrida posterior), luego se exporta la tabla ya aislada y por último se elimina. Si la
+      corrida se interrumpe, la tabla desadjuntada se retoma la próxima vez (particiones_desadjuntadas).
+    - Resto (DEFAULT, SQLite): exportación y DELETE en la misma transacción; el DELETE solo alcanza las
+      filas visibles al exportar (misma instantánea en PostgreSQL; en SQLite la transacción lectora impide
+      que otra escritura confirme en medio, o hace fallar el DELETE y no se borra nada).
+    Si el commit falla tras escribir el archivo, la siguiente corrida vuelve a añadir esas filas: puede
+    duplicar líneas del archivo, nunca perderlas."""
+    inicio = datetime.combine(mes, time.min)
+    fin = datetime.combine(sumar_meses(mes, 1), time.min)
+    adjuntada = esta_particionada() and mes in particiones_existentes()
+    if adjuntada or (esta_particionada() and mes in particiones_desadjuntadas()):
+        nombre = nombre_particion(mes)
+        if adjuntada:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE "{TABLA}" DETACH PARTITION "{nombre}"')
+        total = _escribir_archivo(mes, _filas_tabla(nombre))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE "{nombre}"')
+        # Filas del mes que hubieran caído en la DEFAULT (p.ej. tras el DETACH): camino por DELETE
+        if not Bitacora.objects.filter(fecha_accion__gte=inicio, fecha_accion__lt=fin).exists():
+            return total
+    else:
+        total = 0
+    en_transaccion = connection.in_atomic_block
+    with transaction.atomic():
+        if not en_transaccion:
+            _instantanea_fija()
+        rango = Bitacora.objects.filter(fecha_accion__gte=inicio, fecha_accion__lt=fin)
+        total += _escribir_archivo(
+            mes, rango.order_by('fecha_accion', 'id_bitacora').values_list(*COLUMNAS).iterator(chunk_size=2000),
+        )
+        # Bitacora no tiene dependientes ni señales: Django lo resuelve con un único DELETE por rango
+        rango.delete()
+    return total
+
+
+def meses_a_archivar(retencion_meses, hoy=None):
+    """Meses con datos en la base anteriores a la ventana de retención."""
+    limite = sumar_meses(inicio_mes(hoy or date.today()), -retencion_meses)
+    meses = set()
+    if esta_particionada():
+        meses.update(m for m in particiones_existentes() if m < limite)
+        meses.update(particiones_desadjuntadas())
+    antiguas = Bitacora.objects.filter(fecha_accion__lt=datetime.combine(limite, time.min))
+    meses.update(antiguas.dates('fecha_accion', 'month'))
+    return sorted(meses)
+
+
+def consultar_archivo(desde, hasta, usuario_id=None, accion=None, limite=None, **filtros):
+    """Filas archivadas con fecha_accion en [desde, hasta), leyendo solo los archivos de esos meses.
+    `filtros` compara columnas estructuradas (tipo_accion, entidad_tipo, entidad_id); los archivos
+    anteriores a esas columnas no las tienen y solo coinciden sin esos filtros.
+    Devuelve dicts con las mismas claves que BitacoraSerializer (id_usuario en vez de id_usuario_id)."""
+    accion = (accion or '').lower()
+    filtros = {k: str(v) for k, v in filtros.items() if v not in (None, '')}
+    for mes in meses_entre(desde, hasta):
+        ruta = ruta_archivo(mes)
+        if not os.path.exists(ruta):
+            continue
+        with gzip.open(ruta, 'rt', encoding='utf-8') as entrada:
+            for linea in entrada:
+                registro = json.loads(linea)
+                fecha = parse_datetime(registro['fecha_accion'])
+                if not (desde <= fecha < hasta):
+                    continue
+                if usuario_id and str(registro['id_usuario_id']) != str(usuario_id):
+                    continue
+                if accion and accion not in registro['accion'].lower():
+                    continue
+                if any(str(registro.get(k)) != v for k, v in filtros.items()):
+                    continue
+                yield {
+                    'id_bitacora': registro['id_bitacora'],
+                    'id_usuario': registro['id_usuario_id'],
+                    'accion': registro['accion'],
+                    'fecha_accion': registro['fecha_accion'],
+                    'tipo_accion': registro.get('tipo_accion', 'otro'),
+                    'entidad_tipo': registro.get('entidad_tipo', ''),
+                    'entidad_id': registro.get('entidad_id'),
+                    'datos': registro.get('datos'),
+                }
+                if limite is not None:
+                    limite -= 1
+                    if limite <= 0:
+                        return
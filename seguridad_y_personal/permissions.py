@@ -1,11 +1,12 @@
-import os
+from django.conf import settings
 from rest_framework.permissions import BasePermission
-from .models import UsuarioRol
+from . import contexto
 
 
 class RolesPermission(BasePermission):
     """Permiso basado en roles del módulo seguridad_y_personal.
-    - Usa request.session['usuario_id'] para identificar al usuario.
+    - Usa request.session['usuario_id'] para identificar al usuario; los roles salen del contexto
+      del request (contexto.py), compartido con las vistas y la bitácora.
     - El ViewSet puede definir:
         * roles_per_action: dict { action_name: [roles_permitidos] }
         * allow_unauthenticated_actions: lista de actions que no requieren sesión (p.ej. login, logout, me)
@@ -15,9 +16,9 @@ class RolesPermission(BasePermission):
     message = 'No autorizado'
 
     def has_permission(self, request, view):
-        # Bypass total (sin permisos) controlado por variable de entorno
+        # Bypass total (sin permisos) controlado por settings.DISABLE_ROLE_PERMS (variable de entorno)
         # Útil para ambientes donde no se desea filtrar por rol
-        if os.getenv('DISABLE_ROLE_PERMS', '').lower() in ('1', 'true', 'yes', 'on'):
+        if getattr(settings, 'DISABLE_ROLE_PERMS', False):
             return True
 
         action = getattr(view, 'action', None)
@@ -27,8 +28,7 @@ class RolesPermission(BasePermission):
         if action in allow_unauth:
             return True
 
-        user_id = request.session.get('usuario_id')
-        if not user_id:
+        if not contexto.actor_id(request):
             # 401 NotAuthenticated
             return False
 
@@ -38,11 +38,7 @@ class RolesPermission(BasePermission):
             # Si la acción no está mapeada, permitimos por defecto
             return True
 
-        # Roles del usuario (normalizados a minúsculas)
-        user_roles = set(
-            r.strip().lower() for r in
-            UsuarioRol.objects.filter(id_usuario_id=user_id).values_list('id_rol__nombre_rol', flat=True)
-            if r
-        )
+        # Roles del usuario (normalizados a minúsculas): una vez por request, cacheados por usuario (ver roles.py)
+        user_roles = contexto.roles(request)
         needed = set((r or '').strip().lower() for r in roles_needed)
         return bool(user_roles & needed)
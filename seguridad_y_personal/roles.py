@@ -0,0 +1,64 @@
+from django.db.models import Exists, OuterRef, Q
+
+from backend.cache import invalidar, obtener_o_calcular
+from .models import Rol, Usuario, UsuarioRol
+
+# Roles por usuario, cacheados para que RolesPermission no consulte la base en cada request.
+# Ámbitos de versión (ver backend/cache.py):
+# - 'roles': global, cambia al editar o borrar un Rol (renombrarlo afecta a todos sus usuarios).
+# - 'roles:usuario:<id>': asignaciones UsuarioRol del usuario.
+# Las señales de seguridad_y_personal/signals.py rotan los ámbitos tras el commit, así que
+# un cambio de rol tiene efecto en la siguiente petición.
+# - 'elegibles': páginas cacheadas de usuarios_elegibles (asignación de roles); cambia con Usuario,
+#   UsuarioRol, Rol y el vínculo Odontologo.usuario_seguridad.
+
+# Roles que dejan a un usuario fuera de la asignación de roles
+ROLES_NO_ELEGIBLES = ('odontologo', 'recepcionista')
+
+
+def _normalizar(nombre):
+    return (nombre or '').strip().lower()
+
+
+def roles_de_usuario(usuario_id):
+    """Conjunto (frozenset) de nombres de rol del usuario, en minúsculas."""
+    def calcular():
+        return frozenset(
+            _normalizar(r) for r in
+            UsuarioRol.objects.filter(id_usuario_id=usuario_id).values_list('id_rol__nombre_rol', flat=True)
+            if r
+        )
+    return obtener_o_calcular('roles', ['roles', f'roles:usuario:{usuario_id}'], [usuario_id], calcular)
+
+
+def invalidar_roles_usuario(*usuarios):
+    ambitos = [f'roles:usuario:{u}' for u in set(usuarios) if u is not None]
+    if ambitos:
+        invalidar(*ambitos)
+
+
+def invalidar_roles():
+    invalidar('roles')
+
+
+def invalidar_elegibles():
+    invalidar('elegibles')
+
+
+def usuarios_elegibles(texto=None):
+    """Usuarios elegibles para asignarles un rol: sin rol odontologo/recepcionista y sin Odontologo vinculado.
+    Una sola consulta con dos NOT EXISTS (en vez de traer los ids a Python y devolverlos en un NOT IN).
+    `texto` filtra por nombre, username o correo."""
+    from citas.models import Odontologo
+
+    roles_excluidos = Rol.objects.filter(
+        Q(*[Q(nombre_rol__iexact=r) for r in ROLES_NO_ELEGIBLES], _connector=Q.OR)
+    ).values('id_rol')
+    qs = Usuario.objects.filter(
+        ~Exists(UsuarioRol.objects.filter(id_usuario=OuterRef('pk'), id_rol__in=roles_excluidos)),
+        ~Exists(Odontologo.objects.filter(usuario_seguridad=OuterRef('pk'))),
+    )
+    texto = (texto or '').strip()
+    if texto:
+        qs = qs.filter(Q(nombre__icontains=texto) | Q(username__icontains=texto) | Q(correo__icontains=texto))
+    return qs
@@ -11,11 +11,39 @@ class UsuarioSerializer(serializers.ModelSerializer):
         model = Usuario
         fields = '__all__'
 
+class UsuarioElegibleSerializer(serializers.ModelSerializer):
+    # Solo lo que muestra el selector de asignación de roles
+    class Meta:
+        model = Usuario
+        fields = ['id_usuario', 'username', 'nombre', 'correo', 'estado']
+
 class UsuarioRolSerializer(serializers.ModelSerializer):
     class Meta:
         model = UsuarioRol
         fields = '__all__'
 
+class UsuarioRolItemSerializer(serializers.Serializer):
+    """Par usuario/rol de un lote. Valida solo formato: la existencia se comprueba para todo el lote
+    con una consulta por tabla."""
+    id_usuario = serializers.IntegerField()
+    id_rol = serializers.IntegerField()
+
+class UsuarioRolLoteSerializer(serializers.Serializer):
+    MAX_LOTE = 1000
+    asignar = UsuarioRolItemSerializer(many=True, required=False, default=list)
+    revocar = UsuarioRolItemSerializer(many=True, required=False, default=list)
+
+    def validate(self, data):
+        total = len(data['asignar']) + len(data['revocar'])
+        if not total:
+            raise serializers.ValidationError('Indique al menos un par en asignar o revocar.')
+        if total > self.MAX_LOTE:
+            raise serializers.ValidationError(f'El lote no puede superar {self.MAX_LOTE} pares.')
+        asignar = {(d['id_usuario'], d['id_rol']) for d in data['asignar']}
+        if asignar & {(d['id_usuario'], d['id_rol']) for d in data['revocar']}:
+            raise serializers.ValidationError('Un mismo par no puede asignarse y revocarse en el mismo lote.')
+        return data
+
 class BitacoraSerializer(serializers.ModelSerializer):
     class Meta:
         model = Bitacora
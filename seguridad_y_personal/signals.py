@@ -1,224 +1,180 @@
 
-from django.db.models.signals import pre_save, post_save, post_delete
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
 from django.dispatch import receiver
-from django.contrib.auth.models import User
-from django.contrib.auth.hashers import make_password
 from .models import Usuario, UsuarioRol, Rol
+from .roles import invalidar_elegibles, invalidar_roles, invalidar_roles_usuario
 from citas.models import Odontologo
+from .sincronizacion import (
+    CAMPOS_AUTH, CAMPOS_SINCRONIZADOS, campos_cambiados, encolar, foto, registrar_cambios, valor_previo,
+)
+
+logger = logging.getLogger(__name__)
+
+# Operaciones por lotes (ver asignacion.py): dentro de `en_lote()` los receptores de esta sección
+# no actúan por fila; quien opera en bloque aplica una sola vez los efectos (cachés de roles y
+# elegibles, Odontologo) para todos los usuarios afectados.
+_en_lote = ContextVar('seguridad_senales_en_lote', default=False)
+
+
+@contextmanager
+def en_lote():
+    token = _en_lote.set(True)
+    try:
+        yield
+    finally:
+        _en_lote.reset(token)
 
 
 # Señales para sincronizar roles de Seguridad con Odontólogos en Citas.
 # Objetivo: cuando un usuario recibe el rol "odontologo", exista un registro
-# Odontologo asociado; si pierde el rol (y no tiene otro vínculo con ese rol), eliminarlo.
+# Odontologo asociado; si pierde el rol, eliminarlo.
+# Los efectos no se aplican aquí: se encolan en el outbox (ver sincronizacion.py) dentro de la misma
+# transacción, y el manejador vuelve a leer los roles actuales del usuario al procesarlos.
 
-def _es_odontologo(rol: Rol) -> bool:
+@receiver(post_save, sender=UsuarioRol)
+@receiver(post_delete, sender=UsuarioRol)
+def encolar_odontologo_por_rol(sender, instance: UsuarioRol, **kwargs):
+    """Al asignar, cambiar o quitar un vínculo de rol, encola la revisión del Odontologo del usuario
+    (y del usuario anterior si el vínculo se reasignó a otro)."""
+    if _en_lote.get():
+        return
     try:
-        return bool(rol and getattr(rol, 'nombre_rol', None) and rol.nombre_rol.strip().lower() == 'odontologo')
+        for usuario_id in {instance.id_usuario_id, getattr(instance, '_usuario_previo', None)} - {None}:
+            encolar('rol_odontologo', f'usuario:{usuario_id}', {'usuario_id': usuario_id})
     except Exception:
-        return False
+        # Evitar que un fallo en sincronización rompa la operación principal
+        logger.exception('No se pudo encolar la sincronización de rol del usuario %s', instance.id_usuario_id)
 
 
-@receiver(pre_save, sender=UsuarioRol)
-def detectar_cambio_de_rol(sender, instance: UsuarioRol, **kwargs):
-    """Si un UsuarioRol existente cambia de 'odontologo' a otro rol, eliminar el Odontologo asociado.
-    No hace nada cuando se guarda un rol distinto de odontologo (no elimina si existe otro UsuarioRol con odontologo).
-    """
+@receiver(post_save, sender=Usuario)
+def sincronizar_datos_odontologo(sender, instance: Usuario, created, **kwargs):
+    """Si cambiaron nombre o correo, encola su copia al Odontologo enlazado (usuario_seguridad)."""
+    # Un Usuario recién creado aún no puede tener Odontologo enlazado
+    if created or not (campos_cambiados(instance) & {'nombre', 'correo'}):
+        return
     try:
-        if not instance.pk:
-            return  # creación: lo maneja post_save
-        anterior = UsuarioRol.objects.get(pk=instance.pk)
-        if _es_odontologo(anterior.id_rol) and not _es_odontologo(instance.id_rol):
-            # Rol dejó de ser odontologo en este vínculo concreto
-            try:
-                od = Odontologo.objects.get(usuario_seguridad=anterior.id_usuario)
-                # Solo eliminar si el usuario YA NO tiene ningún otro UsuarioRol de odontologo
-                tiene_otro = UsuarioRol.objects.filter(id_usuario=anterior.id_usuario, id_rol__nombre_rol__iexact='odontologo').exclude(pk=instance.pk).exists()
-                if not tiene_otro:
-                    od.delete()
-            except Odontologo.DoesNotExist:
-                pass
+        encolar('datos_odontologo', f'usuario:{instance.pk}', {'usuario_id': instance.pk})
     except Exception:
-        pass
+        logger.exception('No se pudo encolar la sincronización del odontólogo del usuario %s', instance.pk)
 
 
-@receiver(post_save, sender=UsuarioRol)
-def crear_odontologo_por_rol(sender, instance: UsuarioRol, created, **kwargs):
-    """Cuando se asigna el rol 'odontologo' a un Usuario, crear (o asegurar) el registro en citas.Odontologo.
-    Evita duplicados usando usuario_seguridad. Si no es odontologo, no guarda nada.
-    """
-    try:
-        if _es_odontologo(instance.id_rol):
-            usuario = instance.id_usuario
-            Odontologo.objects.get_or_create(
-                usuario_seguridad=usuario,
-                defaults={
-                    'nombre': usuario.nombre or '',
-                    'email': usuario.correo or '',
-                    'telefono': '',
-                    'especialidad': 'General',
-                }
-            )
-    except Exception:
-        # Evitar que un fallo en sincronización rompa la operación principal
-        pass
+# --- Invalidación de la caché de roles (ver roles.py) ---
+# Se recuerda el usuario original del vínculo por si una edición lo reasigna a otro usuario.
+# Se lee de __dict__ para no disparar consultas con campos diferidos.
 
+@receiver(post_init, sender=UsuarioRol)
+def recordar_usuario_rol(sender, instance, **kwargs):
+    instance._usuario_previo = instance.__dict__.get('id_usuario_id')
 
+
+@receiver(post_save, sender=UsuarioRol)
 @receiver(post_delete, sender=UsuarioRol)
-def eliminar_odontologo_por_rol(sender, instance, **kwargs):
-    """Si se quita el rol 'odontologo' de un Usuario, eliminar su registro de Odontologo (si existe)."""
+def invalidar_roles_por_asignacion(sender, instance, **kwargs):
+    if _en_lote.get():
+        return
     try:
-        rol = instance.id_rol
-        if rol and rol.nombre_rol and rol.nombre_rol.strip().lower() == 'odontologo':
-            usuario = instance.id_usuario
-            try:
-                od = Odontologo.objects.get(usuario_seguridad=usuario)
-                od.delete()
-            except Odontologo.DoesNotExist:
-                pass
+        invalidar_roles_usuario(instance.id_usuario_id, getattr(instance, '_usuario_previo', None))
+        instance._usuario_previo = instance.id_usuario_id
     except Exception:
         pass
 
 
-@receiver(post_save, sender=Usuario)
-def sincronizar_datos_odontologo(sender, instance: Usuario, created, **kwargs):
-    """Si existe un Odontologo enlazado a este Usuario (usuario_seguridad),
-    sincroniza nombre y email al actualizar el Usuario.
-    """
+@receiver(post_save, sender=Rol)
+@receiver(post_delete, sender=Rol)
+def invalidar_roles_por_rol(sender, instance, created=False, **kwargs):
+    # Un rol nuevo aún no está asignado a nadie
+    if created:
+        return
     try:
-        od = Odontologo.objects.filter(usuario_seguridad=instance).first()
-        if od:
-            cambios = False
-            if od.nombre != (instance.nombre or ''):
-                od.nombre = instance.nombre or ''
-                cambios = True
-            if od.email != (instance.correo or ''):
-                od.email = instance.correo or ''
-                cambios = True
-            if cambios:
-                od.save(update_fields=['nombre', 'email'])
+        invalidar_roles()
     except Exception:
         pass
 
 
-# --- Sincronización con el sistema de autenticación nativo de Django (auth.User) ---
+# --- Invalidación de usuarios elegibles para asignar roles (ver roles.usuarios_elegibles) ---
+# Campos de Usuario que se muestran en la lista; otros cambios (p.ej. ultimo_login) no la invalidan.
+CAMPOS_ELEGIBLES = {'username', 'nombre', 'correo', 'estado'}
+
 
-def _estado_es_activo(estado_val: str) -> bool:
+@receiver(post_save, sender=Usuario)
+def invalidar_elegibles_por_usuario(sender, instance, created, **kwargs):
+    if not (created or campos_cambiados(instance) & CAMPOS_ELEGIBLES):
+        return
     try:
-        return (estado_val or '').strip().lower() == 'activo'
+        invalidar_elegibles()
     except Exception:
-        return False
+        pass
 
 
-def _obtener_o_crear_auth_user_desde_usuario(usuario: Usuario) -> User:
-    """Asegura que exista un auth.User que refleje el Usuario de seguridad.
-    - Usa correo como referencia principal si ya existe un User con el mismo email.
-    - Si no existe, intenta usar username; si colisiona, agrega sufijo con el id del Usuario.
-    - Sincroniza: first_name (desde nombre), email, is_active (desde estado) y password (hasheada).
-    """
-    # 1) Buscar por email primero (si ya existe uno, se reutiliza)
-    auth_user = None
-    if usuario.correo:
-        try:
-            auth_user = User.objects.get(email=usuario.correo)
-        except User.DoesNotExist:
-            auth_user = None
-        except Exception:
-            auth_user = None
-
-    # 2) Si no hay por email, buscar por username
-    if auth_user is None and usuario.username:
-        try:
-            auth_user = User.objects.get(username=usuario.username)
-        except User.DoesNotExist:
-            auth_user = None
-        except Exception:
-            auth_user = None
-
-    # 3) Crear si no existe
-    if auth_user is None:
-        username_final = (usuario.username or '').strip() or (usuario.correo or '').split('@')[0]
-        if not username_final:
-            username_final = f"usuario_{usuario.id_usuario}"
-        # Evitar colisiones de username
-        if User.objects.filter(username=username_final).exists():
-            username_final = f"{username_final}_{usuario.id_usuario}"
-
-        auth_user = User(
-            username=username_final,
-            email=usuario.correo or '',
-            first_name=(usuario.nombre or '')[:150],
-            is_active=_estado_es_activo(usuario.estado),
-        )
-    else:
-        # Si existe, sincronizamos atributos principales
-        auth_user.email = usuario.correo or auth_user.email
-        auth_user.first_name = (usuario.nombre or '')[:150]
-        auth_user.is_active = _estado_es_activo(usuario.estado)
-
-    # Sincronizar contraseña (hasheada) siempre para mantener consistencia
+@receiver(post_delete, sender=Usuario)
+@receiver(post_save, sender=UsuarioRol)
+@receiver(post_delete, sender=UsuarioRol)
+@receiver(post_save, sender=Rol)
+@receiver(post_delete, sender=Rol)
+@receiver(post_save, sender=Odontologo)
+@receiver(post_delete, sender=Odontologo)
+def invalidar_elegibles_por_cambio(sender, instance, **kwargs):
+    if _en_lote.get():
+        return
     try:
-        raw_password = usuario.contrasena or ''
-        # Usar set_password para generar hash seguro
-        auth_user.set_password(raw_password)
+        invalidar_elegibles()
     except Exception:
-        # Si algo falla, no impide guardar el resto
         pass
 
+
+# --- Sincronización con el sistema de autenticación nativo de Django (auth.User) ---
+# Con seguimiento de cambios (ver sincronizacion.py): solo se escribe cuando cambian campos mapeados.
+
+@receiver(post_init, sender=Usuario)
+def recordar_campos_sincronizados(sender, instance, **kwargs):
+    instance._foto_sincronizacion = foto(instance)
+
+
+@receiver(pre_save, sender=Usuario)
+def detectar_cambios_sincronizados(sender, instance, update_fields=None, **kwargs):
     try:
-        auth_user.save()
+        registrar_cambios(instance, update_fields)
     except Exception:
-        # No romper el flujo principal por un fallo de sincronización
-        pass
-
-    return auth_user
+        # Ante la duda, sincronizar todo (comportamiento anterior)
+        instance._cambios_sincronizacion = set(CAMPOS_SINCRONIZADOS)
 
 
 @receiver(post_save, sender=Usuario)
 def sincronizar_usuario_a_auth(sender, instance: Usuario, created, **kwargs):
-    """Cuando se crea o actualiza un Usuario del módulo de seguridad,
-    asegurar que exista (o se sincronice) un usuario en django.contrib.auth.models.User
-    para que sea visible en el panel de administración y utilizable por el sistema nativo.
+    """Cuando se crea o actualiza un Usuario del módulo de seguridad, encola la creación o
+    sincronización de su usuario en django.contrib.auth.models.User (visible en el panel de
+    administración y utilizable por el sistema nativo).
+    Solo actúa si cambió algún campo mapeado (p.ej. no en save(update_fields=['ultimo_login'])).
     """
     try:
-        _obtener_o_crear_auth_user_desde_usuario(instance)
+        campos = campos_cambiados(instance)
+        if not campos & CAMPOS_AUTH:
+            return
+        encolar('usuario_auth', f'usuario:{instance.pk}', {
+            'usuario_id': instance.pk,
+            'campos': sorted(campos),
+            'creado': created,
+            # El auth.User todavía tiene el correo/username anteriores
+            'correo_previo': valor_previo(instance, 'correo'),
+            'username_previo': valor_previo(instance, 'username'),
+        })
     except Exception:
         # Evitar que errores en la sincronización afecten el guardado del modelo principal
-        pass
+        logger.exception('No se pudo encolar la sincronización de auth.User del usuario %s', instance.pk)
 
 
 @receiver(post_delete, sender=Usuario)
 def eliminar_auth_user_relacionado(sender, instance: Usuario, **kwargs):
-    """Al eliminar un Usuario del módulo de seguridad, intentar eliminar el auth.User correspondiente
+    """Al eliminar un Usuario del módulo de seguridad, encola la eliminación del auth.User correspondiente
     (buscando por email y/o username, incluyendo el patrón username_id si se usó para evitar colisiones).
     """
     try:
-        candidatos = []
-        if instance.correo:
-            try:
-                candidatos.append(User.objects.get(email=instance.correo))
-            except User.DoesNotExist:
-                pass
-        if instance.username:
-            try:
-                candidatos.append(User.objects.get(username=instance.username))
-            except User.DoesNotExist:
-                pass
-            # Variante con sufijo de id
-            try:
-                candidatos.append(User.objects.get(username=f"{instance.username}_{instance.id_usuario}"))
-            except User.DoesNotExist:
-                pass
-        # Eliminar duplicados preservando orden
-        vistos = set()
-        unicos = []
-        for u in candidatos:
-            if u.pk not in vistos:
-                vistos.add(u.pk)
-                unicos.append(u)
-        for u in unicos:
-            try:
-                u.delete()
-            except Exception:
-                pass
+        encolar('usuario_baja', f'usuario:{instance.pk}', {
+            'usuario_id': instance.pk, 'correo': instance.correo, 'username': instance.username,
+        })
     except Exception:
-        pass
+        logger.exception('No se pudo encolar la baja de auth.User del usuario %s', instance.pk)
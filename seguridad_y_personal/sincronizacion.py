@@ -0,0 +1,395 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from citas.models import Odontologo
+from .models import EventoSincronizacion, Usuario, UsuarioRol
+
+# Sincronización Usuario (seguridad) -> auth.User / Odontologo con seguimiento de cambios.
+# - post_init guarda una foto de los campos sincronizados, leída de __dict__ (sin consultas).
+# - pre_save compara contra la foto y deja en la instancia qué campos cambiaron; respeta update_fields,
+#   así que save(update_fields=['ultimo_login']) en cada inicio de sesión no sincroniza nada.
+# - Los efectos (auth.User, Odontologo por rol, nombre/email del Odontologo, bajas) no se aplican en el
+#   request: las señales los registran con `encolar` en EventoSincronizacion, en la misma transacción.
+#   `manage.py procesar_outbox` los aplica en lotes; cada manejador es idempotente (vuelve a leer el
+#   estado actual), así que reintentar o procesar dos veces no duplica nada. Los fallos quedan con su
+#   error y se reintentan con espera creciente hasta SINCRONIZACION_MAX_INTENTOS.
+# - SINCRONIZACION_MODO='inmediato' procesa los eventos al hacer commit, en el mismo proceso
+#   (desarrollo sin worker); 'outbox' los deja al worker.
+# - `reconciliar` detecta y repara en bloque las diferencias que hayan quedado (ver comando reconciliar_sincronizacion).
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_SINCRONIZADOS = ('username', 'nombre', 'correo', 'estado', 'contrasena')
+CAMPOS_AUTH = {'correo', 'nombre', 'estado', 'contrasena'}  # Los que se reflejan en auth.User
+_SIN_CARGAR = object()
+
+
+def foto(usuario):
+    """Valores actuales de los campos sincronizados (campos diferidos quedan como no cargados)."""
+    return {c: usuario.__dict__.get(c, _SIN_CARGAR) for c in CAMPOS_SINCRONIZADOS}
+
+
+def registrar_cambios(usuario, update_fields=None):
+    """Calcula los campos sincronizados que cambiaron desde la última foto y renueva la foto.
+    Deja `usuario._cambios_sincronizacion` (set) y `usuario._foto_previa` (valores anteriores)."""
+    previa = getattr(usuario, '_foto_sincronizacion', None) or {}
+    if usuario._state.adding:
+        cambios = set(CAMPOS_SINCRONIZADOS)
+    else:
+        cambios = set()
+        for campo in CAMPOS_SINCRONIZADOS:
+            if update_fields is not None and campo not in update_fields:
+                continue
+            if campo not in usuario.__dict__:
+                continue  # diferido y nunca asignado: no puede haber cambiado
+            anterior = previa.get(campo, _SIN_CARGAR)
+            if anterior is _SIN_CARGAR or anterior != usuario.__dict__[campo]:
+                cambios.add(campo)
+    usuario._cambios_sincronizacion = cambios
+    usuario._foto_previa = previa
+    # Solo se renuevan los campos que se guardan (con update_fields, el resto sigue pendiente)
+    actual = foto(usuario)
+    usuario._foto_sincronizacion = {
+        c: actual[c] if update_fields is None or c in update_fields else previa.get(c, _SIN_CARGAR)
+        for c in CAMPOS_SINCRONIZADOS
+    }
+
+
+def campos_cambiados(usuario):
+    return getattr(usuario, '_cambios_sincronizacion', set(CAMPOS_SINCRONIZADOS))
+
+
+def valor_previo(usuario, campo):
+    """Valor del campo antes del save en curso (para buscar el auth.User por el correo/username anteriores)."""
+    previo = getattr(usuario, '_foto_previa', {}).get(campo, _SIN_CARGAR)
+    return getattr(usuario, campo, None) if previo is _SIN_CARGAR else previo
+
+
+def estado_es_activo(estado_val):
+    try:
+        return (estado_val or '').strip().lower() == 'activo'
+    except Exception:
+        return False
+
+
+def buscar_auth_user(correo, username):
+    """auth.User que refleja al Usuario: por email primero, luego por username."""
+    if correo:
+        auth_user = User.objects.filter(email=correo).order_by('pk').first()
+        if auth_user is not None:
+            return auth_user
+    if username:
+        return User.objects.filter(username=username).first()
+    return None
+
+
+def crear_auth_user(usuario):
+    """Crea el auth.User de un Usuario (username único; si colisiona, se agrega el id del Usuario)."""
+    username_final = (usuario.username or '').strip() or (usuario.correo or '').split('@')[0]
+    if not username_final:
+        username_final = f"usuario_{usuario.id_usuario}"
+    # Evitar colisiones de username
+    if User.objects.filter(username=username_final).exists():
+        username_final = f"{username_final}_{usuario.id_usuario}"
+    auth_user = User(
+        username=username_final,
+        email=usuario.correo or '',
+        first_name=(usuario.nombre or '')[:150],
+        is_active=estado_es_activo(usuario.estado),
+    )
+    auth_user.set_password(usuario.contrasena or '')
+    auth_user.save()
+    return auth_user
+
+
+def sincronizar_auth_user(usuario, campos, creado=False, correo_previo=None, username_previo=None):
+    """Aplica a auth.User los `campos` de Usuario que cambiaron. Devuelve el auth.User o None si no hubo nada que hacer.
+    - email, first_name e is_active se actualizan solo si cambió su campo de origen.
+    - La contraseña se hashea solo si cambió `contrasena`.
+    - Un Usuario nuevo reutiliza el auth.User con su correo/username si ya existe.
+    """
+    mapeados = campos & CAMPOS_AUTH
+    if not mapeados:
+        return None
+    # Buscar por los valores anteriores: si cambió el correo, el auth.User todavía tiene el viejo
+    auth_user = None
+    if not creado and (correo_previo or username_previo):
+        auth_user = buscar_auth_user(correo_previo, username_previo)
+    if auth_user is None:
+        auth_user = buscar_auth_user(usuario.correo, usuario.username)
+    if auth_user is None:
+        return crear_auth_user(usuario)
+    actualizar = []
+    if 'correo' in mapeados and usuario.correo and auth_user.email != usuario.correo:
+        auth_user.email = usuario.correo
+        actualizar.append('email')
+    if 'nombre' in mapeados and auth_user.first_name != (usuario.nombre or '')[:150]:
+        auth_user.first_name = (usuario.nombre or '')[:150]
+        actualizar.append('first_name')
+    if 'estado' in mapeados and auth_user.is_active != estado_es_activo(usuario.estado):
+        auth_user.is_active = estado_es_activo(usuario.estado)
+        actualizar.append('is_active')
+    if 'contrasena' in mapeados:
+        auth_user.set_password(usuario.contrasena or '')
+        actualizar.append('password')
+    if actualizar:
+        auth_user.save(update_fields=actualizar)
+    return auth_user
+
+
+def eliminar_auth_users(correo, username, usuario_id):
+    """Elimina los auth.User de un Usuario borrado (por email, username y username_<id>)."""
+    candidatos = User.objects.none()
+    if correo:
+        candidatos = candidatos | User.objects.filter(email=correo)
+    if username:
+        candidatos = candidatos | User.objects.filter(username__in=[username, f"{username}_{usuario_id}"])
+    candidatos.delete()
+
+
+def es_rol_odontologo():
+    return {'id_rol__nombre_rol__iexact': 'odontologo'}
+
+
+def ajustar_odontologos_por_rol(usuario_ids):
+    """Deja citas.Odontologo acorde al rol de cada usuario: lo crea si tiene el rol 'odontologo' y no está
+    vinculado a ninguno; lo elimina si ya no tiene ese rol. Por lotes: un número fijo de consultas
+    (bulk_create y un DELETE) sin importar cuántos usuarios. Devuelve (creados, eliminados)."""
+    ids = set(usuario_ids) - {None}
+    if not ids:
+        return 0, 0
+    con_rol = set(
+        UsuarioRol.objects.filter(id_usuario_id__in=ids, **es_rol_odontologo()).values_list('id_usuario_id', flat=True)
+    )
+    vinculados = set(
+        Odontologo.objects.filter(usuario_seguridad_id__in=ids).values_list('usuario_seguridad_id', flat=True)
+    )
+    nuevos = [
+        Odontologo(
+            usuario_seguridad_id=usuario.pk,
+            nombre=usuario.nombre or '',
+            email=usuario.correo or '',
+            telefono='',
+            especialidad='General',
+        )
+        for usuario in Usuario.objects.filter(pk__in=con_rol - vinculados).only('id_usuario', 'nombre', 'correo')
+    ]
+    Odontologo.objects.bulk_create(nuevos)
+    eliminados = 0
+    sobrantes = vinculados - con_rol
+    if sobrantes:
+        # El post_delete de Odontologo encola la baja de su auth.User (citas/signals.py)
+        _, por_modelo = Odontologo.objects.filter(usuario_seguridad_id__in=sobrantes).delete()
+        eliminados = por_modelo.get(Odontologo._meta.label, 0)
+    return len(nuevos), eliminados
+
+
+def asegurar_odontologo_por_rol(usuario_id):
+    ajustar_odontologos_por_rol([usuario_id])
+
+
+def copiar_datos_a_odontologo(usuario_id):
+    """Copia nombre y correo del Usuario a su Odontologo vinculado (si lo tiene)."""
+    usuario = Usuario.objects.filter(pk=usuario_id).only('nombre', 'correo').first()
+    if usuario is None:
+        return
+    od = Odontologo.objects.filter(usuario_seguridad_id=usuario_id).first()
+    if od is None:
+        return
+    nombre, email = usuario.nombre or '', usuario.correo or ''
+    if od.nombre != nombre or od.email != email:
+        od.nombre, od.email = nombre, email
+        od.save(update_fields=['nombre', 'email'])
+
+
+# --- Outbox ---
+
+def _aplicar_usuario_auth(datos):
+    usuario = Usuario.objects.filter(pk=datos['usuario_id']).first()
+    if usuario is None:
+        return  # borrado después: su baja tiene su propio evento
+    sincronizar_auth_user(
+        usuario, set(datos.get('campos') or CAMPOS_SINCRONIZADOS), creado=datos.get('creado', False),
+        correo_previo=datos.get('correo_previo'), username_previo=datos.get('username_previo'),
+    )
+
+
+def _aplicar_baja_usuario(datos):
+    eliminar_auth_users(datos.get('correo'), datos.get('username'), datos.get('usuario_id'))
+
+
+def _aplicar_baja_auth_user(datos):
+    User.objects.filter(pk=datos['user_id']).delete()
+
+
+MANEJADORES = {
+    'usuario_auth': _aplicar_usuario_auth,
+    'usuario_baja': _aplicar_baja_usuario,
+    'auth_user_baja': _aplicar_baja_auth_user,
+    'rol_odontologo': lambda datos: asegurar_odontologo_por_rol(datos['usuario_id']),
+    'datos_odontologo': lambda datos: copiar_datos_a_odontologo(datos['usuario_id']),
+}
+# Manejadores que solo miran el estado actual: varios eventos de la misma clave en un lote se aplican una vez
+IDEMPOTENTES_POR_CLAVE = {'rol_odontologo', 'datos_odontologo'}
+
+
+def _config(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def encolar(tipo, clave, datos):
+    """Registra un efecto de sincronización pendiente en la transacción en curso."""
+    evento = EventoSincronizacion.objects.create(tipo=tipo, clave=clave, datos=datos)
+    if _config('SINCRONIZACION_MODO', 'outbox') == 'inmediato':
+        transaction.on_commit(lambda: procesar_pendientes(ids=[evento.pk]))
+    return evento
+
+
+def _espera(intentos):
+    # 30 s, 1 min, 2 min, ... hasta 1 hora
+    return timedelta(seconds=min(30 * 2 ** (intentos - 1), 3600))
+
+
+def procesar_pendientes(limite=None, ids=None):
+    """Aplica hasta `limite` eventos pendientes (en orden). Devuelve (procesados, con error).
+    En PostgreSQL los toma con FOR UPDATE SKIP LOCKED: varios workers no procesan el mismo evento."""
+    limite = limite or _config('SINCRONIZACION_LOTE', 100)
+    ahora = timezone.now()
+    max_intentos = _config('SINCRONIZACION_MAX_INTENTOS', 8)
+    procesados = errores = 0
+    try:
+        with transaction.atomic():
+            qs = EventoSincronizacion.objects.filter(estado='pendiente', disponible_desde__lte=ahora)
+            if ids is not None:
+                qs = qs.filter(pk__in=ids)
+            eventos = list(qs.select_for_update(skip_locked=True).order_by('disponible_desde', 'id_evento')[:limite])
+            aplicados = set()
+            for evento in eventos:
+                marca = (evento.tipo, evento.clave)
+                try:
+                    if not (evento.tipo in IDEMPOTENTES_POR_CLAVE and marca in aplicados):
+                        manejador = MANEJADORES[evento.tipo]
+                        with transaction.atomic():
+                            manejador(evento.datos)
+                        aplicados.add(marca)
+                    evento.estado = 'procesado'
+                    evento.procesado_en = timezone.now()
+                    evento.ultimo_error = ''
+                    procesados += 1
+                except Exception:
+                    evento.intentos += 1
+                    evento.ultimo_error = traceback.format_exc(limit=5)[-4000:]
+                    if evento.intentos >= max_intentos:
+                        evento.estado = 'fallido'
+                        logger.error('Evento de sincronización %s (%s %s) descartado tras %d intentos',
+                                     evento.pk, evento.tipo, evento.clave, evento.intentos)
+                    else:
+                        evento.disponible_desde = ahora + _espera(evento.intentos)
+                        logger.warning('Evento de sincronización %s (%s %s) falló; se reintentará',
+                                       evento.pk, evento.tipo, evento.clave)
+                    errores += 1
+            EventoSincronizacion.objects.bulk_update(
+                eventos, ['estado', 'procesado_en', 'ultimo_error', 'intentos', 'disponible_desde'],
+            )
+    except Exception:
+        logger.exception('No se pudo procesar el outbox de sincronización')
+    return procesados, errores
+
+
+def purgar_procesados(dias):
+    """Elimina eventos ya procesados con más de `dias` días."""
+    limite = timezone.now() - timedelta(days=dias)
+    borrados, _ = EventoSincronizacion.objects.filter(estado='procesado', creado__lt=limite).delete()
+    return borrados
+
+
+# --- Reconciliación ---
+
+def reconciliar(dry_run=False, eliminar=False, contrasenas=False, lote=500):
+    """Compara Usuario / UsuarioRol con citas.Odontologo y auth.User y corrige las diferencias en bloque.
+    Devuelve un dict {problema: cantidad}. Con `dry_run` solo cuenta.
+    - Odontologo faltante para quien tiene el rol: se crea (bulk_create).
+    - Odontologo vinculado a quien ya no tiene el rol: solo se informa, salvo `eliminar`.
+    - nombre/email del Odontologo desactualizados: bulk_update.
+    - auth.User faltante: se encola su creación (requiere hashear la contraseña).
+    - email/first_name/is_active del auth.User desactualizados: bulk_update.
+    - `contrasenas`: verifica también los hashes (lento: un check_password por usuario).
+    """
+    resultado = {
+        'odontologos_faltantes': 0, 'odontologos_sin_rol': 0, 'odontologos_desactualizados': 0,
+        'auth_faltantes': 0, 'auth_desactualizados': 0, 'contrasenas_distintas': 0,
+    }
+    con_rol = set(
+        UsuarioRol.objects.filter(**es_rol_odontologo()).values_list('id_usuario_id', flat=True).distinct()
+    )
+    vinculados = {od.usuario_seguridad_id: od for od in Odontologo.objects.filter(usuario_seguridad__isnull=False)}
+    usuarios = {u.pk: u for u in Usuario.objects.only('id_usuario', 'username', 'nombre', 'correo', 'estado', 'contrasena')}
+
+    # Odontologo <-> rol
+    nuevos = [
+        Odontologo(usuario_seguridad_id=uid, nombre=usuarios[uid].nombre or '', email=usuarios[uid].correo or '',
+                   telefono='', especialidad='General')
+        for uid in sorted(con_rol - vinculados.keys()) if uid in usuarios
+    ]
+    resultado['odontologos_faltantes'] = len(nuevos)
+    sin_rol = [od for uid, od in vinculados.items() if uid not in con_rol]
+    resultado['odontologos_sin_rol'] = len(sin_rol)
+    desactualizados = []
+    for uid, od in vinculados.items():
+        usuario = usuarios.get(uid)
+        if usuario is None or uid not in con_rol:
+            continue
+        if od.nombre != (usuario.nombre or '') or od.email != (usuario.correo or ''):
+            od.nombre, od.email = usuario.nombre or '', usuario.correo or ''
+            desactualizados.append(od)
+    resultado['odontologos_desactualizados'] = len(desactualizados)
+
+    # Usuario -> auth.User (emparejado por email y luego por username, como buscar_auth_user)
+    auth_por_email, auth_por_username = {}, {}
+    for auth_user in User.objects.order_by('pk').only('id', 'username', 'email', 'first_name', 'is_active', 'password'):
+        if auth_user.email:
+            auth_por_email.setdefault(auth_user.email, auth_user)
+        auth_por_username[auth_user.username] = auth_user
+    faltantes, auth_cambiados, claves = [], [], []
+    for usuario in usuarios.values():
+        auth_user = (usuario.correo and auth_por_email.get(usuario.correo)) or auth_por_username.get(usuario.username)
+        if auth_user is None:
+            faltantes.append(usuario)
+            continue
+        esperado = (usuario.correo or auth_user.email, (usuario.nombre or '')[:150], estado_es_activo(usuario.estado))
+        if (auth_user.email, auth_user.first_name, auth_user.is_active) != esperado:
+            auth_user.email, auth_user.first_name, auth_user.is_active = esperado
+            auth_cambiados.append(auth_user)
+        if contrasenas and not auth_user.check_password(usuario.contrasena or ''):
+            claves.append(usuario)
+    resultado['auth_faltantes'] = len(faltantes)
+    resultado['auth_desactualizados'] = len(auth_cambiados)
+    resultado['contrasenas_distintas'] = len(claves)
+
+    if dry_run:
+        return resultado
+    with transaction.atomic():
+        Odontologo.objects.bulk_create(nuevos, batch_size=lote)
+        Odontologo.objects.bulk_update(desactualizados, ['nombre', 'email'], batch_size=lote)
+        if eliminar:
+            # Uno por uno: Odontologo.delete() también elimina su auth.User
+            for od in sin_rol:
+                od.delete()
+        User.objects.bulk_update(auth_cambiados, ['email', 'first_name', 'is_active'], batch_size=lote)
+        # Crear un auth.User o rehashear una contraseña es caro: se deja al worker del outbox
+        EventoSincronizacion.objects.bulk_create([
+            EventoSincronizacion(tipo='usuario_auth', clave=f'usuario:{u.pk}',
+                                 datos={'usuario_id': u.pk, 'creado': True, 'campos': list(CAMPOS_SINCRONIZADOS)})
+            for u in faltantes
+        ] + [
+            EventoSincronizacion(tipo='usuario_auth', clave=f'usuario:{u.pk}',
+                                 datos={'usuario_id': u.pk, 'campos': ['contrasena']})
+            for u in claves
+        ], batch_size=lote)
+    return resultado
@@ -1,3 +1,508 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from citas.models import Odontologo
+
+from . import particiones, sincronizacion
+from .auditoria import BufferBitacora, evento
+from .models import Bitacora, EventoSincronizacion, Rol, Usuario, UsuarioRol
+from .roles import roles_de_usuario
+from .sincronizacion import campos_cambiados, procesar_pendientes, reconciliar
+
+CACHE_LOCAL = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'},
+    'versiones': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-versiones'},
+    'sesiones': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-sesiones'},
+}
+
+
+def crear_usuario(username, nombre=None, correo=None, estado='activo', contrasena='secreta'):
+    return Usuario.objects.create(
+        username=username, nombre=nombre or username.title(), correo=correo or f'{username}@x.com',
+        estado=estado, contrasena=contrasena,
+    )
+
+
+def crear_rol(nombre):
+    return Rol.objects.create(nombre_rol=nombre, descripcion=nombre)
+
+
+@override_settings(
+    CACHES=CACHE_LOCAL, SINCRONIZACION_MODO='outbox',
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class BaseSeguridad(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def iniciar_sesion(self, usuario):
+        sesion = self.client.session
+        sesion['usuario_id'] = usuario.pk
+        sesion.save()
+
+
+class RolesCacheadosTests(BaseSeguridad):
+    def setUp(self):
+        super().setUp()
+        self.ana = crear_usuario('ana')
+        self.beto = crear_usuario('beto')
+        self.admin = crear_rol('Administrador')
+
+    def test_roles_en_minusculas_y_cacheados(self):
+        UsuarioRol.objects.create(id_usuario=self.ana, id_rol=self.admin)
+        self.assertEqual(roles_de_usuario(self.ana.pk), {'administrador'})
+        with self.assertNumQueries(0):
+            self.assertEqual(roles_de_usuario(self.ana.pk), {'administrador'})
+
+    def test_asignar_y_quitar_rol_invalida(self):
+        self.assertEqual(roles_de_usuario(self.ana.pk), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            asignacion = UsuarioRol.objects.create(id_usuario=self.ana, id_rol=self.admin)
+        self.assertEqual(roles_de_usuario(self.ana.pk), {'administrador'})
+        with self.captureOnCommitCallbacks(execute=True):
+            asignacion.delete()
+        self.assertEqual(roles_de_usuario(self.ana.pk), set())
+
+    def test_renombrar_rol_invalida(self):
+        UsuarioRol.objects.create(id_usuario=self.ana, id_rol=self.admin)
+        roles_de_usuario(self.ana.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin.nombre_rol = 'Gerente'
+            self.admin.save()
+        self.assertEqual(roles_de_usuario(self.ana.pk), {'gerente'})
+
+    def test_reasignar_vinculo_invalida_ambos_usuarios(self):
+        asignacion = UsuarioRol.objects.create(id_usuario=self.ana, id_rol=self.admin)
+        self.assertEqual(roles_de_usuario(self.ana.pk), {'administrador'})
+        self.assertEqual(roles_de_usuario(self.beto.pk), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            asignacion = UsuarioRol.objects.get(pk=asignacion.pk)
+            asignacion.id_usuario = self.beto
+            asignacion.save()
+        self.assertEqual(roles_de_usuario(self.ana.pk), set())
+        self.assertEqual(roles_de_usuario(self.beto.pk), {'administrador'})
+
+    def test_el_permiso_ve_el_rol_recien_asignado(self):
+        url = '/seguridad/api/usuarios/elegibles_para_roles/'
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.iniciar_sesion(self.ana)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        with self.captureOnCommitCallbacks(execute=True):
+            UsuarioRol.objects.create(id_usuario=self.ana, id_rol=self.admin)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+@override_settings(AUDITORIA_REINTENTOS=2)
+class BufferBitacoraTests(BaseSeguridad):
+    def setUp(self):
+        super().setUp()
+        self.ana = crear_usuario('ana')
+        self.buffer = BufferBitacora()
+
+    def encolar(self, *acciones, usuario_id=None):
+        # Directo a la cola: agregar() arrancaría el hilo de vaciado
+        self.buffer._eventos.extend(
+            dict(evento(a), id_usuario_id=usuario_id or self.ana.pk) for a in acciones
+        )
+
+    def acciones(self):
+        return sorted(Bitacora.objects.values_list('accion', flat=True))
+
+    def test_vacia_en_un_lote(self):
+        self.encolar('a', 'b', 'c')
+        self.assertEqual(self.buffer.vaciar(), 3)
+        self.assertEqual(self.acciones(), ['a', 'b', 'c'])
+        self.assertEqual(self.buffer.pendientes(), 0)
+        self.assertEqual(self.buffer.vaciar(), 0)
+
+    def test_descarta_usuarios_inexistentes(self):
+        self.encolar('valida')
+        self.encolar('huerfana', usuario_id=self.ana.pk + 1000)
+        self.assertEqual(self.buffer.vaciar(), 1)
+        self.assertEqual(self.acciones(), ['valida'])
+
+    def test_reintenta_un_fallo_transitorio(self):
+        self.encolar('a', 'b')
+        escribir = BufferBitacora._escribir
+        llamadas = []
+
+        def falla_una_vez(eventos):
+            llamadas.append(len(eventos))
+            if len(llamadas) == 1:
+                raise OperationalError('conexión perdida')
+            return escribir(eventos)
+
+        with mock.patch.object(BufferBitacora, '_escribir', side_effect=falla_una_vez), \
+                self.assertLogs('seguridad_y_personal.auditoria', 'WARNING'):
+            self.assertEqual(self.buffer.vaciar(), 2)
+        self.assertEqual(llamadas, [2, 2])
+        self.assertEqual(self.acciones(), ['a', 'b'])
+
+    def test_sin_exito_escribe_fila_por_fila(self):
+        self.encolar('a', 'mala', 'c')
+        escribir = BufferBitacora._escribir
+
+        def falla_con_la_mala(eventos):
+            if any(e['accion'] == 'mala' for e in eventos):
+                raise OperationalError('fila inválida')
+            return escribir(eventos)
+
+        with mock.patch.object(BufferBitacora, '_escribir', side_effect=falla_con_la_mala) as escribir_mock, \
+                self.assertLogs('seguridad_y_personal.auditoria', 'WARNING') as logs:
+            self.assertEqual(self.buffer.vaciar(), 2)
+        # 2 intentos del lote completo y luego uno por evento
+        self.assertEqual([len(c.args[0]) for c in escribir_mock.call_args_list], [3, 3, 1, 1, 1])
+        self.assertEqual(self.acciones(), ['a', 'c'])
+        self.assertTrue(any('descartado' in linea and 'mala' in linea for linea in logs.output))
+
+
+class ArchivoBitacoraTests(BaseSeguridad):
+    def setUp(self):
+        super().setUp()
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ajuste = override_settings(BITACORA_ARCHIVO_DIR=self.directorio)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        self.ana = crear_usuario('ana')
+
+    def bitacora(self, accion, fecha, **extra):
+        return Bitacora.objects.create(id_usuario=self.ana, accion=accion, fecha_accion=fecha, **extra)
+
+    def archivadas(self, mes):
+        with gzip.open(particiones.ruta_archivo(mes), 'rt', encoding='utf-8') as archivo:
+            return [json.loads(linea) for linea in archivo]
+
+    def test_archiva_y_elimina_solo_el_mes(self):
+        self.bitacora('enero 1', datetime(2025, 1, 1, 0, 0))
+        self.bitacora('enero 2', datetime(2025, 1, 31, 23, 59), datos={'campo': ['a', 'b']})
+        self.bitacora('febrero', datetime(2025, 2, 1, 0, 0))
+        self.assertEqual(particiones.archivar_mes(date(2025, 1, 1)), 2)
+        self.assertEqual(list(Bitacora.objects.values_list('accion', flat=True)), ['febrero'])
+        filas = self.archivadas(date(2025, 1, 1))
+        self.assertEqual([f['accion'] for f in filas], ['enero 1', 'enero 2'])
+        self.assertEqual(filas[1]['datos'], {'campo': ['a', 'b']})
+
+    def test_filas_tardias_se_agregan_al_archivo(self):
+        self.bitacora('primera', datetime(2025, 1, 5))
+        particiones.archivar_mes(date(2025, 1, 1))
+        self.bitacora('tardía', datetime(2025, 1, 6))
+        self.assertEqual(particiones.archivar_mes(date(2025, 1, 1)), 1)
+        self.assertEqual([f['accion'] for f in self.archivadas(date(2025, 1, 1))], ['primera', 'tardía'])
+
+    def test_no_elimina_si_falla_la_exportacion(self):
+        self.bitacora('enero', datetime(2025, 1, 5))
+
+        def falla(mes, filas):
+            next(iter(filas))
+            raise OSError('disco lleno')
+
+        with mock.patch.object(particiones, '_escribir_archivo', side_effect=falla):
+            with self.assertRaises(OSError):
+                particiones.archivar_mes(date(2025, 1, 1))
+        self.assertEqual(Bitacora.objects.count(), 1)
+        self.assertFalse(os.path.exists(particiones.ruta_archivo(date(2025, 1, 1))))
+
+    def test_mes_vacio_no_crea_archivo(self):
+        self.assertEqual(particiones.archivar_mes(date(2025, 1, 1)), 0)
+        self.assertFalse(os.path.exists(particiones.ruta_archivo(date(2025, 1, 1))))
+
+    def test_meses_fuera_de_la_retencion(self):
+        for fecha in (datetime(2024, 11, 3), datetime(2025, 1, 10), datetime(2025, 2, 1), datetime(2025, 4, 1)):
+            self.bitacora('x', fecha)
+        self.assertEqual(
+            particiones.meses_a_archivar(2, hoy=date(2025, 4, 15)),
+            [date(2024, 11, 1), date(2025, 1, 1)],
+        )
+
+    def test_consultar_archivo_filtra_por_rango_y_columnas(self):
+        self.bitacora('Alta de paciente', datetime(2025, 1, 5), tipo_accion='creacion', entidad_tipo='paciente', entidad_id=7)
+        self.bitacora('Edición de cita', datetime(2025, 1, 20), tipo_accion='edicion', entidad_tipo='cita', entidad_id=3)
+        particiones.archivar_mes(date(2025, 1, 1))
+        desde, hasta = datetime(2025, 1, 1), datetime(2025, 2, 1)
+        self.assertEqual(len(list(particiones.consultar_archivo(desde, hasta))), 2)
+        self.assertEqual(
+            [r['accion'] for r in particiones.consultar_archivo(desde, hasta, entidad_tipo='cita', entidad_id=3)],
+            ['Edición de cita'],
+        )
+        self.assertEqual(
+            [r['accion'] for r in particiones.consultar_archivo(desde, datetime(2025, 1, 10), accion='paciente')],
+            ['Alta de paciente'],
+        )
+
+
+class SeguimientoDeCambiosTests(BaseSeguridad):
+    def setUp(self):
+        super().setUp()
+        self.usuario = crear_usuario('ana', nombre='Ana', correo='ana@x.com')
+        procesar_pendientes()
+
+    def eventos(self, tipo='usuario_auth'):
+        return list(EventoSincronizacion.objects.filter(tipo=tipo, estado='pendiente').values_list('datos', flat=True))
+
+    def test_alta_sincroniza_todo(self):
+        auth = User.objects.get(email='ana@x.com')
+        self.assertEqual((auth.username, auth.first_name, auth.is_active), ('ana', 'Ana', True))
+        self.assertTrue(auth.check_password('secreta'))
+
+    def test_solo_los_campos_modificados(self):
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        usuario.nombre = 'Ana María'
+        usuario.save()
+        self.assertEqual(campos_cambiados(usuario), {'nombre'})
+        self.assertEqual([e['campos'] for e in self.eventos()], [['nombre']])
+
+    def test_sin_cambios_no_encola(self):
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        usuario.save()
+        self.assertEqual(campos_cambiados(usuario), set())
+        self.assertEqual(self.eventos(), [])
+
+    def test_update_fields_ajenos_no_sincronizan(self):
+        usuario = Usuario.objects.only('id_usuario').get(pk=self.usuario.pk)
+        usuario.ultimo_login = datetime(2026, 3, 2, 10)
+        usuario.save(update_fields=['ultimo_login'])
+        self.assertEqual(self.eventos(), [])
+
+    def test_update_fields_deja_pendientes_los_demas(self):
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        usuario.nombre, usuario.correo = 'Ana María', 'ana.maria@x.com'
+        usuario.save(update_fields=['nombre'])
+        self.assertEqual(campos_cambiados(usuario), {'nombre'})
+        usuario.save()
+        self.assertEqual(campos_cambiados(usuario), {'correo'})
+
+    def test_solo_rehashea_si_cambia_la_contrasena(self):
+        hash_inicial = User.objects.get(email='ana@x.com').password
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        usuario.nombre = 'Ana María'
+        usuario.save()
+        procesar_pendientes()
+        auth = User.objects.get(email='ana@x.com')
+        self.assertEqual((auth.first_name, auth.password), ('Ana María', hash_inicial))
+        usuario.contrasena = 'otra'
+        usuario.save()
+        procesar_pendientes()
+        auth.refresh_from_db()
+        self.assertNotEqual(auth.password, hash_inicial)
+        self.assertTrue(auth.check_password('otra'))
+
+    def test_cambio_de_correo_actualiza_el_mismo_auth_user(self):
+        pk = User.objects.get(email='ana@x.com').pk
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        usuario.correo = 'ana.maria@x.com'
+        usuario.save()
+        procesar_pendientes()
+        self.assertEqual(list(User.objects.values_list('pk', 'email')), [(pk, 'ana.maria@x.com')])
+
+
+@override_settings(SINCRONIZACION_MAX_INTENTOS=3)
+class OutboxTests(BaseSeguridad):
+    def setUp(self):
+        super().setUp()
+        self.fallar = True
+        self.aplicados = []
+
+        def manejador(datos):
+            if self.fallar:
+                raise RuntimeError('auth no disponible')
+            self.aplicados.append(datos['n'])
+
+        for parche in (
+            mock.patch.dict(sincronizacion.MANEJADORES, {'prueba': manejador}),
+            mock.patch.object(sincronizacion, 'logger'),  # fallos esperados
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def encolar(self, n, clave='prueba:1', tipo='prueba'):
+        return EventoSincronizacion.objects.create(tipo=tipo, clave=clave, datos={'n': n})
+
+    def vencer(self, evento):
+        EventoSincronizacion.objects.filter(pk=evento.pk).update(disponible_desde=timezone.now())
+
+    def test_reintento_con_espera_creciente_hasta_fallido(self):
+        evento = self.encolar(1)
+        esperas = []
+        for _ in range(2):
+            antes = timezone.now()
+            self.assertEqual(procesar_pendientes(), (0, 1))
+            evento.refresh_from_db()
+            self.assertEqual(evento.estado, 'pendiente')
+            self.assertIn('auth no disponible', evento.ultimo_error)
+            esperas.append(round((evento.disponible_desde - antes).total_seconds()))
+            # Aún no vence la espera: no se vuelve a tomar
+            self.assertEqual(procesar_pendientes(), (0, 0))
+            self.vencer(evento)
+        self.assertEqual(esperas, [30, 60])
+        self.assertEqual(procesar_pendientes(), (0, 1))
+        evento.refresh_from_db()
+        self.assertEqual((evento.estado, evento.intentos), ('fallido', 3))
+        self.vencer(evento)
+        self.assertEqual(procesar_pendientes(), (0, 0))
+
+    def test_se_recupera_tras_un_fallo(self):
+        evento = self.encolar(1)
+        procesar_pendientes()
+        self.fallar = False
+        self.vencer(evento)
+        self.assertEqual(procesar_pendientes(), (1, 0))
+        evento.refresh_from_db()
+        self.assertEqual((evento.estado, evento.ultimo_error, self.aplicados), ('procesado', '', [1]))
+
+    def test_un_fallo_no_revierte_el_resto_del_lote(self):
+        usuario = crear_usuario('ana')
+        EventoSincronizacion.objects.all().delete()
+        self.encolar(1)
+        EventoSincronizacion.objects.create(
+            tipo='datos_odontologo', clave=f'usuario:{usuario.pk}', datos={'usuario_id': usuario.pk},
+        )
+        self.assertEqual(procesar_pendientes(), (1, 1))
+        self.assertEqual(
+            dict(EventoSincronizacion.objects.values_list('tipo', 'estado')),
+            {'prueba': 'pendiente', 'datos_odontologo': 'procesado'},
+        )
+
+    def test_idempotentes_por_clave_se_aplican_una_vez(self):
+        usuario = crear_usuario('ana')
+        odontologo = crear_rol('odontologo')
+        EventoSincronizacion.objects.all().delete()
+        # Sin señales: el vínculo aparece y se encolan dos revisiones de la misma clave
+        UsuarioRol.objects.bulk_create([UsuarioRol(id_usuario=usuario, id_rol=odontologo)])
+        for _ in range(2):
+            EventoSincronizacion.objects.create(
+                tipo='rol_odontologo', clave=f'usuario:{usuario.pk}', datos={'usuario_id': usuario.pk},
+            )
+        with mock.patch.object(
+            sincronizacion, 'asegurar_odontologo_por_rol', wraps=sincronizacion.asegurar_odontologo_por_rol,
+        ) as asegurar:
+            self.assertEqual(procesar_pendientes(), (2, 0))
+        self.assertEqual(asegurar.call_count, 1)
+        self.assertEqual(Odontologo.objects.filter(usuario_seguridad=usuario).count(), 1)
+
+
+class ReconciliacionTests(BaseSeguridad):
+    def setUp(self):
+        super().setUp()
+        self.rol = crear_rol('Odontologo')
+        self.ana = crear_usuario('ana', nombre='Ana')
+        self.beto = crear_usuario('beto', nombre='Beto')
+        procesar_pendientes()
+        EventoSincronizacion.objects.all().delete()
+        # Diferencias creadas sin señales (como si el outbox se hubiera perdido)
+        UsuarioRol.objects.bulk_create([UsuarioRol(id_usuario=self.ana, id_rol=self.rol)])
+        Odontologo.objects.bulk_create([Odontologo(
+            usuario_seguridad=self.beto, nombre='Beto', email='beto@x.com', telefono='', especialidad='General',
+        )])
+        User.objects.filter(email='beto@x.com').delete()
+        Usuario.objects.filter(pk=self.ana.pk).update(nombre='Ana María')
+
+    def test_dry_run_solo_cuenta(self):
+        resultado = reconciliar(dry_run=True)
+        self.assertEqual(resultado, {
+            'odontologos_faltantes': 1, 'odontologos_sin_rol': 1, 'odontologos_desactualizados': 0,
+            'auth_faltantes': 1, 'auth_desactualizados': 1, 'contrasenas_distintas': 0,
+        })
+        self.assertFalse(Odontologo.objects.filter(usuario_seguridad=self.ana).exists())
+        self.assertFalse(EventoSincronizacion.objects.exists())
+
+    def test_repara_en_bloque(self):
+        reconciliar()
+        od = Odontologo.objects.get(usuario_seguridad=self.ana)
+        self.assertEqual((od.nombre, od.email), ('Ana María', 'ana@x.com'))
+        self.assertEqual(User.objects.get(email='ana@x.com').first_name, 'Ana María')
+        # Sin `eliminar`, el odontólogo sin rol solo se informa
+        self.assertTrue(Odontologo.objects.filter(usuario_seguridad=self.beto).exists())
+        # El auth.User faltante se crea desde el outbox
+        self.assertEqual(
+            list(EventoSincronizacion.objects.values_list('tipo', 'clave')), [('usuario_auth', f'usuario:{self.beto.pk}')],
+        )
+        procesar_pendientes()
+        self.assertTrue(User.objects.filter(email='beto@x.com').exists())
+        self.assertEqual(reconciliar(dry_run=True)['auth_faltantes'], 0)
+
+    def test_eliminar_quita_odontologos_sin_rol(self):
+        reconciliar(eliminar=True)
+        self.assertFalse(Odontologo.objects.filter(usuario_seguridad=self.beto).exists())
+
+    def test_contrasenas_distintas(self):
+        Usuario.objects.filter(pk=self.ana.pk).update(contrasena='cambiada')
+        self.assertEqual(reconciliar(dry_run=True, contrasenas=True)['contrasenas_distintas'], 1)
+
+
+@override_settings(DISABLE_ROLE_PERMS=True)
+class ElegiblesTests(BaseSeguridad):
+    url = '/seguridad/api/usuarios/elegibles_para_roles/'
+
+    def setUp(self):
+        super().setUp()
+        self.ana = crear_usuario('ana', nombre='Ana Ríos')
+        self.beto = crear_usuario('beto', nombre='Beto Paz')
+        self.carla = crear_usuario('carla', nombre='Carla Luna')
+        self.recepcion = crear_rol('Recepcionista')
+
+    def elegibles(self, **params):
+        respuesta = self.client.get(self.url, params)
+        self.assertEqual(respuesta.status_code, 200)
+        return [u['username'] for u in respuesta.json()['results']]
+
+    def test_excluye_roles_y_odontologos_vinculados(self):
+        UsuarioRol.objects.create(id_usuario=self.ana, id_rol=self.recepcion)
+        UsuarioRol.objects.create(id_usuario=self.beto, id_rol=crear_rol('Administrador'))
+        Odontologo.objects.create(
+            usuario_seguridad=self.carla, nombre='Carla', especialidad='General', telefono='1', email='c@x.com',
+        )
+        self.assertEqual(self.elegibles(), ['beto'])
+
+    def test_busqueda_y_paginacion(self):
+        self.assertEqual(self.elegibles(buscar='LUNA'), ['carla'])
+        primera = self.client.get(self.url, {'page_size': 2}).json()
+        self.assertEqual([u['username'] for u in primera['results']], ['ana', 'beto'])
+        segunda = self.client.get(primera['next']).json()
+        self.assertEqual([u['username'] for u in segunda['results']], ['carla'])
+
+    def test_pagina_cacheada_hasta_un_cambio(self):
+        self.assertEqual(self.elegibles(), ['ana', 'beto', 'carla'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.elegibles(), ['ana', 'beto', 'carla'])
+        with self.captureOnCommitCallbacks(execute=True):
+            UsuarioRol.objects.create(id_usuario=self.ana, id_rol=self.recepcion)
+        self.assertEqual(self.elegibles(), ['beto', 'carla'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Odontologo.objects.create(
+                usuario_seguridad=self.beto, nombre='Beto', especialidad='General', telefono='1', email='b@x.com',
+            )
+        self.assertEqual(self.elegibles(), ['carla'])
+
+    def test_solo_campos_visibles_invalidan(self):
+        self.elegibles()
+        with self.captureOnCommitCallbacks(execute=True):
+            usuario = Usuario.objects.get(pk=self.carla.pk)
+            usuario.ultimo_login = datetime(2026, 3, 2, 10)
+            usuario.save(update_fields=['ultimo_login'])
+        with self.assertNumQueries(0):
+            self.elegibles()
+        with self.captureOnCommitCallbacks(execute=True):
+            usuario.username = 'carla.luna'
+            usuario.save()
+        self.assertEqual(self.elegibles(), ['ana', 'beto', 'carla.luna'])
+
+    def test_renombrar_rol_a_excluido_invalida(self):
+        otro = crear_rol('Asistente')
+        UsuarioRol.objects.create(id_usuario=self.ana, id_rol=otro)
+        self.assertEqual(self.elegibles(), ['ana', 'beto', 'carla'])
+        with self.captureOnCommitCallbacks(execute=True):
+            otro.nombre_rol = 'odontologo'
+            otro.save()
+        self.assertEqual(self.elegibles(), ['beto', 'carla'])
@@ -2,14 +2,29 @@ from django.shortcuts import render, redirect, get_object_or_404  # Helpers para
 from django.contrib import messages  # Sistema de mensajes flash (éxito/error/info)
 from django.contrib.auth import logout  # Usamos logout para limpiar sesión de auth
 from django.utils import timezone  # Para registrar fecha/hora del último inicio de sesión
+from datetime import datetime, time, timedelta
+from django.utils.dateparse import parse_date
 from .models import Usuario, Rol  # Modelos locales
 from .forms import LoginForm, UsuarioForm, RolForm  # Formularios locales
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from .models import Rol, Usuario, UsuarioRol, Bitacora
-from .serializers import RolSerializer, UsuarioSerializer, UsuarioRolSerializer, BitacoraSerializer
+from .serializers import (
+    RolSerializer, UsuarioSerializer, UsuarioElegibleSerializer, UsuarioRolSerializer, UsuarioRolLoteSerializer,
+    BitacoraSerializer,
+)
 from .permissions import RolesPermission
+from . import contexto
+from .asignacion import aplicar_asignaciones
+from .auditoria import actor, actor_id, diferencias, diferencias_formulario, evento, registrar, registrar_varios
+from .particiones import consultar_archivo
+from .busqueda import buscar
+from .roles import usuarios_elegibles
+from backend.cache import obtener_o_calcular
+from backend import exportacion
+from backend.pagination import PaginacionPorRelevancia
 
 # Este módulo expone vistas HTML clásicas (para compatibilidad) y APIs DRF
 # pensadas para el frontend React (login/logout/me, recepcionistas, cambiar contraseña, bitácora).
@@ -25,14 +40,12 @@ def iniciar_sesion(request):  # Vista que maneja login básico contra el modelo
                 # OJO: esto valida en texto plano. En un proyecto real, usa hashing (pbkdf2, bcrypt) y no guardes texto plano.
                 usuario = Usuario.objects.get(correo=correo, contrasena=contrasena)  # Busca coincidencia exacta
                 request.session['usuario_id'] = usuario.id_usuario  # Guarda el id en la sesión para identificar al usuario
+                contexto.recordar_actor(request, usuario)  # El resto del request usa este Usuario (ver contexto.py)
                 # Actualiza último inicio de sesión
                 usuario.ultimo_login = timezone.now()
                 usuario.save(update_fields=['ultimo_login'])
                 # Bitácora: registrar inicio de sesión
-                try:
-                    Bitacora.objects.create(id_usuario=usuario, accion='Inicio de sesión')
-                except Exception:
-                    pass
+                registrar(usuario, 'Inicio de sesión', 'inicio_sesion', usuario, sincrono=True)
                 messages.success(request, f'Bienvenido, {usuario.nombre}')  # Mensaje de éxito
                 return redirect('listado_pacientes')  # Redirige a alguna pantalla interna (puede ser tu dashboard)
             except Usuario.DoesNotExist:  # Si no encuentra el usuario o contraseña no coincide
@@ -44,14 +57,7 @@ def iniciar_sesion(request):  # Vista que maneja login básico contra el modelo
 # ========== CU2: Cerrar sesión ==========
 def cerrar_sesion(request):  # Vista para cerrar sesión
     # Bitácora: registrar cierre de sesión (si hay usuario en sesión)
-    try:
-        user_id = request.session.get('usuario_id')
-        if user_id:
-            usuario = Usuario.objects.filter(pk=user_id).first()
-            if usuario:
-                Bitacora.objects.create(id_usuario=usuario, accion='Cierre de sesión')
-    except Exception:
-        pass
+    registrar(actor_id(request), 'Cierre de sesión', 'cierre_sesion', ('usuario', actor_id(request)))
     logout(request)  # Limpia la sesión de Django (si estuvieras usando auth)
     request.session.flush()  # Asegura limpiar cualquier dato en la sesión
     messages.info(request, 'Sesión cerrada correctamente')  # Mensaje informativo
@@ -68,14 +74,7 @@ def crear_usuario(request):  # Vista para Create
         if form.is_valid():  # Valida datos
             usuario = form.save()  # Crea registro Usuario
             # Bitácora: registrar creación de usuario (actor = usuario en sesión si existe)
-            try:
-                actor = None
-                user_id = request.session.get('usuario_id')
-                if user_id:
-                    actor = Usuario.objects.filter(pk=user_id).first()
-                Bitacora.objects.create(id_usuario=actor or usuario, accion=f"Creación de usuario: {usuario.username}")
-            except Exception:
-                pass
+            registrar(actor(request) or usuario, f"Creación de usuario: {usuario.username}", 'creacion', usuario, sincrono=True)
             messages.success(request, 'Usuario creado correctamente')  # Mensaje éxito
             return redirect('listado_usuarios')  # Redirige a listado
     else:
@@ -89,14 +88,8 @@ def editar_usuario(request, id_usuario):  # Vista para Update
         if form.is_valid():  # Valida
             form.save()  # Guarda cambios
             # Bitácora: registrar edición de usuario
-            try:
-                actor = None
-                user_id = request.session.get('usuario_id')
-                if user_id:
-                    actor = Usuario.objects.filter(pk=user_id).first()
-                Bitacora.objects.create(id_usuario=actor or usuario, accion=f"Edición de usuario: {usuario.username}")
-            except Exception:
-                pass
+            registrar(actor_id(request) or usuario.pk, f"Edición de usuario: {usuario.username}", 'edicion', usuario,
+                      datos=diferencias_formulario(form))
             messages.success(request, 'Usuario actualizado correctamente')  # Mensaje éxito
             return redirect('listado_usuarios')  # Redirige al listado
     else:
@@ -106,14 +99,7 @@ def editar_usuario(request, id_usuario):  # Vista para Update
 def eliminar_usuario(request, id_usuario):  # Vista para Delete
     usuario = get_object_or_404(Usuario, pk=id_usuario)  # Obtiene o 404
     # Bitácora: registrar eliminación de usuario
-    try:
-        actor = None
-        user_id = request.session.get('usuario_id')
-        if user_id:
-            actor = Usuario.objects.filter(pk=user_id).first()
-        Bitacora.objects.create(id_usuario=actor or usuario, accion=f"Eliminación de usuario: {usuario.username}")
-    except Exception:
-        pass
+    registrar(actor(request) or usuario, f"Eliminación de usuario: {usuario.username}", 'eliminacion', usuario, sincrono=True)
     usuario.delete()  # Elimina registro
     messages.success(request, 'Usuario eliminado correctamente')  # Mensaje éxito
     return redirect('listado_usuarios')  # Redirige al listado
@@ -141,15 +127,8 @@ def editar_rol(request, id_rol):  # Update (rol)
         if form.is_valid():  # Valida
             form.save()  # Guarda cambios
             # Bitácora: registrar edición de rol (actor = usuario en sesión)
-            try:
-                actor = None
-                user_id = request.session.get('usuario_id')
-                if user_id:
-                    actor = Usuario.objects.filter(pk=user_id).first()
-                if actor:
-                    Bitacora.objects.create(id_usuario=actor, accion=f"Edición de rol: {rol.nombre_rol}")
-            except Exception:
-                pass
+            registrar(actor(request), f"Edición de rol: {rol.nombre_rol}", 'edicion', rol,
+                      datos=diferencias_formulario(form), sincrono=True)
             messages.success(request, 'Rol actualizado correctamente')  # Mensaje éxito
             return redirect('listado_roles')  # Redirige al listado
     else:
@@ -159,15 +138,7 @@ def editar_rol(request, id_rol):  # Update (rol)
 def eliminar_rol(request, id_rol):  # Delete (rol)
     rol = get_object_or_404(Rol, pk=id_rol)  # Obtiene o 404
     # Bitácora: registrar eliminación de rol (actor = usuario en sesión)
-    try:
-        actor = None
-        user_id = request.session.get('usuario_id')
-        if user_id:
-            actor = Usuario.objects.filter(pk=user_id).first()
-        if actor:
-            Bitacora.objects.create(id_usuario=actor, accion=f"Eliminación de rol: {rol.nombre_rol}")
-    except Exception:
-        pass
+    registrar(actor(request), f"Eliminación de rol: {rol.nombre_rol}", 'eliminacion', rol, sincrono=True)
     rol.delete()  # Elimina registro
     messages.success(request, 'Rol eliminado correctamente')  # Mensaje éxito
     return redirect('listado_roles')  # Redirige al listado
@@ -180,28 +151,14 @@ class RolViewSet(viewsets.ModelViewSet):
 
     # Auditar ediciones y eliminaciones de roles
     def perform_update(self, serializer):
+        cambios = diferencias(serializer.instance, serializer.validated_data)
         rol = serializer.save()
-        try:
-            actor = None
-            user_id = self.request.session.get('usuario_id')
-            if user_id:
-                actor = Usuario.objects.filter(pk=user_id).first()
-            if actor:
-                Bitacora.objects.create(id_usuario=actor, accion=f"Edición de rol (API): {rol.nombre_rol}")
-        except Exception:
-            pass
+        registrar(actor(self.request), f"Edición de rol (API): {rol.nombre_rol}", 'edicion', rol,
+                  datos=cambios, sincrono=True)
 
     def perform_destroy(self, instance):
         nombre = instance.nombre_rol
-        try:
-            actor = None
-            user_id = self.request.session.get('usuario_id')
-            if user_id:
-                actor = Usuario.objects.filter(pk=user_id).first()
-            if actor:
-                Bitacora.objects.create(id_usuario=actor, accion=f"Eliminación de rol (API): {nombre}")
-        except Exception:
-            pass
+        registrar(actor(self.request), f"Eliminación de rol (API): {nombre}", 'eliminacion', instance, sincrono=True)
         instance.delete()
 
 class UsuarioViewSet(viewsets.ModelViewSet):
@@ -223,65 +180,39 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     # Registrar en bitácora la creación de usuarios vía API
     def perform_create(self, serializer):
         usuario = serializer.save()
-        try:
-            actor = None
-            user_id = self.request.session.get('usuario_id')
-            if user_id:
-                actor = Usuario.objects.filter(pk=user_id).first()
-            Bitacora.objects.create(id_usuario=actor or usuario, accion=f"Creación de usuario (API): {usuario.username}")
-        except Exception:
-            pass
+        registrar(actor(self.request) or usuario, f"Creación de usuario (API): {usuario.username}", 'creacion', usuario,
+                  sincrono=True)
 
     # Auditar ediciones y eliminaciones de usuarios
     def perform_update(self, serializer):
+        cambios = diferencias(serializer.instance, serializer.validated_data)
         usuario = serializer.save()
-        try:
-            actor = None
-            user_id = self.request.session.get('usuario_id')
-            if user_id:
-                actor = Usuario.objects.filter(pk=user_id).first()
-            Bitacora.objects.create(id_usuario=actor or usuario, accion=f"Edición de usuario (API): {usuario.username}")
-        except Exception:
-            pass
+        registrar(actor_id(self.request) or usuario.pk, f"Edición de usuario (API): {usuario.username}", 'edicion', usuario,
+                  datos=cambios)
 
     def perform_destroy(self, instance):
         username = instance.username
-        try:
-            actor = None
-            user_id = self.request.session.get('usuario_id')
-            if user_id:
-                actor = Usuario.objects.filter(pk=user_id).first()
-            Bitacora.objects.create(id_usuario=actor or instance, accion=f"Eliminación de usuario (API): {username}")
-        except Exception:
-            pass
+        registrar(actor(self.request) or instance, f"Eliminación de usuario (API): {username}", 'eliminacion', instance,
+                  sincrono=True)
         instance.delete()
 
     @action(detail=False, methods=['get'])
     def elegibles_para_roles(self, request):
-        """Lista de usuarios elegibles para asignación de roles desde el frontend de "Gestionar roles".
-        Exclusiones:
+        """Lista paginada de usuarios elegibles para asignación de roles desde el frontend de "Gestionar roles".
+        Exclusiones (ver roles.usuarios_elegibles):
         - Usuarios que ya tienen rol 'odontologo' o 'recepcionista'.
         - Usuarios que están vinculados a un Odontologo (citas.Odontologo.usuario_seguridad no nulo).
+        Parámetros: ?buscar= (nombre, username o correo), ?page_size=, ?cursor=.
+        Cada página se cachea hasta que cambie un usuario, una asignación de rol o un vínculo de odontólogo.
         """
-        # IDs con rol odontologo o recepcionista
-        ids_excluir = set(
-            UsuarioRol.objects.filter(
-                id_rol__nombre_rol__iregex=r'^(odontologo|recepcionista)$'
-            ).values_list('id_usuario', flat=True)
-        )
-        try:
-            from citas.models import Odontologo
-            ids_odonto = set(
-                Odontologo.objects.exclude(usuario_seguridad__isnull=True)
-                .values_list('usuario_seguridad_id', flat=True)
-            )
-            ids_excluir |= ids_odonto
-        except Exception:
-            pass
-
-        usuarios = Usuario.objects.exclude(id_usuario__in=list(ids_excluir))
-        data = UsuarioSerializer(usuarios, many=True).data
-        return Response(data)
+        def calcular():
+            qs = usuarios_elegibles(request.query_params.get('buscar')).only(*UsuarioElegibleSerializer.Meta.fields)
+            pagina = self.paginate_queryset(qs)
+            return self.get_paginated_response(UsuarioElegibleSerializer(pagina, many=True).data).data
+        # La respuesta lleva URLs absolutas (next/previous): la clave incluye host y query completos
+        return Response(obtener_o_calcular(
+            'elegibles', ['elegibles'], [request.get_host(), request.get_full_path()], calcular,
+        ))
 
     @action(detail=False, methods=['post'])
     def login(self, request):
@@ -297,14 +228,12 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         try:
             usuario = Usuario.objects.get(correo=correo, contrasena=contrasena)
             request.session['usuario_id'] = usuario.id_usuario
+            contexto.recordar_actor(request, usuario)
             # Actualiza último inicio de sesión
             usuario.ultimo_login = timezone.now()
             usuario.save(update_fields=['ultimo_login'])
             # Bitácora: registrar inicio de sesión
-            try:
-                Bitacora.objects.create(id_usuario=usuario, accion='Inicio de sesión')
-            except Exception:
-                pass
+            registrar(usuario, 'Inicio de sesión', 'inicio_sesion', usuario, sincrono=True)
             data = UsuarioSerializer(usuario).data
             return Response({'message': 'Inicio de sesión correcto', 'usuario': data})
         except Usuario.DoesNotExist:
@@ -316,14 +245,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         CU2 (FRONT): Cerrar sesión vía API
         """
         # Bitácora: registrar cierre de sesión (si hay usuario en sesión)
-        try:
-            user_id = request.session.get('usuario_id')
-            if user_id:
-                usuario = Usuario.objects.filter(pk=user_id).first()
-                if usuario:
-                    Bitacora.objects.create(id_usuario=usuario, accion='Cierre de sesión')
-        except Exception:
-            pass
+        registrar(actor_id(request), 'Cierre de sesión', 'cierre_sesion', ('usuario', actor_id(request)))
         logout(request)
         request.session.flush()
         return Response({'message': 'Sesión cerrada correctamente'})
@@ -334,14 +256,10 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         Devuelve el usuario autenticado en la sesión, si existe.
         Responde 401 si no hay sesión.
         """
-        user_id = request.session.get('usuario_id')
-        if not user_id:
-            return Response({'detail': 'No autenticado'}, status=status.HTTP_401_UNAUTHORIZED)
-        try:
-            usuario = Usuario.objects.get(pk=user_id)
-            return Response(UsuarioSerializer(usuario).data)
-        except Usuario.DoesNotExist:
+        usuario = contexto.actor(request)
+        if usuario is None:
             return Response({'detail': 'No autenticado'}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(UsuarioSerializer(usuario).data)
 
     @action(detail=False, methods=['get'])
     def recepcionistas(self, request):
@@ -371,14 +289,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
             rol = Rol.objects.create(nombre_rol='recepcionista', descripcion='Recepcionista')
         UsuarioRol.objects.create(id_usuario=usuario, id_rol=rol)
         # Bitácora (actor = usuario en sesión)
-        try:
-            actor = None
-            user_id = request.session.get('usuario_id')
-            if user_id:
-                actor = Usuario.objects.filter(pk=user_id).first()
-            Bitacora.objects.create(id_usuario=actor or usuario, accion=f"Creación de recepcionista: {usuario.username}")
-        except Exception:
-            pass
+        registrar(actor(request) or usuario, f"Creación de recepcionista: {usuario.username}", 'creacion', usuario, sincrono=True)
         return Response(UsuarioSerializer(usuario).data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'])
@@ -408,10 +319,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         usuario.contrasena = nueva
         usuario.save()
         # Bitácora
-        try:
-            Bitacora.objects.create(id_usuario=usuario, accion='Cambio de contraseña')
-        except Exception:
-            pass
+        registrar(usuario, 'Cambio de contraseña', 'cambio_contrasena', usuario, sincrono=True)
         return Response({'detail': 'Contraseña actualizada correctamente'})
 
 class UsuarioRolViewSet(viewsets.ModelViewSet):
@@ -425,8 +333,59 @@ class UsuarioRolViewSet(viewsets.ModelViewSet):
         'update': ['administrador'],
         'partial_update': ['administrador'],
         'destroy': ['administrador'],
+        'lote': ['administrador'],
     }
 
+    @action(detail=False, methods=['post'])
+    def lote(self, request):
+        """
+        Asignación y revocación de roles por lote (alta del personal de una sucursal, bajas masivas).
+        Body (JSON): {"asignar": [{"id_usuario", "id_rol"}, ...], "revocar": [{"id_usuario", "id_rol"}, ...]}
+        - Todo en una transacción; si algún usuario o rol no existe no se aplica nada (400).
+        - Asignar un par ya existente o revocar uno inexistente no es error: se informa como sin cambios.
+        - Los Odontólogos de quienes ganan/pierden el rol 'odontologo' se crean/eliminan por lotes.
+        """
+        ser = UsuarioRolLoteSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        pares = {
+            lista: [(d['id_usuario'], d['id_rol']) for d in ser.validated_data[lista]]
+            for lista in ('asignar', 'revocar')
+        }
+        todos = pares['asignar'] + pares['revocar']
+        # Existencia: una consulta por tabla para todo el lote
+        usuarios = dict(Usuario.objects.filter(pk__in={u for u, _ in todos}).values_list('pk', 'username'))
+        roles = dict(Rol.objects.filter(pk__in={r for _, r in todos}).values_list('pk', 'nombre_rol'))
+        errores = []
+        for lista, items in pares.items():
+            for i, (u, r) in enumerate(items):
+                error = {}
+                if u not in usuarios:
+                    error['id_usuario'] = ['Usuario inexistente.']
+                if r not in roles:
+                    error['id_rol'] = ['Rol inexistente.']
+                if error:
+                    errores.append({'lista': lista, 'indice': i, 'errores': error})
+        if errores:
+            return Response({'detail': 'Hay pares inválidos; no se aplicó ningún cambio.', 'errores': errores},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        asignados, revocados, creados, eliminados = aplicar_asignaciones(pares['asignar'], pares['revocar'])
+        # Bitácora: una fila por cambio efectivo, escritas juntas
+        registrar_varios(actor(request), [
+            evento(f"Asignación de rol {roles[r]} a usuario {usuarios[u]}", 'creacion', ('usuario', u), {'id_rol': r})
+            for u, r in asignados
+        ] + [
+            evento(f"Revocación de rol {roles[r]} a usuario {usuarios[u]}", 'eliminacion', ('usuario', u), {'id_rol': r})
+            for u, r in revocados
+        ], sincrono=True)
+        return Response({
+            'asignados': len(asignados),
+            'revocados': len(revocados),
+            'sin_cambios': len(set(todos)) - len(asignados) - len(revocados),
+            'odontologos_creados': creados,
+            'odontologos_eliminados': eliminados,
+        })
+
 class BitacoraViewSet(viewsets.ModelViewSet):
     queryset = Bitacora.objects.all()
     serializer_class = BitacoraSerializer
@@ -439,15 +398,48 @@ class BitacoraViewSet(viewsets.ModelViewSet):
         'update': ['administrador'],
         'partial_update': ['administrador'],
         'destroy': ['administrador'],
+        'historico': ['administrador'],
+        'exportar': ['administrador'],
     }
-    # CU25: Ver bitácora - este ViewSet expone la bitácora completa.
-    # Se podrían agregar filtros y ordenamientos desde el frontend o con DRF FilterBackend si se instala django-filter.
+    LIMITE_HISTORICO = 1000
+    # CU25: Ver bitácora - este ViewSet expone la bitácora paginada por cursor (más recientes primero).
+    orden_cursor = ('-fecha_accion', '-id_bitacora')
+
+    def _por_relevancia(self):
+        """Un listado con texto buscado se ordena por relevancia, salvo ?orden=fecha."""
+        params = self.request.query_params
+        return (
+            getattr(self, 'action', None) == 'list'
+            and bool((params.get('accion') or '').strip())
+            and params.get('orden', 'relevancia') != 'fecha'
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = PaginacionPorRelevancia() if self._por_relevancia() else super().paginator
+        return self._paginator
+
+    def _rango_fechas(self, desde, hasta):
+        """Convierte fecha_desde/fecha_hasta (YYYY-MM-DD, inclusivas) en el rango [inicio, fin) sobre fecha_accion."""
+        inicio = fin = None
+        try:
+            if desde:
+                inicio = datetime.combine(parse_date(desde), time.min)
+            if hasta:
+                fin = datetime.combine(parse_date(hasta), time.min) + timedelta(days=1)
+        except (TypeError, ValueError):
+            raise ValidationError({'detail': 'Las fechas deben tener formato YYYY-MM-DD'})
+        return inicio, fin
 
     def get_queryset(self):
         """
         Filtros básicos por query params:
-        - accion: búsqueda parcial (icontains) sobre el texto de la acción
+        - accion: búsqueda de texto completo (todas las palabras, como prefijo) sobre la acción;
+          resultados por relevancia, o por fecha con orden=fecha
         - usuario_id: filtra por el id del usuario asociado a la bitácora
+        - tipo_accion: uno de Bitacora.TIPOS_ACCION (inicio_sesion, creacion, edicion, ...)
+        - entidad_tipo / entidad_id: eventos de un tipo de registro o de un registro puntual (p.ej. odontologo / 5)
         - fecha_desde (YYYY-MM-DD): fecha mínima (inclusive) por fecha_accion
         - fecha_hasta (YYYY-MM-DD): fecha máxima (inclusive) por fecha_accion
         """
@@ -455,18 +447,68 @@ class BitacoraViewSet(viewsets.ModelViewSet):
         params = self.request.query_params
         accion = params.get('accion')
         usuario_id = params.get('usuario_id')
-        fecha_desde = params.get('fecha_desde')
-        fecha_hasta = params.get('fecha_hasta')
 
         if accion:
-            qs = qs.filter(accion__icontains=accion)
+            qs = buscar(qs, accion, con_rango=self._por_relevancia())
         if usuario_id:
             qs = qs.filter(id_usuario_id=usuario_id)
-        # Para fechas usamos el componente de fecha de fecha_accion
-        if fecha_desde:
-            qs = qs.filter(fecha_accion__date__gte=fecha_desde)
-        if fecha_hasta:
-            qs = qs.filter(fecha_accion__date__lte=fecha_hasta)
+        if params.get('tipo_accion'):
+            qs = qs.filter(tipo_accion=params['tipo_accion'])
+        if params.get('entidad_tipo'):
+            qs = qs.filter(entidad_tipo=params['entidad_tipo'])
+        if params.get('entidad_id'):
+            try:
+                qs = qs.filter(entidad_id=int(params['entidad_id']))
+            except ValueError:
+                raise ValidationError({'detail': 'entidad_id debe ser un número'})
+        # Rango semiabierto sobre la columna (no sobre fecha_accion::date): usa el índice
+        # y en PostgreSQL solo recorre las particiones de esos meses.
+        inicio, fin = self._rango_fechas(params.get('fecha_desde'), params.get('fecha_hasta'))
+        if inicio:
+            qs = qs.filter(fecha_accion__gte=inicio)
+        if fin:
+            qs = qs.filter(fecha_accion__lt=fin)
+
+        return qs
+
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """
+        Bitácora en la base (mismos filtros que el listado) en ?formato=csv|ndjson, en streaming por fecha.
+        Los meses ya archivados se consultan con `historico`.
+        """
+        qs = self.filter_queryset(self.get_queryset()).order_by('fecha_accion', 'id_bitacora')
+        return exportacion.exportar(
+            request, qs,
+            ['id_bitacora', 'fecha_accion', 'id_usuario_id', 'id_usuario__username', 'tipo_accion',
+             'entidad_tipo', 'entidad_id', 'accion', 'datos'],
+            'bitacora',
+            encabezados=['id_bitacora', 'fecha_accion', 'id_usuario', 'usuario', 'tipo_accion',
+                         'entidad_tipo', 'entidad_id', 'accion', 'datos'],
+        )
 
-        return qs.order_by('-fecha_accion')
+    @action(detail=False, methods=['get'])
+    def historico(self, request):
+        """Registros ya archivados (fuera de la retención) entre fecha_desde y fecha_hasta.
+        Acepta también usuario_id, accion, tipo_accion, entidad_tipo y entidad_id.
+        Devuelve como máximo LIMITE_HISTORICO registros."""
+        params = request.query_params
+        inicio, fin = self._rango_fechas(params.get('fecha_desde'), params.get('fecha_hasta'))
+        if not inicio or not fin:
+            return Response({'detail': 'fecha_desde y fecha_hasta son obligatorios'}, status=status.HTTP_400_BAD_REQUEST)
+        if fin <= inicio:
+            return Response({'detail': 'Rango de fechas inválido'}, status=status.HTTP_400_BAD_REQUEST)
+        registros = list(consultar_archivo(
+            inicio, fin,
+            usuario_id=params.get('usuario_id'),
+            accion=params.get('accion'),
+            limite=self.LIMITE_HISTORICO + 1,
+            tipo_accion=params.get('tipo_accion'),
+            entidad_tipo=params.get('entidad_tipo'),
+            entidad_id=params.get('entidad_id'),
+        ))
+        return Response({
+            'results': registros[:self.LIMITE_HISTORICO],
+            'truncado': len(registros) > self.LIMITE_HISTORICO,
+        })
 